@@ -2,23 +2,32 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List
 from ..utils.models import UserCreate, UserResponse, UserInDB
 from ..utils.db import get_db
-import bcrypt
 from datetime import datetime, timedelta
 import jwt
 from ..utils.config import settings
+from ..utils.passwords import hasher, PasswordWorkRejected
 
 router = APIRouter()
 
-def get_password_hash(password: str):
-    # Hash a password for the first time
-    # (bcrypt requires bytes, so we encode the string)
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+def _overloaded():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-in attempts in progress, please retry",
+        headers={"Retry-After": "1"},
+    )
 
-def verify_password(plain_password: str, hashed_password: str):
-    # Check hashed password. Using .encode('utf-8') to get bytes.
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+async def get_password_hash(password: str):
+    # Hashed on the bounded bcrypt pool, never on the event loop
+    try:
+        return await hasher.hash(password)
+    except PasswordWorkRejected:
+        raise _overloaded()
+
+async def verify_password(plain_password: str, hashed_password: str):
+    try:
+        return await hasher.verify(plain_password, hashed_password)
+    except PasswordWorkRejected:
+        raise _overloaded()
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -34,7 +43,7 @@ async def register(user: UserCreate):
         raise HTTPException(status_code=400, detail="Username or email already exists")
     
     user_dict = user.dict()
-    user_dict["hashed_password"] = get_password_hash(user_dict.pop("password"))
+    user_dict["hashed_password"] = await get_password_hash(user_dict.pop("password"))
     user_dict["created_at"] = datetime.utcnow()
     
     new_user = await db.users.insert_one(user_dict)
@@ -46,7 +55,7 @@ async def login(form_data: dict): # Simplified for now
     db = get_db()
     user = await db.users.find_one({"$or": [{"email": form_data.get("username")}, {"username": form_data.get("username")}]})
     
-    if not user or not verify_password(form_data.get("password"), user["hashed_password"]):
+    if not user or not await verify_password(form_data.get("password"), user["hashed_password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     token = create_access_token({"sub": str(user["_id"]), "username": user["username"]})
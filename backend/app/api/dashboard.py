@@ -1,242 +1,272 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, UploadFile, File, WebSocket
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
-from ..utils.models import SpeechAnalysisInDB, TrainingSessionInDB, DashboardStatsResponse, TrendDay
-from ..utils.db import get_db
+from ..utils.models import SpeechAnalysisInDB, TrainingSessionInDB, DashboardStatsResponse, TrendDay, TrainingSessionData, TrainingCompletion, TrainingBatchRequest, TrainingScoreRequest
+from ..utils.db import get_db, get_read_db, read_session
 from bson import ObjectId
 from datetime import datetime, timedelta, time as dt_time
-from ..utils.auth import get_current_user_id
+from ..utils.auth import get_current_user, get_current_user_id, get_read_user_id
+from ..utils.config import settings
+from ..utils import metrics
+from ..utils.cache import response_cache
+import asyncio
 import uuid
-import os
 import logging
+from dataclasses import asdict
 
-from ..services.ml_service import run_stutter_analysis
+from ..services.ml_service import run_stutter_analysis, summarize
+from ..services import data_version, export, recommendations, result_cache, rollups, streaks, timeline
+from ..services.history import HEAVY_FIELDS, InvalidCursor, fetch_history
+from ..services.training_service import record_completion, record_completions
+from ..services.upload_service import spool
+from ..services import job_queue
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-@router.get("/stats")
-async def get_dashboard_stats(user_id: str = Depends(get_current_user_id)):
-    db = get_db()
-    
-    # 1. Total Completed Training Sessions (Unique Levels Mastered)
-    # MUST have at least one level correctly done to count
-    pipeline_unique = [
-        {"$match": {"user_id": user_id, "is_correct": True}},
-        {"$group": {"_id": "$exercise_id"}}
-    ]
-    unique_levels = await db["training_sessions"].aggregate(pipeline_unique).to_list(None)
-    total_sessions = len(unique_levels)
-    
-    # 2. Average Fluency Score (from all sessions, speech + training)
-    # Including all attempts to be more realistic
-    pipeline_score = [
-        {"$match": {"user_id": user_id}},
-        {"$group": {"_id": None, "avg_score": {"$avg": "$fluency_score"}}}
-    ]
-    score_data = await db["training_sessions"].aggregate(pipeline_score).to_list(None)
-    
-    # Also get speech analysis average
-    speech_score_data = await db["speech_analysis"].aggregate(pipeline_score).to_list(None)
-    
-    scores = []
-    if score_data: scores.append(score_data[0]["avg_score"])
-    if speech_score_data: scores.append(speech_score_data[0]["avg_score"])
-    
-    avg_score = round(sum(scores) / len(scores)) if scores else 0
-    
-    # 3. Streak Calculation
-    streak = await calculate_streak(user_id)
-    
-    return {
-        "total_sessions": total_sessions,
-        "avg_score": avg_score,
-        "streak": streak,
-        "fluency_trend": await get_fluency_trend(user_id)
-    }
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # Weak comparison, as If-None-Match requires
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in candidates or etag.removeprefix("W/") in candidates
 
-async def get_fluency_trend(user_id: str) -> List[dict]:
-    db = get_db()
-    # Get last 7 days of average scores
-    trend = []
-    today = datetime.utcnow().date()
-    
-    for i in range(6, -1, -1):
-        target_date = today - timedelta(days=i)
-        start_dt = datetime.combine(target_date, dt_time.min)
-        end_dt = datetime.combine(target_date, dt_time.max)
-        
-        # Aggregate from both collections
-        pipeline = [
-            {"$match": {
-                "user_id": user_id,
-                "created_at": {"$gte": start_dt, "$lte": end_dt}
-            }},
-            {"$group": {"_id": None, "avg": {"$avg": "$fluency_score"}}}
-        ]
-        
-        training_res = await db["training_sessions"].aggregate(pipeline).to_list(None)
-        speech_res = await db["speech_analysis"].aggregate(pipeline).to_list(None)
-        
-        scores = []
-        if training_res: scores.append(training_res[0]["avg"])
-        if speech_res: scores.append(speech_res[0]["avg"])
-        
-        day_avg = round(sum(scores) / len(scores)) if scores else 0
-        
-        trend.append({
-            "day": target_date.strftime("%a"), # e.g. "Mon"
-            "score": day_avg
-        })
-        
-    return trend
+async def conditional(request: Request, response: Response, user_id: str, endpoint: str, compute):
+    """
+    Serves a per-user read through the response cache, tagged with the
+    user's data version. A client that already has this version gets an
+    empty 304 without the session collections being touched. On
+    secondaries, the version and the data are read in one causally
+    consistent session, so the data is never older than its version.
+    """
+    async with read_session() as session:
+        version = await data_version.current(user_id, session)
+        tag = f"{version}-{datetime.utcnow():%Y-%m-%d}" if endpoint == "stats" else str(version)
+        headers = {"ETag": f'W/"{tag}"', "Cache-Control": "private, no-cache"}
+        if _etag_matches(request, headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+        return await response_cache.get_or_compute(user_id, version, endpoint, lambda: compute(session))
 
-async def calculate_streak(user_id: str) -> int:
-    db = get_db()
-    
-    # Get all unique dates with activity
-    # Combine training sessions and speech analysis
-    pipeline = [
-        {"$match": {"user_id": user_id}},
-        {"$project": {
-            "date": {
-                "$dateToString": {
-                    "format": "%Y-%m-%d",
-                    "date": "$created_at"
-                }
-            }
-        }},
-        {"$group": {"_id": "$date"}},
-        {"$sort": {"_id": -1}}
-    ]
-    
-    training_dates = await db["training_sessions"].aggregate(pipeline).to_list(None)
-    speech_dates = await db["speech_analysis"].aggregate(pipeline).to_list(None)
-    
-    all_dates = sorted(list(set([d["_id"] for d in training_dates] + [d["_id"] for d in speech_dates])), reverse=True)
-    
-    if not all_dates:
-        return 0
-        
-    today = datetime.utcnow().strftime("%Y-%m-%d")
-    yesterday = (datetime.utcnow() - timedelta(days=1)).strftime("%Y-%m-%d")
-    
-    # If the latest activity is not today or yesterday, streak is broken
-    if all_dates[0] not in [today, yesterday]:
-        return 0
-        
-    streak = 0
-    current_date = datetime.strptime(all_dates[0], "%Y-%m-%d")
-    
-    for date_str in all_dates:
-        date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-        expected_date = current_date - timedelta(days=streak)
-        
-        if date_obj.date() == expected_date.date():
-            streak += 1
-        else:
-            break
-            
-    return streak
+@router.get("/stats")
+async def get_dashboard_stats(request: Request, response: Response, user_id: str = Depends(get_read_user_id)):
+    # Unique levels mastered, average fluency, streak and the 7-day trend,
+    # all read from the per-user rollups (see rollups.py)
+    return await conditional(request, response, user_id, "stats", lambda session: rollups.read_dashboard_stats(user_id, session))
 
 @router.get("/sessions")
-async def get_recent_sessions(user_id: str = Depends(get_current_user_id)):
-    db = get_db()
-    
-    # 1. Fetch Speech Analysis sessions
-    speech_sessions = await db["speech_analysis"].find({"user_id": user_id}).sort("created_at", -1).to_list(10)
-    for s in speech_sessions:
-        s["_id"] = str(s["_id"])
-        s["session_type"] = "speech_analysis"
-        if "created_at" not in s:
-            s["created_at"] = datetime.utcnow()
-        
-    # 2. Fetch Training sessions
-    training_sessions = await db["training_sessions"].find({"user_id": user_id}).sort("created_at", -1).to_list(10)
-    for s in training_sessions:
-        s["_id"] = str(s["_id"])
-        s["session_type"] = "training"
-        if "created_at" not in s:
-            s["created_at"] = datetime.utcnow()
-        # Map fields for UI consistency
-        s["fluency_score"] = s.get("fluency_score", 0)
-        
-    # 3. Merge and sort - with safe fallback for created_at
-    all_sessions = sorted(
-        speech_sessions + training_sessions, 
-        key=lambda x: x.get("created_at", datetime.min), 
-        reverse=True
-    )[:10]
-    return all_sessions
+async def get_recent_sessions(request: Request, response: Response, user_id: str = Depends(get_read_user_id)):
+    return await conditional(request, response, user_id, "sessions", lambda session: load_recent_sessions(user_id, session))
+
+async def load_recent_sessions(user_id: str, session=None):
+    # Latest 10 across both collections, with full payloads (the analysis
+    # page reads stutterEvents from the newest entry)
+    page = await fetch_history(user_id, limit=10, include=HEAVY_FIELDS, session=session)
+    return page["items"]
+
+@router.get("/sessions/history")
+async def get_session_history(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    include: List[str] = Query([]),
+    user_id: str = Depends(get_read_user_id)
+):
+    try:
+        return await fetch_history(user_id, limit=limit, cursor=cursor, include=include)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/export")
+async def export_history(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    user_id: str = Depends(get_read_user_id)
+):
+    # The whole history in [from, to), oldest first, streamed from the cursors
+    filename = f"history-{datetime.utcnow():%Y%m%d}.{format}"
+    return StreamingResponse(
+        export.stream(user_id, format, start, end),
+        media_type=export.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.post("/analyze", status_code=status.HTTP_202_ACCEPTED)
+async def analyze_speech(file: UploadFile = File(...), user_id: str = Depends(get_current_user_id)):
+    # Refuse before copying the upload when the queue is already saturated
+    try:
+        await job_queue.check_capacity()
+    except job_queue.QueueFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many analyses in progress, please retry later",
+            headers={"Retry-After": str(e.retry_after)},
+        )
 
-@router.post("/analyze")
-async def analyze_speech(background_tasks: BackgroundTasks, file: UploadFile = File(...), user_id: str = Depends(get_current_user_id)):
     session_id = str(uuid.uuid4())
-    temp_filename = f"temp_{session_id}_{file.filename}"
-    
-    with open(temp_filename, "wb") as f:
-        content = await file.read()
-        f.write(content)
-    
-    background_tasks.add_task(process_and_store, user_id, temp_filename)
+    # Streamed to the spool directory chunk by chunk (and hashed), off the event loop
+    upload = await spool.save(file, prefix=session_id)
+
+    # A recording analysed before gets its earlier result without a job
+    cached = await result_cache.lookup(upload.sha256)
+    if cached is not None:
+        await spool.discard(upload.path)
+        result_id = await store_analysis(user_id, session_id, cached)
+        await job_queue.record_done(user_id, session_id, result_id, upload.sha256)
+        return {"message": "Analysis complete", "session_id": session_id}
+
+    await job_queue.enqueue(user_id, session_id, upload.path, upload.sha256)
     return {"message": "Analysis started", "session_id": session_id}
 
+@router.websocket("/analyze/stream")
+async def analyze_stream(
+    websocket: WebSocket,
+    token: str = Query(...),
+    format: str = Query("s16le"),
+    sample_rate: int = Query(...),
+):
+    """
+    Live analysis while the user speaks. The client sends mono PCM frames
+    as binary messages and {"type": "end"} when done; labels of each 3 s
+    window come back as {"type": "windows", ...} messages, and the merged
+    analysis, saved like an upload's, as {"type": "result", ...}.
+    """
+    # numpy and the inference engine load with the first stream
+    from ..services import streaming
+
+    await websocket.accept()
+    try:
+        user_id = str((await get_current_user(token))["_id"])
+    except HTTPException:
+        await websocket.close(code=1008, reason="Could not validate credentials")
+        return
+    if format not in streaming.FORMATS or sample_rate != settings.ML_SAMPLE_RATE:
+        await websocket.close(
+            code=1003, reason=f"Expected {'/'.join(streaming.FORMATS)} mono PCM at {settings.ML_SAMPLE_RATE} Hz"
+        )
+        return
+    if streaming.active >= settings.STREAM_MAX_SESSIONS:
+        await websocket.close(code=1013, reason="Too many live analyses, please retry later")
+        return
+
+    streaming.active += 1
+    try:
+        analyzer = streaming.new_analyzer()
+        await websocket.send_json({"type": "ready", "max_frame_samples": analyzer.max_frame})
+        pipeline = streaming.StreamPipeline(websocket, analyzer, streaming.FORMATS[format])
+        try:
+            predictions = await pipeline.run()
+        except streaming.StreamError as e:
+            await websocket.close(code=e.code, reason=e.reason)
+            return
+        if predictions is None:
+            if not pipeline.disconnected:
+                await websocket.close()
+            return
+
+        analysis_result = summarize(predictions)
+        session_id = str(uuid.uuid4())
+        with metrics.stage("store"):
+            result_id = await store_analysis(user_id, session_id, analysis_result)
+        # Visible through GET /analyze/{session_id} like any other analysis
+        await job_queue.record_done(user_id, session_id, result_id)
+        if not pipeline.disconnected:
+            await websocket.send_json({"type": "result", "session_id": session_id, "result": analysis_result})
+            await websocket.close()
+    finally:
+        streaming.active -= 1
+
+@router.get("/analyze/{session_id}")
+async def get_analysis_status(session_id: str, user_id: str = Depends(get_read_user_id)):
+    job = await job_queue.get_job(session_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+
+    response = {
+        "session_id": session_id,
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+        "error": job.get("error"),
+        "result": None
+    }
+    if job["status"] == "done" and job.get("result_id"):
+        db = get_db()
+        result = await db["speech_analysis"].find_one({"_id": job["result_id"]})
+        if result:
+            result["_id"] = str(result["_id"])
+            response["result"] = timeline.decode_document(result)
+    return response
+
+@router.get("/analyze/{session_id}/timeline")
+async def get_analysis_timeline(
+    session_id: str,
+    start: Optional[float] = Query(None, alias="from", ge=0),
+    end: Optional[float] = Query(None, alias="to", ge=0),
+    user_id: str = Depends(get_read_user_id)
+):
+    # Events of one analysis whose timestamp falls in [from, to) seconds;
+    # columnar timelines decode only that slice
+    job = await job_queue.get_job(session_id, user_id)
+    if job is None or not job.get("result_id"):
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    db = get_db()
+    result = await db["speech_analysis"].find_one(
+        {"_id": job["result_id"]},
+        {field: 1 for field in timeline.TIMELINE_FIELDS}
+    )
+    if result is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    timeline.decode_document(result, start, end)
+    return {field: result.get(field, []) for field in timeline.TIMELINE_FIELDS}
+
 @router.post("/training/complete")
 async def complete_training(
     exercise_id: int, 
     user_id: str = Depends(get_current_user_id),
-    session_data: Optional[dict] = None
+    session_data: Optional[TrainingSessionData] = None
 ):
-    db = get_db()
-    
-    training_data = {
-        "user_id": user_id,
-        "exercise_id": exercise_id,
-        "completed": True,
-        "created_at": datetime.utcnow()
-    }
-    
-    if session_data:
-        training_data.update({
-            "spoken_text": session_data.get("spokenText"),
-            "expected_text": session_data.get("expectedText"),
-            "fluency_score": session_data.get("fluencyScore"),
-            "is_correct": session_data.get("isCorrect"),
-            "word_count": session_data.get("wordCount"),
-            "error_count": session_data.get("errorCount"),
-            "type": session_data.get("type"),
-            "difficulty": session_data.get("difficulty"),
-            "level": session_data.get("level")
-        })
-    
-    # Use update_one with upsert=True to overwrite the latest score for this specific exercise
-    # This ensures "what ever the new score will come will be the new score for that level"
-    await db["training_sessions"].update_one(
-        {"user_id": user_id, "exercise_id": exercise_id},
-        {"$set": training_data},
-        upsert=True
+    completion = TrainingCompletion(
+        exercise_id=exercise_id,
+        **(session_data.model_dump(exclude_unset=True) if session_data else {})
     )
-    
-    # Update user progress
-    if session_data and session_data.get("isCorrect"):
-        await db["user_progress"].update_one(
-            {"user_id": user_id, "type": session_data.get("type")},
-            {"$set": {
-                "last_completed_level": session_data.get("level"),
-                "last_completed_difficulty": session_data.get("difficulty"),
-                "updated_at": datetime.utcnow()
-            }},
-            upsert=True
-        )
-        
+    # Overwrites the latest score for this specific exercise
+    # This ensures "what ever the new score will come will be the new score for that level"
+    error = await record_completion(user_id, completion)
+    if error:
+        raise HTTPException(status_code=500, detail="Could not save training session")
     return {"message": "Training session saved"}
 
+@router.post("/training/complete/batch")
+async def complete_training_batch(batch: TrainingBatchRequest, user_id: str = Depends(get_current_user_id)):
+    # Offline-synced or rapid-fire attempts in one request
+    results = await record_completions(user_id, batch.completions)
+    return {"results": results}
+
+@router.post("/training/score")
+async def score_training(request: TrainingScoreRequest, user_id: str = Depends(get_read_user_id)):
+    # Word-level alignment of each spoken text against its expected text;
+    # nothing is saved
+    from ..services import scoring
+
+    results = await asyncio.to_thread(
+        scoring.score_batch, [(a.expected_text, a.spoken_text) for a in request.attempts], True
+    )
+    return {"results": [asdict(result) for result in results]}
+
 @router.get("/training/progress")
-async def get_training_progress(user_id: str = Depends(get_current_user_id)):
-    db = get_db()
+async def get_training_progress(request: Request, response: Response, user_id: str = Depends(get_read_user_id)):
+    return await conditional(request, response, user_id, "training_progress", lambda session: load_training_progress(user_id, session))
+
+async def load_training_progress(user_id: str, session=None):
+    db = get_read_db()
     # Get all training sessions for this user to see scores
     sessions = await db["training_sessions"].find(
         {"user_id": user_id},
-        {"exercise_id": 1, "fluency_score": 1, "is_correct": 1}
+        {"exercise_id": 1, "fluency_score": 1, "is_correct": 1},
+        session=session
     ).to_list(None)
     
     # Format as a dictionary for easier frontend lookup: { exercise_id: { score, is_correct } }
@@ -254,26 +284,46 @@ async def get_training_progress(user_id: str = Depends(get_current_user_id)):
     
     return {"progress": progress_map}
 
-async def process_and_store(user_id: str, file_path: str):
-    db = get_db()
-    try:
+@router.get("/recommendations")
+async def get_recommendations(limit: int = Query(5, ge=1, le=50), user_id: str = Depends(get_read_user_id)):
+    # Next exercises for the stutter types of the user's latest analyses;
+    # ranked from the in-memory catalog on every request
+    async with read_session() as session:
+        version = await data_version.current(user_id, session)
+        return await recommendations.recommend(user_id, version, limit, session)
+
+async def process_and_store(user_id: str, file_path: str, session_id: str, content_hash: Optional[str] = None):
+    # Run by the analysis job workers; errors propagate so the job is marked
+    # failed, and the worker discards the upload once the job is finished
+
+    # A duplicate may have finished while this job was queued
+    with metrics.stage("cache_lookup"):
+        analysis_result = await result_cache.lookup(content_hash) if content_hash else None
+    if analysis_result is None:
         # Call the ML service logic
         analysis_result = await run_stutter_analysis(file_path)
-        
-        result = {
-            "user_id": user_id,
-            "transcript": analysis_result["transcript"],
-            "fluency_score": analysis_result["fluencyScore"],
-            "total_words": analysis_result["totalWords"],
-            "stutterEvents": analysis_result["stutterEvents"],
-            "headMovements": analysis_result["headMovements"],
-            "created_at": datetime.utcnow()
-        }
-        
-        await db["speech_analysis"].insert_one(result)
-        
-    except Exception:
-        logger.exception("Processing error")
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        if content_hash:
+            await result_cache.store(content_hash, analysis_result)
+    with metrics.stage("store"):
+        return await store_analysis(user_id, session_id, analysis_result)
+
+async def store_analysis(user_id: str, session_id: str, analysis_result: dict):
+    db = get_db()
+    result = {
+        "user_id": user_id,
+        "session_id": session_id,
+        "transcript": analysis_result["transcript"],
+        "fluency_score": analysis_result["fluencyScore"],
+        "total_words": analysis_result["totalWords"],
+        "stutterEvents": analysis_result["stutterEvents"],
+        "severity": analysis_result["severity"],
+        "stutter_intensity": analysis_result["stutterIntensity"],
+        "headMovements": analysis_result["headMovements"],
+        "created_at": datetime.utcnow()
+    }
+
+    inserted = await db["speech_analysis"].insert_one(timeline.encode_document(result))
+    await rollups.record_analysis(user_id, result["fluency_score"], result["created_at"])
+    await streaks.record_activity(user_id, result["created_at"])
+    await data_version.bump(user_id)
+    return inserted.inserted_id
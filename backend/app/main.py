@@ -1,27 +1,47 @@
-from fastapi import FastAPI, BackgroundTasks, UploadFile, File
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, UploadFile, File
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .utils.db import connect_to_mongo, close_mongo_connection, get_db
+from .utils.db import connect_to_mongo, close_mongo_connection, ping
 from .api import auth, dashboard
 from .utils.config import settings
+from .services.upload_service import UploadSizeLimitMiddleware, spool
+from .services import job_queue, ml_service, recommendations
+from .services.startup import prepare, readiness
+from .utils import metrics
+from .utils.auth import get_current_user_id
+from .utils.cache import response_cache
+from .utils.metrics import MetricsMiddleware
+from .utils.passwords import hasher
 
+import asyncio
 from contextlib import asynccontextmanager
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
+    # Startup: migrations, job recovery and the workers run in the
+    # background (see services/startup.py), /health/ready tells when done
     await connect_to_mongo()
-    db = get_db()
-    # Create indexes for performance
-    await db["speech_analysis"].create_index([("user_id", 1), ("created_at", -1)])
-    await db["training_sessions"].create_index([("user_id", 1), ("created_at", -1)])
-    await db["users"].create_index("username", unique=True)
-    await db["users"].create_index("email", unique=True)
+    recommendations.catalog.load()
+    preparing = asyncio.create_task(prepare(dashboard.process_and_store))
+    watching = asyncio.create_task(recommendations.catalog.watch())
     yield
     # Shutdown
+    preparing.cancel()
+    watching.cancel()
+    await asyncio.gather(preparing, watching, return_exceptions=True)
+    await job_queue.workers.stop()
+    ml_service.shutdown()
+    hasher.shutdown()
     await close_mongo_connection()
 
 app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
 
+AUTH_PREFIX = "/api/v1/auth"
+DASHBOARD_PREFIX = "/api/v1/dashboard"
+
+# Reject oversized uploads before the body is read; the path as mounted below
+app.add_middleware(UploadSizeLimitMiddleware, paths=[f"{DASHBOARD_PREFIX}/analyze"], upload_spool=spool)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -31,14 +51,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so the latency includes every other middleware
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Routers
-app.include_router(auth.router, prefix="/api/v1/auth", tags=["auth"])
-app.include_router(dashboard.router, prefix="/api/v1/dashboard", tags=["dashboard"])
+app.include_router(auth.router, prefix=AUTH_PREFIX, tags=["auth"])
+app.include_router(dashboard.router, prefix=DASHBOARD_PREFIX, tags=["dashboard"])
 
 @app.get("/")
 async def root():
     return {"message": f"Welcome to {settings.PROJECT_NAME} API"}
 
+@app.get("/health/live")
+async def liveness():
+    # The process is up and its event loop responsive; no dependencies checked
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    # Ready for traffic: startup finished and MongoDB answers
+    if not readiness.ready:
+        raise HTTPException(status_code=503, detail=readiness.report())
+    try:
+        await asyncio.wait_for(ping(), settings.HEALTH_CHECK_TIMEOUT_SECONDS)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail={**readiness.report(), "status": "unavailable", "error": str(e) or type(e).__name__})
+    return readiness.report()
+
+@app.get("/cache/stats", dependencies=[Depends(get_current_user_id)])
+async def cache_stats():
+    # Hit/miss/eviction counters of this process' response cache, for sizing it
+    return response_cache.stats()
+
+@app.get("/db/pool/stats", dependencies=[Depends(get_current_user_id)])
+async def pool_stats():
+    # Connections and checkout waits per MongoDB server, for sizing the pool
+    return {"max_pool_size": settings.MONGODB_MAX_POOL_SIZE, "servers": metrics.pool_listener.stats()}
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    backlog = await job_queue.backlog()
+    extra = (
+        metrics.gauge("analysis_jobs", "Analysis jobs waiting or running", "status", backlog)
+        + metrics.gauge("response_cache", "Response cache state of this process", "field", {
+            key: response_cache.stats().get(key, 0) for key in ("entries", "bytes")
+        })
+        + metrics.gauge("password_hashes", "Password hashing work on the thread pool", "state", {
+            "pending": hasher.pending, "rejected": hasher.rejected,
+        })
+    )
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     import os
@@ -0,0 +1,61 @@
+import shutil
+import subprocess
+import wave
+
+import numpy as np
+
+
+def decode_audio(file_path: str, sample_rate: int) -> np.ndarray:
+    """
+    Decodes a recording to mono float32 PCM in [-1, 1] at `sample_rate`.
+    16-bit WAV files are read directly; anything else (webm/mp4 recordings
+    from the browser) is decoded by ffmpeg, which must be on PATH.
+    """
+    if file_path.lower().endswith(".wav"):
+        try:
+            return _decode_wav(file_path, sample_rate)
+        except (wave.Error, ValueError):
+            pass
+    return _decode_ffmpeg(file_path, sample_rate)
+
+
+def _decode_wav(file_path: str, sample_rate: int) -> np.ndarray:
+    with wave.open(file_path, "rb") as wav:
+        if wav.getsampwidth() != 2 or wav.getframerate() != sample_rate:
+            raise ValueError("Needs resampling")
+        channels = wav.getnchannels()
+        pcm = np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2")
+    if channels > 1:
+        pcm = pcm.reshape(-1, channels).mean(axis=1)
+    return (pcm / 32768.0).astype(np.float32)
+
+
+def _decode_ffmpeg(file_path: str, sample_rate: int) -> np.ndarray:
+    if shutil.which("ffmpeg") is None:
+        raise RuntimeError("ffmpeg is required to decode non-WAV recordings")
+    proc = subprocess.run(
+        [
+            "ffmpeg", "-nostdin", "-loglevel", "error", "-i", file_path,
+            "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "f32le", "-",
+        ],
+        capture_output=True,
+        check=True,
+    )
+    return np.frombuffer(proc.stdout, dtype="<f4").copy()
+
+
+def padded_length(n_samples: int, window: int, hop: int) -> int:
+    # Smallest length >= n_samples that ends exactly on a window boundary,
+    # so the tail of the recording still lands in a (zero-padded) window
+    if n_samples <= window:
+        return window
+    return window + -(-(n_samples - window) // hop) * hop
+
+
+def count_windows(n_samples: int, window: int, hop: int) -> int:
+    return (padded_length(n_samples, window, hop) - window) // hop + 1
+
+
+def frame_windows(audio: np.ndarray, window: int, hop: int) -> np.ndarray:
+    # (n_windows, window) strided view over `audio`; no samples are copied
+    return np.lib.stride_tricks.sliding_window_view(audio, window)[::hop]
@@ -0,0 +1,38 @@
+"""
+Per-user data version for conditional requests.
+
+`data_version` on the user document is incremented by every write path
+that changes what the dashboard shows. Read endpoints derive their ETag
+and their response cache key from it, so a bumped version makes both the
+client's copy and the cached responses stale at once.
+"""
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from ..utils.cache import response_cache
+from ..utils.db import get_db, get_read_db
+
+FIELD = "data_version"
+# Cached endpoints whose content depends on the user's activity
+ENDPOINTS = ("stats", "sessions", "training_progress", "recommendations")
+
+
+async def current(user_id: str, session=None) -> int:
+    # Read where the dashboard reads its data, see utils.db.read_session
+    db = get_read_db()
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, {FIELD: 1}, session=session)
+    return (user or {}).get(FIELD, 0)
+
+
+async def bump(user_id: str) -> int:
+    db = get_db()
+    user = await db.users.find_one_and_update(
+        {"_id": ObjectId(user_id)},
+        {"$inc": {FIELD: 1}},
+        projection={FIELD: 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    version = (user or {}).get(FIELD, 0)
+    # Entries of the previous version can no longer be read; free them now
+    await response_cache.invalidate(user_id, version - 1, *ENDPOINTS)
+    return version
@@ -0,0 +1,117 @@
+"""
+Streaming export of a user's practice history, for clinicians.
+
+Training sessions and speech analyses are read with one find() cursor
+each, in the order of their (user_id, created_at, _id) index. Each cursor
+fetches EXPORT_BATCH_SIZE documents per round-trip, and the two are
+merged oldest first as documents arrive. Encoded lines are flushed in
+chunks of about EXPORT_CHUNK_BYTES. At any time the process holds one
+batch per cursor and one chunk, whatever the size of the history. The
+next batch is only fetched once the client has taken the previous chunks.
+
+NDJSON carries whole documents, with their event timelines decoded. CSV
+has one row per document in fixed columns, with stutter events
+summarized as a count and a total duration.
+"""
+import csv
+import io
+import json
+from contextlib import aclosing
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from bson import ObjectId
+
+from ..utils.config import settings
+from ..utils.db import get_read_db
+from .timeline import decode_document
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+SOURCES = {"training": "training_sessions", "speech_analysis": "speech_analysis"}
+CSV_COLUMNS = [
+    "session_type", "id", "created_at", "exercise_id", "type", "difficulty", "level",
+    "expected_text", "spoken_text", "fluency_score", "is_correct", "word_count", "error_count",
+    "severity", "stutter_intensity", "stutter_events", "stutter_seconds", "total_words", "transcript",
+]
+
+
+async def _cursor(session_type: str, user_id: str, start: Optional[datetime], end: Optional[datetime]):
+    query = {"user_id": user_id}
+    if start or end:
+        query["created_at"] = {**({"$gte": start} if start else {}), **({"$lt": end} if end else {})}
+    cursor = get_read_db()[SOURCES[session_type]].find(
+        query, sort=[("created_at", 1), ("_id", 1)], batch_size=settings.EXPORT_BATCH_SIZE,
+    )
+    try:
+        async for doc in cursor:
+            doc["session_type"] = session_type
+            yield doc
+    finally:
+        # Kills the server-side cursor when the client leaves early
+        await cursor.close()
+
+
+def _key(doc: dict) -> tuple:
+    created_at = doc.get("created_at")
+    return (created_at if isinstance(created_at, datetime) else datetime.min), doc["_id"]
+
+
+async def documents(user_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> AsyncIterator[dict]:
+    """Both collections' documents for the user, oldest first."""
+    cursors = [_cursor(session_type, user_id, start, end) for session_type in SOURCES]
+    try:
+        heads = [await anext(cursor, None) for cursor in cursors]
+        while any(head is not None for head in heads):
+            k = min((i for i, head in enumerate(heads) if head is not None), key=lambda i: _key(heads[i]))
+            yield heads[k]
+            heads[k] = await anext(cursors[k], None)
+    finally:
+        for cursor in cursors:
+            await cursor.aclose()
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Cannot export {type(value).__name__}")
+
+
+def ndjson_line(doc: dict) -> str:
+    decode_document(doc)
+    return json.dumps(doc, default=_json_default, ensure_ascii=False) + "\n"
+
+
+def csv_row(doc: dict) -> list:
+    decode_document(doc)
+    events = doc.get("stutterEvents") or []
+    created_at = doc.get("created_at")
+    row = {
+        **doc,
+        "id": str(doc["_id"]),
+        "created_at": created_at.isoformat() if isinstance(created_at, datetime) else created_at,
+        "stutter_events": len(events) if doc["session_type"] == "speech_analysis" else None,
+        "stutter_seconds": round(sum(e.get("duration", 0) for e in events), 2) if events else None,
+    }
+    return [row.get(column) for column in CSV_COLUMNS]
+
+
+async def stream(user_id: str, format: str, start: Optional[datetime] = None,
+                 end: Optional[datetime] = None) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    if format == "csv":
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_COLUMNS)
+    async with aclosing(documents(user_id, start, end)) as docs:
+        async for doc in docs:
+            if format == "csv":
+                writer.writerow(csv_row(doc))
+            else:
+                buffer.write(ndjson_line(doc))
+            if buffer.tell() >= settings.EXPORT_CHUNK_BYTES:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
@@ -0,0 +1,86 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from ..utils.db import get_read_db
+from .timeline import decode_document
+
+# Large per-analysis payloads, left out unless explicitly requested
+HEAVY_FIELDS = ["stutterEvents", "headMovements"]
+SORT = {"created_at": -1, "_id": -1}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime, _id: str) -> str:
+    raw = json.dumps({"t": created_at.isoformat(), "id": _id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(raw["t"]), ObjectId(raw["id"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise InvalidCursor("Invalid cursor")
+
+
+def _branch(user_id: str, after: Optional[Tuple[datetime, ObjectId]], limit: int,
+            session_type: str, exclude: List[str]) -> List[dict]:
+    match: Dict[str, Any] = {"user_id": user_id}
+    if after:
+        created_at, _id = after
+        # Range on created_at keeps the index scan starting at the cursor;
+        # the $or only breaks ties on equal timestamps
+        match["created_at"] = {"$lte": created_at}
+        match["$or"] = [{"created_at": {"$lt": created_at}}, {"_id": {"$lt": _id}}]
+
+    stages = [
+        {"$match": match},
+        {"$sort": SORT},
+        {"$limit": limit},
+        {"$addFields": {"session_type": session_type}},
+    ]
+    if session_type == "training":
+        # Map fields for UI consistency
+        stages.append({"$addFields": {"fluency_score": {"$ifNull": ["$fluency_score", 0]}}})
+    if exclude:
+        stages.append({"$project": {field: 0 for field in exclude}})
+    return stages
+
+
+async def fetch_history(user_id: str, limit: int, cursor: Optional[str] = None,
+                        include: Optional[List[str]] = None, session=None) -> Dict[str, Any]:
+    """
+    One page of the user's merged speech analyses and training sessions,
+    newest first. Each collection contributes at most `limit` documents
+    read in index order from the cursor position, then $unionWith merges
+    them server-side, so every page costs the same as the first.
+    """
+    db = get_read_db()
+    after = decode_cursor(cursor) if cursor else None
+    exclude = [field for field in HEAVY_FIELDS if field not in (include or [])]
+
+    pipeline = _branch(user_id, after, limit, "training", []) + [
+        {"$unionWith": {
+            "coll": "speech_analysis",
+            "pipeline": _branch(user_id, after, limit, "speech_analysis", exclude),
+        }},
+        {"$sort": SORT},
+        {"$limit": limit},
+    ]
+    items = await db["training_sessions"].aggregate(pipeline, session=session).to_list(limit)
+
+    next_cursor = None
+    if len(items) == limit and isinstance(items[-1].get("created_at"), datetime):
+        next_cursor = encode_cursor(items[-1]["created_at"], str(items[-1]["_id"]))
+    for item in items:
+        item["_id"] = str(item["_id"])
+        decode_document(item)
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,246 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from ..utils.config import settings
+from .audio import count_windows, frame_windows, padded_length
+
+# Output classes of the chunk classifier (detection_model2)
+CLASS_NAMES = ["NoStutter", "WordRep", "SoundRep", "Prolongation", "Interjection", "Block"]
+
+
+class ModelBackend:
+    """
+    A stutter classifier over batches of raw audio windows.
+    `predict` receives a float32 array of shape (batch_size, window_samples),
+    batch_size being ML_BATCH_SIZE or, for live streams, smaller,
+    and returns class probabilities of shape (batch_size, len(CLASS_NAMES)).
+    Backends are instantiated once per worker process.
+    """
+
+    name = "base"
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+
+class NumpyBackend(ModelBackend):
+    """
+    Deterministic stand-in for the real model: a fixed linear layer over a
+    few energy and zero-crossing features. Same input, same output, on any
+    machine, without torch installed.
+    """
+
+    name = "numpy"
+
+    def __init__(self, frames_per_window: int = 30):
+        # Changing these weights calls for a new model_versions.NUMPY
+        rng = np.random.default_rng(28)
+        self.frames_per_window = frames_per_window
+        self.weights = rng.normal(size=(5, len(CLASS_NAMES))).astype(np.float32)
+        self.bias = np.zeros(len(CLASS_NAMES), dtype=np.float32)
+        # Bias towards fluent speech, like the real class distribution
+        self.bias[0] = 1.0
+        # Rough centre of each feature for speech-level audio
+        self.offsets = np.array([-3.0, 0.5, 0.6, 0.1, 2.0], dtype=np.float32)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        n, samples = batch.shape
+        usable = samples - samples % self.frames_per_window
+        frames = batch[:, :usable].reshape(n, self.frames_per_window, -1)
+        frame_energy = np.sqrt(np.mean(frames * frames, axis=2)) + 1e-6
+        mean_energy = frame_energy.mean(axis=1)
+
+        features = np.stack([
+            np.log(mean_energy),
+            np.mean(np.abs(np.diff(np.signbit(batch), axis=1)), axis=1),
+            frame_energy.std(axis=1) / mean_energy,
+            np.mean(frame_energy < 0.1 * mean_energy[:, None], axis=1),
+            frame_energy.max(axis=1) / mean_energy,
+        ], axis=1).astype(np.float32) - self.offsets
+
+        logits = features @ self.weights + self.bias
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+
+class TorchBackend(ModelBackend):
+    """
+    Fine-tuned classifier exported with TorchScript to ML_MODEL_PATH.
+    torch is imported here, in the worker process, never by the API itself.
+    """
+
+    name = "torch"
+
+    def __init__(self):
+        import torch
+
+        self.torch = torch
+        self.model = torch.jit.load(settings.ML_MODEL_PATH, map_location="cpu").eval()
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        with self.torch.inference_mode():
+            logits = self.model(self.torch.from_numpy(batch))
+            return self.torch.softmax(logits, dim=-1).numpy()
+
+
+BACKENDS = {
+    NumpyBackend.name: NumpyBackend,
+    TorchBackend.name: TorchBackend,
+}
+
+_backends: dict[str, ModelBackend] = {}
+
+
+def get_backend(name: str) -> ModelBackend:
+    if name not in _backends:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown ML backend: {name}")
+        _backends[name] = BACKENDS[name]()
+    return _backends[name]
+
+
+@dataclass
+class WindowPredictions:
+    labels: np.ndarray       # uint8 class index per window
+    confidence: np.ndarray   # float32 probability of that class
+    window_seconds: float
+    hop_seconds: float
+    duration: float
+
+    @property
+    def starts(self) -> np.ndarray:
+        return np.arange(len(self.labels), dtype=np.float32) * self.hop_seconds
+
+
+def _classify(windows: np.ndarray, backend: ModelBackend, batch_size: int):
+    # Fixed-size batches; the last one is zero-padded
+    n = len(windows)
+    batch = np.zeros((batch_size, windows.shape[1]), dtype=np.float32)
+    labels = np.empty(n, dtype=np.uint8)
+    confidence = np.empty(n, dtype=np.float32)
+    for start in range(0, n, batch_size):
+        k = min(batch_size, n - start)
+        batch[:k] = windows[start:start + k]
+        batch[k:] = 0.0
+        probs = backend.predict(batch)[:k]
+        labels[start:start + k] = probs.argmax(axis=1)
+        confidence[start:start + k] = probs.max(axis=1)
+    return labels, confidence
+
+
+def _infer_range(shm_name, n_samples, window, hop, first, last, batch_size, backend_name):
+    # Runs in a worker process: attach to the decoded audio, view it as
+    # windows without copying and classify windows [first, last)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        audio = np.ndarray((n_samples,), dtype=np.float32, buffer=shm.buf)
+        windows = frame_windows(audio, window, hop)
+        result = _classify(windows[first:last], get_backend(backend_name), batch_size)
+        del audio, windows
+        return result
+    finally:
+        shm.close()
+
+
+def _infer_windows(windows, batch_size, backend_name):
+    # Runs in a worker process on windows sent along with the task
+    return _classify(windows, get_backend(backend_name), batch_size)
+
+
+class InferenceEngine:
+    """
+    Classifies a decoded recording in overlapping windows on a process pool.
+    The audio is placed in shared memory once; every task works on its own
+    contiguous range of windows, so long recordings spread over all cores
+    and the event loop only awaits the results.
+    """
+
+    def __init__(self, workers: int, backend: str, batch_size: int,
+                 sample_rate: int, window_seconds: float, hop_seconds: float):
+        self.workers = workers or os.cpu_count() or 1
+        self.backend = backend
+        self.batch_size = batch_size
+        self.sample_rate = sample_rate
+        self.window = int(window_seconds * sample_rate)
+        self.hop = int(hop_seconds * sample_rate)
+        self._pool: ProcessPoolExecutor | None = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    async def classify_windows(self, windows: np.ndarray):
+        """
+        Labels and confidences of a few (n, window) windows, e.g. of a live
+        stream. They travel with the task instead of through shared memory,
+        in batches no larger than needed.
+        """
+        loop = asyncio.get_running_loop()
+        batch_size = min(self.batch_size, len(windows))
+        return await loop.run_in_executor(self.pool, _infer_windows, windows, batch_size, self.backend)
+
+    @staticmethod
+    def _share(audio: np.ndarray, n_samples: int) -> shared_memory.SharedMemory:
+        shm = shared_memory.SharedMemory(create=True, size=n_samples * 4)
+        shared = np.ndarray((n_samples,), dtype=np.float32, buffer=shm.buf)
+        shared[:len(audio)] = audio
+        shared[len(audio):] = 0.0
+        del shared
+        return shm
+
+    async def classify(self, audio: np.ndarray) -> WindowPredictions:
+        n_samples = padded_length(len(audio), self.window, self.hop)
+        n_windows = count_windows(len(audio), self.window, self.hop)
+
+        shm = await asyncio.to_thread(self._share, audio, n_samples)
+        try:
+            # Whole batches per task, at most a couple of tasks per worker
+            n_batches = -(-n_windows // self.batch_size)
+            per_task = -(-n_batches // (self.workers * 2)) * self.batch_size
+            loop = asyncio.get_running_loop()
+            futures = [
+                loop.run_in_executor(
+                    self.pool, _infer_range, shm.name, n_samples, self.window, self.hop,
+                    first, min(first + per_task, n_windows), self.batch_size, self.backend,
+                )
+                for first in range(0, n_windows, per_task)
+            ]
+            results = await asyncio.gather(*futures)
+        finally:
+            shm.close()
+            shm.unlink()
+
+        return WindowPredictions(
+            labels=np.concatenate([labels for labels, _ in results]),
+            confidence=np.concatenate([conf for _, conf in results]),
+            window_seconds=self.window / self.sample_rate,
+            hop_seconds=self.hop / self.sample_rate,
+            duration=len(audio) / self.sample_rate,
+        )
+
+
+engine = InferenceEngine(
+    workers=settings.ML_WORKERS,
+    backend=settings.ML_BACKEND,
+    batch_size=settings.ML_BATCH_SIZE,
+    sample_rate=settings.ML_SAMPLE_RATE,
+    window_seconds=settings.ML_WINDOW_SECONDS,
+    hop_seconds=settings.ML_HOP_SECONDS,
+)
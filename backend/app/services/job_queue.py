@@ -0,0 +1,281 @@
+import asyncio
+import logging
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+
+from ..utils.config import settings
+from ..utils import metrics
+from ..utils.db import get_db
+from .upload_service import spool
+
+logger = logging.getLogger(__name__)
+
+JOBS = "analysis_jobs"
+ACTIVE_STATUSES = ["queued", "running"]
+# Jobs of a host that has not come back for this long are given up on
+ABANDONED_AFTER = timedelta(hours=1)
+
+# Handler signature: (user_id, file_path, session_id, content_hash) -> inserted result id
+JobHandler = Callable[[str, str, str, Optional[str]], Awaitable[object]]
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("Analysis queue is full")
+        self.retry_after = retry_after
+
+
+def host() -> str:
+    return settings.ANALYSIS_HOST or socket.gethostname()
+
+
+def _local() -> dict:
+    # The upload is in this host's spool; jobs queued before hosts were
+    # recorded can run anywhere
+    return {"host": {"$in": [host(), None]}}
+
+
+async def ensure_job_indexes():
+    db = get_db()
+    await db[JOBS].create_index([("status", 1), ("created_at", 1)])
+    await db[JOBS].create_index([("status", 1), ("lease_expires_at", 1)])
+
+
+async def check_capacity():
+    db = get_db()
+    active = await db[JOBS].count_documents({"status": {"$in": ACTIVE_STATUSES}}, limit=settings.ANALYSIS_QUEUE_MAX)
+    if active >= settings.ANALYSIS_QUEUE_MAX:
+        raise QueueFull(retry_after=settings.ANALYSIS_RETRY_AFTER_SECONDS)
+
+
+async def enqueue(user_id: str, session_id: str, file_path: str, content_hash: Optional[str] = None):
+    db = get_db()
+    now = datetime.utcnow()
+    await db[JOBS].insert_one({
+        "_id": session_id,
+        "user_id": user_id,
+        "host": host(),
+        "file_path": file_path,
+        "content_hash": content_hash,
+        "status": "queued",
+        "attempts": 0,
+        "error": None,
+        "result_id": None,
+        "lease_expires_at": None,
+        "created_at": now,
+        "updated_at": now,
+    })
+    workers.notify()
+
+
+async def record_done(user_id: str, session_id: str, result_id, content_hash: Optional[str] = None):
+    # A session answered without running a job (e.g. from the result cache)
+    db = get_db()
+    now = datetime.utcnow()
+    await db[JOBS].insert_one({
+        "_id": session_id,
+        "user_id": user_id,
+        "file_path": None,
+        "content_hash": content_hash,
+        "status": "done",
+        "attempts": 0,
+        "error": None,
+        "result_id": result_id,
+        "lease_expires_at": None,
+        "created_at": now,
+        "started_at": now,
+        "finished_at": now,
+        "updated_at": now,
+    })
+
+
+async def backlog() -> Dict[str, int]:
+    db = get_db()
+    counts = {status: 0 for status in ACTIVE_STATUSES}
+    async for row in db[JOBS].aggregate([
+        {"$match": {"status": {"$in": ACTIVE_STATUSES}}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+    ]):
+        counts[row["_id"]] = row["count"]
+    return counts
+
+
+async def get_job(session_id: str, user_id: str) -> dict | None:
+    db = get_db()
+    return await db[JOBS].find_one({"_id": session_id, "user_id": user_id})
+
+
+async def recover_orphaned_jobs() -> int:
+    # A running job of this host whose lease ran out belongs to a worker
+    # that died (crash, redeploy); put it back in the queue or give up on it
+    db = get_db()
+    now = datetime.utcnow()
+    expired = {"status": "running", "lease_expires_at": {"$lt": now}, **_local()}
+    exhausted = {**expired, "attempts": {"$gte": settings.ANALYSIS_MAX_ATTEMPTS}}
+    lost = [job async for job in db[JOBS].find(exhausted, {"file_path": 1})]
+    failed = await db[JOBS].update_many(
+        {**exhausted, "_id": {"$in": [job["_id"] for job in lost]}},
+        {"$set": {"status": "failed", "error": "Worker lost", "lease_expires_at": None, "updated_at": now}},
+    )
+    for job in lost:
+        if job.get("file_path"):
+            await spool.discard(job["file_path"])
+    requeued = await db[JOBS].update_many(
+        expired,
+        {"$set": {"status": "queued", "lease_expires_at": None, "updated_at": now}},
+    )
+    # Uploads spooled on another host that never came back cannot run here
+    cutoff = now - ABANDONED_AFTER
+    abandoned = await db[JOBS].update_many(
+        {
+            "host": {"$nin": [host(), None]},
+            "$or": [
+                {"status": "running", "lease_expires_at": {"$lt": cutoff}},
+                {"status": "queued", "updated_at": {"$lt": cutoff}},
+            ],
+        },
+        {"$set": {"status": "failed", "error": "Worker lost", "lease_expires_at": None, "updated_at": now}},
+    )
+    if failed.modified_count or requeued.modified_count or abandoned.modified_count:
+        logger.warning("Recovered orphaned analysis jobs: %d requeued, %d failed, %d abandoned by their host",
+                       requeued.modified_count, failed.modified_count, abandoned.modified_count)
+    return requeued.modified_count
+
+
+class JobWorkerPool:
+    """
+    A fixed number of worker tasks that claim queued jobs one at a time.
+    Claiming is a single find_one_and_update, so workers never run a job
+    twice. Uploads are spooled to a local directory, so several API replicas
+    can share the collection but each claims and recovers only the jobs of
+    its own host (ANALYSIS_HOST). A running job holds a lease that its
+    worker keeps extending; if the process dies, the lease expires and the
+    job is recovered when the host starts again.
+    """
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self._handler: JobHandler | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    def notify(self):
+        self._wakeup.set()
+
+    def start(self, handler: JobHandler, count: int):
+        self._handler = handler
+        # Tasks inherit the context they are created in, which tags their
+        # database commands in the metrics
+        with metrics.background("job:analysis"):
+            self._tasks = [asyncio.create_task(self._run(i)) for i in range(count)]
+        with metrics.background("job:recovery"):
+            self._tasks.append(asyncio.create_task(self._recover_periodically()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _claim(self) -> dict | None:
+        db = get_db()
+        now = datetime.utcnow()
+        return await db[JOBS].find_one_and_update(
+            {"status": "queued", **_local()},
+            {
+                "$set": {
+                    "status": "running",
+                    "worker": self.worker_id,
+                    # This run's token: a run whose job was reclaimed can no longer touch it
+                    "claim": uuid.uuid4().hex,
+                    "started_at": now,
+                    "updated_at": now,
+                    "lease_expires_at": now + timedelta(seconds=settings.ANALYSIS_JOB_LEASE_SECONDS),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _run(self, index: int):
+        while True:
+            try:
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Failed to claim analysis job")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.ANALYSIS_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Not marked finished: its lease runs out and recovery requeues it
+                logger.exception("Failed to finish analysis job %s", job["_id"])
+
+    async def _process(self, job: dict):
+        db = get_db()
+        heartbeat = asyncio.create_task(self._heartbeat(job["_id"], job["claim"]))
+        try:
+            result_id = await self._handler(job["user_id"], job["file_path"], job["_id"], job.get("content_hash"))
+            update = {"status": "done", "result_id": result_id, "error": None}
+        except asyncio.CancelledError:
+            # Shutting down: leave the job to be recovered once its lease expires
+            raise
+        except Exception as e:
+            logger.exception("Analysis job %s failed", job["_id"])
+            update = {"status": "failed", "error": str(e) or type(e).__name__}
+        finally:
+            heartbeat.cancel()
+
+        now = datetime.utcnow()
+        finished = await db[JOBS].update_one(
+            {"_id": job["_id"], "claim": job["claim"]},
+            {"$set": {**update, "finished_at": now, "updated_at": now, "lease_expires_at": None}},
+        )
+        if not finished.matched_count:
+            # The lease ran out meanwhile and another run owns the job and its upload
+            logger.warning("Analysis job %s was reclaimed before this run finished", job["_id"])
+            return
+        # Not before: a job cancelled at shutdown is retried from this file
+        await spool.discard(job["file_path"])
+
+    async def _heartbeat(self, job_id: str, claim: str):
+        db = get_db()
+        interval = settings.ANALYSIS_JOB_LEASE_SECONDS / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await db[JOBS].update_one(
+                    {"_id": job_id, "claim": claim, "status": "running"},
+                    {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=settings.ANALYSIS_JOB_LEASE_SECONDS)}},
+                )
+            except Exception:
+                # The lease outlasts two missed beats; keep trying at the next one
+                logger.exception("Failed to extend the lease of analysis job %s", job_id)
+
+    async def _recover_periodically(self):
+        while True:
+            await asyncio.sleep(settings.ANALYSIS_JOB_LEASE_SECONDS)
+            try:
+                await recover_orphaned_jobs()
+            except Exception:
+                logger.exception("Orphaned job recovery failed")
+
+
+workers = JobWorkerPool()
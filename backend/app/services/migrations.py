@@ -0,0 +1,175 @@
+"""
+Versioned schema migrations: index definitions and other one-off steps.
+
+Applied migrations are recorded in `schema_migrations`, so a process on an
+up-to-date database reads that one small collection and does nothing else.
+A migration with a fingerprint (the settings it depends on) is applied
+again when the fingerprint changes. A lease document keeps replicas that
+boot together from running the same steps at once; the others wait for it.
+
+New steps go at the end of MIGRATIONS with the next number. Apply them
+ahead of a deploy, or check what is pending, with:
+
+    python -m app.services.migrations apply
+    python -m app.services.migrations status
+"""
+import argparse
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, NamedTuple
+
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from ..utils.config import settings
+from ..utils.db import get_db
+from . import job_queue, result_cache, rollups, streaks
+from .ml_service import analysis_version
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+LOCK_ID = "_lock"
+LOCK_LEASE = timedelta(minutes=15)
+LOCK_POLL_SECONDS = 1.0
+
+
+class Migration(NamedTuple):
+    id: str
+    apply: Callable[[], Awaitable[object]]
+    fingerprint: Callable[[], str] = lambda: ""
+
+
+async def _drop_index(collection: str, name: str):
+    try:
+        await get_db()[collection].drop_index(name)
+    except OperationFailure:
+        pass  # Never created, or already dropped
+
+
+async def activity_indexes():
+    db = get_db()
+    # _id breaks created_at ties, so keyset pagination is served in index order
+    for collection in ("speech_analysis", "training_sessions"):
+        await db[collection].create_index([("user_id", 1), ("created_at", -1), ("_id", -1)])
+        # Prefix of the index above
+        await _drop_index(collection, "user_id_1_created_at_-1")
+
+
+async def user_indexes():
+    db = get_db()
+    await db["users"].create_index("username", unique=True)
+    await db["users"].create_index("email", unique=True)
+
+
+async def training_exercise_index():
+    db = get_db()
+    # Concurrent first completions of an exercise could each have inserted
+    # an attempt; the newest one stays. The unique index then turns such a
+    # race into an update, whose pre-image the rollups count
+    duplicates = db["training_sessions"].aggregate([
+        {"$sort": {"created_at": -1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "exercise_id": "$exercise_id"},
+            "ids": {"$push": "$_id"},
+        }},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ], allowDiskUse=True)
+    async for group in duplicates:
+        await db["training_sessions"].delete_many({"_id": {"$in": group["ids"][1:]}})
+    await db["training_sessions"].create_index([("user_id", 1), ("exercise_id", 1)], unique=True)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration("0001-activity-indexes", activity_indexes),
+    Migration("0002-user-indexes", user_indexes),
+    Migration("0003-job-indexes", job_queue.ensure_job_indexes),
+    Migration("0004-rollup-indexes", rollups.ensure_rollup_indexes),
+    Migration("0005-result-cache-ttl", result_cache.ensure_result_cache_indexes,
+              lambda: str(settings.RESULT_CACHE_TTL_SECONDS)),
+    Migration("0006-result-cache-version", result_cache.purge_other_versions, analysis_version),
+    Migration("0007-training-exercise-index", training_exercise_index),
+    # Backfills of the rollups and streaks for the history written before them
+    Migration("0008-rollup-backfill", rollups.rebuild, lambda: rollups.LAYOUT),
+    Migration("0009-streak-backfill", streaks.migrate),
+]
+
+
+async def pending() -> List[Migration]:
+    db = get_db()
+    applied = {
+        doc["_id"]: doc.get("fingerprint", "")
+        async for doc in db[MIGRATIONS_COLLECTION].find({"_id": {"$ne": LOCK_ID}}, {"fingerprint": 1})
+    }
+    return [m for m in MIGRATIONS if applied.get(m.id) != m.fingerprint()]
+
+
+async def _acquire(owner: str) -> bool:
+    db = get_db()
+    now = datetime.utcnow()
+    try:
+        # Matches only an expired lease; otherwise the upsert collides with
+        # the lease another process holds
+        await db[MIGRATIONS_COLLECTION].update_one(
+            {"_id": LOCK_ID, "expires_at": {"$lt": now}},
+            {"$set": {"owner": owner, "expires_at": now + LOCK_LEASE}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def apply() -> List[str]:
+    """Applies the pending migrations in order and returns their ids."""
+    if not await pending():
+        return []
+
+    db = get_db()
+    owner = uuid.uuid4().hex
+    while not await _acquire(owner):
+        await asyncio.sleep(LOCK_POLL_SECONDS)
+    try:
+        applied = []
+        # Whoever held the lease may have applied some of them meanwhile
+        for migration in await pending():
+            start = time.perf_counter()
+            await migration.apply()
+            elapsed = time.perf_counter() - start
+            await db[MIGRATIONS_COLLECTION].update_one(
+                {"_id": migration.id},
+                {"$set": {
+                    "fingerprint": migration.fingerprint(),
+                    "applied_at": datetime.utcnow(),
+                    "duration_ms": round(elapsed * 1000, 1),
+                }},
+                upsert=True,
+            )
+            logger.info("Applied migration %s in %.2fs", migration.id, elapsed)
+            applied.append(migration.id)
+        return applied
+    finally:
+        await db[MIGRATIONS_COLLECTION].delete_one({"_id": LOCK_ID, "owner": owner})
+
+
+async def _main(args):
+    from ..utils.db import connect_to_mongo, close_mongo_connection
+
+    await connect_to_mongo()
+    try:
+        if args.command == "apply":
+            applied = await apply()
+            print(f"Applied {len(applied)} migration(s)" + "".join(f"\n  {m}" for m in applied))
+        else:
+            waiting = await pending()
+            print(f"{len(waiting)} pending migration(s)" + "".join(f"\n  {m.id}" for m in waiting))
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the database migrations")
+    parser.add_argument("command", choices=["apply", "status"])
+    asyncio.run(_main(parser.parse_args()))
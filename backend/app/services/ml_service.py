@@ -1,38 +1,96 @@
+"""
+Entry point of the analysis pipeline. The ML stack (numpy, the inference
+engine and whatever its backend loads) is imported on first use, so API
+processes that never analyse anything do not pay for it at startup.
+"""
 import asyncio
-import random
-from typing import Dict, List, Any
+import hashlib
+import json
+import logging
+import sys
+from typing import Dict, Any
+
+from ..utils import metrics
+from ..utils.config import settings
+from . import model_versions
+
+logger = logging.getLogger(__name__)
+
+
+def analysis_version() -> str:
+    """
+    Identifies everything that determines an analysis result besides the
+    recording itself: the model weights and the windowing, severity and
+    video parameters. Cached results of any other version are never reused.
+    """
+    params = json.dumps([
+        settings.ML_SAMPLE_RATE, settings.ML_WINDOW_SECONDS, settings.ML_HOP_SECONDS,
+        settings.SEVERITY_WEIGHTS, settings.SEVERITY_THRESHOLDS,
+        settings.VIDEO_FPS, settings.VIDEO_WIDTH, settings.VIDEO_MOTION_THRESHOLD,
+        settings.VIDEO_MIN_MOVEMENT_SECONDS,
+    ], sort_keys=True)
+    return f"{model_versions.current(settings.ML_BACKEND)}/{hashlib.sha1(params.encode()).hexdigest()[:10]}"
+
 
 async def run_stutter_analysis(file_path: str) -> Dict[str, Any]:
     """
-    Simulates the ML processing logic from Nikhil_Stutter_Demo.
-    In a real scenario, this would call the actual ML model code
-    using the provided video/audio file.
+    Runs the stutter classifier and the head movement detector over a recording.
+    The audio is decoded once in a thread, then classified in overlapping
+    3-second windows on the inference process pool (see inference.py).
+    Meanwhile another worker of the pool decodes and scores the video
+    track (see video.py). Head movements are extra: if the video cannot be
+    analysed, the result is stored without them.
     """
-    # Simulate processing delay
-    await asyncio.sleep(5)
-    
-    # Mocked results based on requirements
-    fluency_score = round(random.uniform(65.0, 95.0), 1)
-    
-    stutter_events = [
-        {"timestamp": 2.5, "type": "stutter"},
-        {"timestamp": 12.0, "type": "pause"},
-        {"timestamp": 25.3, "type": "stutter"}
-    ]
-    
-    head_movements = [
-        {"timestamp": 5.0, "severity": 0.2},
-        {"timestamp": 15.5, "severity": 0.8},
-        {"timestamp": 30.1, "severity": 0.4}
-    ]
-    
-    transcript = "This is a simulated transcript of the practiced speech session."
-    total_words = len(transcript.split())
-    
+    from . import video
+    from .audio import decode_audio
+    from .inference import engine
+
+    async def classify_audio():
+        with metrics.stage("decode"):
+            audio = await asyncio.to_thread(decode_audio, file_path, settings.ML_SAMPLE_RATE)
+        with metrics.stage("inference"):
+            return await engine.classify(audio)
+
+    async def detect_motion():
+        try:
+            return await video.analyze(file_path)
+        except Exception:
+            logger.exception("Video analysis of %s failed; storing the result without head movements", file_path)
+            return None
+
+    predictions, motion = await asyncio.gather(classify_audio(), detect_motion())
+    return summarize(predictions, motion)
+
+
+def summarize(predictions, motion=None) -> Dict[str, Any]:
+    # The analysis result of a recording's window predictions and video motion
+    from . import severity, video
+
+    labels = predictions.labels
+    fluency_score = round(100.0 * float((labels == 0).mean()), 1) if len(labels) else 100.0
+    # Consecutive stuttered windows become one event
+    with metrics.stage("severity"):
+        report = severity.score(predictions)
+
+    with metrics.stage("head_movements"):
+        head_movements = video.head_movements(motion)
+
+    # No speech-to-text model yet
+    transcript = ""
+
     return {
         "fluencyScore": fluency_score,
-        "stutterEvents": stutter_events,
+        "stutterEvents": report.events(),
+        "severity": report.level,
+        "stutterIntensity": report.intensity,
         "headMovements": head_movements,
         "transcript": transcript,
-        "totalWords": total_words
+        "totalWords": len(transcript.split())
     }
+
+
+def shutdown():
+    # Stops the inference processes, if this process ever started them
+    inference = sys.modules.get(__package__ + ".inference")
+    if inference is not None:
+        inference.engine.shutdown()
@@ -0,0 +1,29 @@
+"""
+Identity of the weights each ML backend classifies with, worked out
+without loading them or importing numpy. The API fingerprints analysis
+results with it at startup (see ml_service.analysis_version) while the
+ML stack itself stays unloaded.
+"""
+import os
+
+from ..utils.config import settings
+
+NUMPY = "numpy-1"
+
+
+def _torch() -> str:
+    # A replaced model file changes size or modification time
+    stat = os.stat(settings.ML_MODEL_PATH)
+    return f"torch-{os.path.basename(settings.ML_MODEL_PATH)}-{stat.st_size}-{int(stat.st_mtime)}"
+
+
+VERSIONS = {
+    "numpy": lambda: NUMPY,
+    "torch": _torch,
+}
+
+
+def current(backend: str) -> str:
+    if backend not in VERSIONS:
+        raise ValueError(f"Unknown ML backend: {backend}")
+    return VERSIONS[backend]()
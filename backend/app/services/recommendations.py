@@ -0,0 +1,246 @@
+"""
+Training exercise recommendations.
+
+The catalog (EXERCISE_CATALOG_PATH, by default app/data/exercises.json) is
+the training page's exercise list plus the stutter types each exercise
+type targets. It is loaded once into an index: exercises by id, exercise
+types by the stutter type they target, and each type's exercises in the
+order the training page unlocks them (difficulty, then level). Ranking a
+user's exercises then only reads that index.
+
+The user's side is the stutter profile of their latest analyses: the
+share of their speech time per stutter type, with the fluent share from
+the fluency score. It also includes the level they last passed in each
+exercise type (`user_progress`). Profiles are loaded through the response
+cache, keyed by the user's data version (see data_version.py).
+
+Each exercise type gets the profile share of the stutter types it targets.
+A type's share is split evenly with the other types that target the same
+stutter type. The fluent share, which general fluency practice targets,
+counts for a fifth of its size. The upcoming exercises of a type are
+offered at its weight, halved for each level further on.
+
+The file is checked every EXERCISE_CATALOG_REFRESH_SECONDS. When it has
+changed, only the exercise types with changed exercises are sorted again;
+the lookups derived from the sequences are rebuilt, and the new index
+replaces the old one in a single assignment.
+"""
+import asyncio
+import heapq
+import json
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from ..utils.cache import response_cache
+from ..utils.config import settings
+from ..utils.db import get_read_db, read_all
+from . import timeline
+
+logger = logging.getLogger(__name__)
+
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+# Weight kept by each further level of the same exercise type
+LEVEL_DECAY = 0.5
+# Weight of the fluent share against the stuttered ones
+FLUENT_WEIGHT = 0.2
+RECENT_ANALYSES = 10
+DEFAULT_CATALOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "exercises.json")
+
+
+class CatalogIndex(NamedTuple):
+    exercises: Dict[int, dict]
+    # Stutter types each exercise type targets, and the reverse
+    targets: Dict[str, List[str]]
+    targeted_by: Dict[str, List[str]]
+    # Exercise type -> its exercises in unlock order (difficulty, then level)
+    sequence: Dict[str, List[dict]]
+    # (exercise type, difficulty, level) -> position in the type's sequence
+    position: Dict[Tuple[str, str, int], int]
+
+
+def _order(exercise: dict) -> tuple:
+    return DIFFICULTIES.index(exercise["difficulty"]), exercise["level"], exercise["id"]
+
+
+def build_index(data: dict, previous: Optional[CatalogIndex] = None) -> CatalogIndex:
+    """
+    The index of a catalog document. With the previous index, the
+    sequences of exercise types none of whose exercises changed are reused.
+    """
+    exercises = {exercise["id"]: exercise for exercise in data["exercises"]}
+    for exercise in exercises.values():
+        if exercise["difficulty"] not in DIFFICULTIES:
+            raise ValueError(f"Exercise {exercise['id']} has an unknown difficulty: {exercise['difficulty']}")
+    targets = {name: list(stutter_types) for name, stutter_types in data["targets"].items()}
+
+    if previous is None:
+        changed_types = {exercise["type"] for exercise in exercises.values()}
+    else:
+        changed_types = {
+            exercise["type"]
+            for exercise_id in exercises.keys() | previous.exercises.keys()
+            if previous.exercises.get(exercise_id) != exercises.get(exercise_id)
+            for exercise in (previous.exercises.get(exercise_id), exercises.get(exercise_id))
+            if exercise
+        }
+
+    by_type = defaultdict(list)
+    for exercise in exercises.values():
+        if exercise["type"] in changed_types:
+            by_type[exercise["type"]].append(exercise)
+    sequence = {
+        name: sorted(by_type[name], key=_order) if name in changed_types else previous.sequence[name]
+        for name in {exercise["type"] for exercise in exercises.values()}
+    }
+    position = {
+        (exercise["type"], exercise["difficulty"], exercise["level"]): i
+        for exercises_of_type in sequence.values()
+        for i, exercise in enumerate(exercises_of_type)
+    }
+
+    targeted_by = defaultdict(list)
+    for name, stutter_types in targets.items():
+        for stutter_type in stutter_types:
+            targeted_by[stutter_type].append(name)
+    return CatalogIndex(exercises, targets, dict(targeted_by), sequence, position)
+
+
+class Catalog:
+    def __init__(self, path: str):
+        self.path = path
+        self.index: Optional[CatalogIndex] = None
+        self.mtime: Optional[int] = None
+        self.version = 0
+
+    def load(self) -> bool:
+        """(Re)loads the file if it changed since the last load; True if it did."""
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self.mtime:
+            return False
+        # A file that fails to load is not retried until it changes again
+        self.mtime = mtime
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        self.index = build_index(data, self.index)
+        self.version += 1
+        logger.info("Loaded %d exercises from %s", len(self.index.exercises), self.path)
+        return True
+
+    def get(self) -> CatalogIndex:
+        if self.index is None:
+            self.load()
+        return self.index
+
+    async def watch(self):
+        # Background task: picks up edits of the catalog file without a restart
+        while settings.EXERCISE_CATALOG_REFRESH_SECONDS > 0:
+            await asyncio.sleep(settings.EXERCISE_CATALOG_REFRESH_SECONDS)
+            try:
+                await asyncio.to_thread(self.load)
+            except (OSError, ValueError, KeyError) as e:
+                # The previous index keeps serving until the file is fixed
+                logger.error("Could not reload the exercise catalog: %s", e)
+
+
+catalog = Catalog(settings.EXERCISE_CATALOG_PATH or DEFAULT_CATALOG)
+
+
+def stutter_profile(analyses: List[dict]) -> Dict[str, float]:
+    """
+    Average share of speech time per label over the given analyses: the
+    fluent share from each fluency score, the rest split by the duration
+    of its stutter events.
+    """
+    totals: Dict[str, float] = defaultdict(float)
+    counted = 0
+    for analysis in analyses:
+        fluency = analysis.get("fluency_score")
+        if not isinstance(fluency, (int, float)):
+            continue
+        durations: Dict[str, float] = defaultdict(float)
+        for event in analysis.get("stutterEvents") or []:
+            durations[event.get("type")] += max(0.0, float(event.get("duration", event.get("end", 0) - event.get("timestamp", 0))))
+        stuttered = sum(durations.values())
+        fluent = min(max(fluency / 100.0, 0.0), 1.0) if stuttered else 1.0
+        totals["NoStutter"] += fluent
+        for stutter_type, duration in durations.items():
+            totals[stutter_type] += (1.0 - fluent) * duration / stuttered
+        counted += 1
+    return {name: round(share / counted, 4) for name, share in totals.items()} if counted else {}
+
+
+def _next_position(index: CatalogIndex, exercise_type: str, progress: Optional[dict]) -> int:
+    if not progress:
+        return 0
+    passed = index.position.get((
+        exercise_type, progress.get("last_completed_difficulty"), progress.get("last_completed_level"),
+    ))
+    return 0 if passed is None else passed + 1
+
+
+def rank(index: CatalogIndex, profile: Dict[str, float], progress: Dict[str, dict], limit: int) -> List[dict]:
+    """The `limit` best upcoming exercises for a profile and progress, from the index alone."""
+    # Without analyses every exercise type weighs the same
+    weights = {name: 1.0 for name in index.targets}
+    if profile:
+        weights = defaultdict(float)
+        for stutter_type, share in profile.items():
+            names = index.targeted_by.get(stutter_type, [])
+            if stutter_type == "NoStutter":
+                share *= FLUENT_WEIGHT
+            for name in names:
+                weights[name] += share / len(names)
+
+    # Best first: weight, then the catalog's type order
+    order = {name: i for i, name in enumerate(index.targets)}
+    heap = []
+    for name, weight in weights.items():
+        start = _next_position(index, name, progress.get(name))
+        if weight > 0 and start < len(index.sequence.get(name, [])):
+            heap.append((-weight, order.get(name, len(order)), name, start))
+    heapq.heapify(heap)
+
+    ranked = []
+    while heap and len(ranked) < limit:
+        weight, tie, name, at = heapq.heappop(heap)
+        exercise = index.sequence[name][at]
+        ranked.append({**exercise, "weight": round(-weight, 4), "targets": index.targets.get(name, [])})
+        if at + 1 < len(index.sequence[name]):
+            heapq.heappush(heap, (weight * LEVEL_DECAY, tie, name, at + 1))
+    return ranked
+
+
+async def load_profile(user_id: str, session=None) -> dict:
+    db = get_read_db()
+    analyses, progress = await read_all(
+        session,
+        lambda: db["speech_analysis"].find(
+            {"user_id": user_id}, {"fluency_score": 1, "stutterEvents": 1}, session=session,
+        ).sort([("created_at", -1), ("_id", -1)]).to_list(RECENT_ANALYSES),
+        lambda: db["user_progress"].find({"user_id": user_id}, session=session).to_list(None),
+    )
+    for analysis in analyses:
+        timeline.decode_document(analysis)
+    return {
+        "profile": stutter_profile(analyses),
+        "progress": {
+            doc["type"]: {
+                "last_completed_difficulty": doc.get("last_completed_difficulty"),
+                "last_completed_level": doc.get("last_completed_level"),
+            }
+            for doc in progress if doc.get("type")
+        },
+    }
+
+
+async def recommend(user_id: str, version: int, limit: int, session=None) -> dict:
+    # The profile is cached per data version; ranking always uses the current catalog
+    state = await response_cache.get_or_compute(
+        user_id, version, "recommendations", lambda: load_profile(user_id, session)
+    )
+    return {
+        "profile": state["profile"],
+        "recommendations": rank(catalog.get(), state["profile"], state["progress"], limit),
+    }
@@ -0,0 +1,87 @@
+"""
+Analysis results keyed by recording content and analysis version.
+
+A re-uploaded recording (a retry, a refresh) hashes to the same key, so
+its earlier result is attached to the new session instead of running
+inference again. Entries expire RESULT_CACHE_TTL_SECONDS after their last
+use, the collection is trimmed to RESULT_CACHE_MAX_ENTRIES by least recent
+use, and entries of any other analysis version are dropped at startup.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pymongo.errors import OperationFailure
+
+from ..utils.config import settings
+from ..utils.db import get_db
+from . import timeline
+from .ml_service import analysis_version
+
+logger = logging.getLogger(__name__)
+
+RESULTS = "analysis_result_cache"
+
+
+async def ensure_result_cache_indexes():
+    db = get_db()
+    ttl = settings.RESULT_CACHE_TTL_SECONDS
+    try:
+        await db[RESULTS].create_index("last_used_at", expireAfterSeconds=ttl)
+    except OperationFailure:
+        # The TTL setting changed since the index was created
+        await db.command("collMod", RESULTS, index={"keyPattern": {"last_used_at": 1}, "expireAfterSeconds": ttl})
+
+
+async def purge_other_versions() -> int:
+    db = get_db()
+    deleted = await db[RESULTS].delete_many({"version": {"$ne": analysis_version()}})
+    if deleted.deleted_count:
+        logger.info("Dropped %d cached analysis results of older versions", deleted.deleted_count)
+    return deleted.deleted_count
+
+
+def _key(content_hash: str) -> str:
+    return f"{content_hash}:{analysis_version()}"
+
+
+async def lookup(content_hash: str) -> Optional[Dict[str, Any]]:
+    if not settings.RESULT_CACHE_ENABLED:
+        return None
+    db = get_db()
+    entry = await db[RESULTS].find_one_and_update(
+        {"_id": _key(content_hash)},
+        {"$set": {"last_used_at": datetime.utcnow()}, "$inc": {"hits": 1}},
+        projection={"result": 1},
+    )
+    if entry is None:
+        return None
+    return timeline.decode_document(entry["result"])
+
+
+async def store(content_hash: str, result: Dict[str, Any]):
+    if not settings.RESULT_CACHE_ENABLED:
+        return
+    db = get_db()
+    now = datetime.utcnow()
+    await db[RESULTS].update_one(
+        {"_id": _key(content_hash)},
+        {"$set": {
+            "content_hash": content_hash,
+            "version": analysis_version(),
+            "result": timeline.encode_document(dict(result)),
+            "created_at": now,
+            "last_used_at": now,
+        }, "$setOnInsert": {"hits": 0}},
+        upsert=True,
+    )
+    await _trim()
+
+
+async def _trim():
+    db = get_db()
+    excess = await db[RESULTS].estimated_document_count() - settings.RESULT_CACHE_MAX_ENTRIES
+    if excess <= 0:
+        return
+    oldest = await db[RESULTS].find({}, {"_id": 1}).sort("last_used_at", 1).limit(excess).to_list(excess)
+    await db[RESULTS].delete_many({"_id": {"$in": [entry["_id"] for entry in oldest]}})
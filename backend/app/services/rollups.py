@@ -0,0 +1,328 @@
+"""
+Per-user daily rollups behind the dashboard.
+
+`user_daily_stats` holds one document per user and UTC day with the score
+sum, the number of scored documents and the number of documents for each
+source; a day counts as active when either count is positive.
+`user_totals` holds the lifetime sums and, under `correct`, the number of
+stored correct attempts per exercise; the mastered exercises are those
+with a positive count. Both are updated with $inc by every write path,
+so concurrent writes add up in any order and dashboard reads cost depends
+on the day range instead of the size of the history (the streak itself
+lives on the user document, see streaks.py).
+
+Migration 0008 builds them from existing history. Rebuild them from the
+raw collections (per user, in place, while the app serves) or check for
+drift with:
+
+    python -m app.services.rollups rebuild [--user USER_ID]
+    python -m app.services.rollups check [--user USER_ID]
+"""
+import argparse
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, time as dt_time
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import DeleteMany, UpdateOne
+
+from ..utils.db import get_db, get_read_db, read_all
+from .stats_service import DATE_FORMAT, TREND_DAYS, average_of
+from .streaks import read_streak
+
+logger = logging.getLogger(__name__)
+
+DAILY = "user_daily_stats"
+TOTALS = "user_totals"
+SOURCES = {"training": "training_sessions", "speech": "speech_analysis"}
+COUNTERS = ["sum", "scored", "count"]
+# Version of the stored layout; migration 0008 rebuilds when it changes
+LAYOUT = "2"
+# Passes over a user whose figures change while they are rebuilt
+REBUILD_ATTEMPTS = 3
+
+
+async def ensure_rollup_indexes():
+    db = get_db()
+    await db[DAILY].create_index([("user_id", 1), ("day", -1)], unique=True)
+
+
+def _score(value) -> Optional[float]:
+    # Same rule as $avg: only numbers count, missing and null do not
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+def _day(created_at: datetime) -> datetime:
+    return datetime.combine(created_at.date(), dt_time.min)
+
+
+def _add(deltas: Dict[datetime, Dict[str, float]], source: str, created_at, score, sign: int):
+    if not isinstance(created_at, datetime):
+        return
+    day = deltas[_day(created_at)]
+    day[f"{source}_count"] += sign
+    value = _score(score)
+    if value is not None:
+        day[f"{source}_sum"] += sign * value
+        day[f"{source}_scored"] += sign
+
+
+def mastered(totals: Optional[dict]) -> List[str]:
+    # Exercise ids (as stored keys) with a correct attempt
+    return [exercise_id for exercise_id, count in ((totals or {}).get("correct") or {}).items() if count > 0]
+
+
+async def _apply(user_id: str, deltas: Dict[datetime, Dict[str, float]], correct: Optional[Dict[Any, int]] = None):
+    db = get_db()
+    ops = [
+        UpdateOne({"user_id": user_id, "day": day}, {"$inc": inc}, upsert=True)
+        for day, inc in deltas.items()
+        if any(inc.values())
+    ]
+    if ops:
+        await db[DAILY].bulk_write(ops, ordered=False)
+
+    lifetime = defaultdict(float)
+    for inc in deltas.values():
+        for field, value in inc.items():
+            lifetime[field] += value
+    inc = {field: value for field, value in lifetime.items() if value}
+    inc.update({f"correct.{exercise_id}": n for exercise_id, n in (correct or {}).items() if n})
+    if inc:
+        await db[TOTALS].update_one({"_id": user_id}, {"$inc": inc}, upsert=True)
+
+
+async def record_trainings(user_id: str, writes: List[Tuple[Optional[dict], dict]]):
+    """
+    Each training write ($set of `update` over the user's `previous`
+    document for the same exercise) replaces that document, so its old
+    contribution is taken back out first. The new one is that of the stored
+    result: fields the update leaves out (a bare completion has no score)
+    keep their previous values.
+    """
+    deltas = defaultdict(lambda: defaultdict(float))
+    correct = defaultdict(int)
+    for previous, update in writes:
+        current = {**(previous or {}), **update}
+        if previous:
+            _add(deltas, "training", previous.get("created_at"), previous.get("fluency_score"), -1)
+            correct[current["exercise_id"]] -= previous.get("is_correct") is True
+        _add(deltas, "training", current.get("created_at"), current.get("fluency_score"), 1)
+        correct[current["exercise_id"]] += current.get("is_correct") is True
+    await _apply(user_id, deltas, correct)
+
+
+async def record_training(user_id: str, previous: Optional[dict], current: dict):
+    await record_trainings(user_id, [(previous, current)])
+
+
+async def record_analysis(user_id: str, fluency_score, created_at: datetime):
+    deltas = defaultdict(lambda: defaultdict(float))
+    _add(deltas, "speech", created_at, fluency_score, 1)
+    await _apply(user_id, deltas)
+
+
+def _source_average(doc: Optional[dict], source: str) -> Optional[float]:
+    if not doc or not doc.get(f"{source}_count"):
+        return None
+    scored = doc.get(f"{source}_scored", 0)
+    return doc.get(f"{source}_sum", 0) / scored if scored else None
+
+
+async def read_dashboard_stats(user_id: str, session=None) -> Dict[str, Any]:
+    db = get_read_db()
+    now = datetime.utcnow()
+    days = [_day(now) - timedelta(days=i) for i in range(TREND_DAYS - 1, -1, -1)]
+
+    totals, trend_docs, streak = await read_all(
+        session,
+        lambda: db[TOTALS].find_one({"_id": user_id}, session=session),
+        lambda: db[DAILY].find({"user_id": user_id, "day": {"$gte": days[0]}}, session=session).to_list(TREND_DAYS + 1),
+        lambda: read_streak(user_id, now, session),
+    )
+
+    by_day = {doc["day"]: doc for doc in trend_docs}
+    trend = [
+        {
+            "day": day.strftime("%a"),
+            "score": average_of([_source_average(by_day.get(day), "training"), _source_average(by_day.get(day), "speech")])
+        }
+        for day in days
+    ]
+
+    return {
+        "total_sessions": len(mastered(totals)),
+        "avg_score": average_of([_source_average(totals, "training"), _source_average(totals, "speech")]),
+        "streak": streak,
+        "fluency_trend": trend
+    }
+
+
+async def _raw_daily(user_id: Optional[str]) -> Dict[tuple, Dict[str, float]]:
+    # Daily figures straight from the activity collections
+    db = get_db()
+    match = {"user_id": user_id} if user_id else {}
+    is_number = {"$isNumber": "$fluency_score"}
+    rows: Dict[tuple, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for source, collection in SOURCES.items():
+        cursor = db[collection].aggregate([
+            {"$match": {**match, "created_at": {"$type": "date"}}},
+            {"$group": {
+                "_id": {"user_id": "$user_id", "day": {"$dateToString": {"format": DATE_FORMAT, "date": "$created_at"}}},
+                "sum": {"$sum": {"$cond": [is_number, "$fluency_score", 0]}},
+                "scored": {"$sum": {"$cond": [is_number, 1, 0]}},
+                "count": {"$sum": 1},
+            }},
+        ])
+        async for row in cursor:
+            key = (row["_id"]["user_id"], datetime.strptime(row["_id"]["day"], DATE_FORMAT))
+            for counter in COUNTERS:
+                rows[key][f"{source}_{counter}"] = float(row[counter])
+    return rows
+
+
+async def _raw_correct(user_id: Optional[str]) -> Dict[str, Dict[str, int]]:
+    # User -> exercise id (as stored keys) -> correct attempts
+    db = get_db()
+    match = {"is_correct": True, **({"user_id": user_id} if user_id else {})}
+    cursor = db["training_sessions"].aggregate([
+        {"$match": match},
+        {"$group": {"_id": {"user_id": "$user_id", "exercise_id": "$exercise_id"}, "count": {"$sum": 1}}},
+    ])
+    correct: Dict[str, Dict[str, int]] = defaultdict(dict)
+    async for row in cursor:
+        correct[row["_id"]["user_id"]][str(row["_id"]["exercise_id"])] = row["count"]
+    return correct
+
+
+async def _users(user_id: Optional[str]) -> List[str]:
+    # Everyone with activity or rollups, so stale rollups are cleared too
+    if user_id:
+        return [user_id]
+    db = get_db()
+    users = set()
+    for collection in list(SOURCES.values()) + [DAILY]:
+        users.update(await db[collection].distinct("user_id"))
+    users.update(await db[TOTALS].distinct("_id"))
+    return sorted(users, key=str)
+
+
+async def _rebuild_user(user_id: str):
+    db = get_db()
+    daily = await _raw_daily(user_id)
+    correct = (await _raw_correct(user_id)).get(user_id, {})
+    fields = [f"{source}_{counter}" for source in SOURCES for counter in COUNTERS]
+
+    totals = defaultdict(float)
+    ops = []
+    for (_, day), counters in daily.items():
+        ops.append(UpdateOne(
+            {"user_id": user_id, "day": day},
+            {"$set": {field: counters.get(field, 0.0) for field in fields}},
+            upsert=True,
+        ))
+        for field, value in counters.items():
+            totals[field] += value
+    ops.append(DeleteMany({"user_id": user_id, "day": {"$nin": [day for _, day in daily]}}))
+    await db[DAILY].bulk_write(ops, ordered=False)
+    await db[TOTALS].replace_one(
+        {"_id": user_id}, {**{field: totals.get(field, 0.0) for field in fields}, "correct": correct}, upsert=True,
+    )
+
+
+async def rebuild(user_id: Optional[str] = None) -> int:
+    """
+    Rewrites the rollups from the raw collections one user at a time, in
+    place: the app keeps serving meanwhile and other users' figures stay
+    as they are. A write that lands between reading a user's history and
+    rewriting their figures is caught by checking them afterwards; that
+    user is rebuilt again.
+    """
+    db = get_db()
+    users = await _users(user_id)
+    for uid in users:
+        for _ in range(REBUILD_ATTEMPTS):
+            await _rebuild_user(uid)
+            if not await check(uid):
+                break
+        else:
+            logger.warning("Rollups of user %s kept changing during the rebuild", uid)
+    # Figures may have changed for users whose rollups had drifted
+    await db.users.update_many(
+        {"_id": {"$in": [ObjectId(uid) for uid in users if ObjectId.is_valid(uid)]}},
+        {"$inc": {"data_version": 1}},
+    )
+    return len(users)
+
+
+async def check(user_id: Optional[str] = None) -> List[str]:
+    # Differences between the rollups and the raw collections; empty when consistent
+    db = get_db()
+    raw = await _raw_daily(user_id)
+    scope = {"user_id": user_id} if user_id else {}
+    problems = []
+
+    stored = {}
+    async for doc in db[DAILY].find(scope):
+        stored[(doc["user_id"], doc["day"])] = doc
+
+    for key in sorted(set(raw) | set(stored)):
+        expected = raw.get(key, {})
+        actual = stored.get(key, {})
+        for source in SOURCES:
+            for counter in COUNTERS:
+                field = f"{source}_{counter}"
+                if abs(expected.get(field, 0) - actual.get(field, 0)) > 1e-6:
+                    problems.append(
+                        f"{key[0]} {key[1]:{DATE_FORMAT}} {field}: rollup={actual.get(field, 0)} raw={expected.get(field, 0)}"
+                    )
+
+    raw_totals: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for (uid, _), counters in raw.items():
+        for field, value in counters.items():
+            raw_totals[uid][field] += value
+
+    correct = await _raw_correct(user_id)
+    async for doc in db[TOTALS].find({"_id": user_id} if user_id else {}):
+        uid = doc["_id"]
+        expected = raw_totals.pop(uid, {})
+        for field in [f"{source}_{counter}" for source in SOURCES for counter in COUNTERS]:
+            if abs(expected.get(field, 0) - doc.get(field, 0)) > 1e-6:
+                problems.append(f"{uid} total {field}: rollup={doc.get(field, 0)} raw={expected.get(field, 0)}")
+        stored_correct = {k: v for k, v in (doc.get("correct") or {}).items() if v}
+        if stored_correct != correct.pop(uid, {}):
+            problems.append(f"{uid} correct attempts per exercise differ")
+    for uid in set(raw_totals) | set(correct):
+        problems.append(f"{uid} has no totals document")
+    return problems
+
+
+async def _main(args):
+    from ..utils.db import connect_to_mongo, close_mongo_connection
+
+    await connect_to_mongo()
+    try:
+        if args.command == "rebuild":
+            await ensure_rollup_indexes()
+            users = await rebuild(args.user)
+            print(f"Rebuilt rollups for {users} user(s)")
+        else:
+            problems = await check(args.user)
+            for problem in problems:
+                print(problem)
+            print("Rollups are consistent" if not problems else f"{len(problems)} inconsistencies")
+            return 1 if problems else 0
+    finally:
+        await close_mongo_connection()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the dashboard rollups")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--user", help="Limit to one user id")
+    raise SystemExit(asyncio.run(_main(parser.parse_args())))
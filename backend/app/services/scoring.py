@@ -0,0 +1,322 @@
+"""
+Word-level scoring of training attempts: `spoken_text` aligned against
+`expected_text` with a weighted edit distance.
+
+Substituting a word costs less when it is a near miss (the training page's
+rule: under half of its characters edited). A spoken word costs nothing
+when it repeats the previous word ("the the") or starts the word that
+follows it ("b-b-ball", "ba ball"). Those are counted as repetitions
+instead of errors. The score is the training page's: full credit for exact
+words, 0.9 for near misses, none for missing or replaced ones.
+
+A batch of attempts is scored together. Their token ids are padded into
+(batch, words) arrays, and the DP table is filled one row at a time for the
+whole batch: the insertion chain along a row is a running minimum
+(np.minimum.accumulate). The backtrace also steps through every attempt at
+once. Near misses come from the same DP, run over the characters of the
+word pairs that occur.
+
+Re-score stored attempts (and update the rollups) with:
+
+    python -m app.services.scoring rescore [--user USER_ID] [--dry-run]
+"""
+import argparse
+import asyncio
+import logging
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+
+from ..utils.db import get_db
+from . import data_version, rollups
+
+logger = logging.getLogger(__name__)
+
+# Alignment costs, doubled so a near miss is a whole number
+EXACT, NEAR, SUBSTITUTE, DELETE, INSERT, REPEAT = 0, 1, 2, 2, 2, 0
+STATUSES = ["correct", "wrong", "missing"]
+NEAR_CREDIT = 0.9
+PASS_SCORE = 70
+GRADES = [(90, "Perfect"), (75, "Great Job"), (60, "Good Effort"), (40, "Needs Improvement"), (0, "Try Again")]
+BATCH_SIZE = 256
+# Words of each text and characters of each word that are scored: the
+# tables grow with the product of the lengths
+MAX_WORDS = 100
+MAX_WORD_LENGTH = 32
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+@dataclass
+class AttemptScore:
+    fluency_score: float
+    is_correct: bool
+    word_count: int
+    error_count: int
+    repetitions: int
+    extra_words: int
+    grade: str
+    highlights: Optional[List[dict]] = None
+
+    def fields(self) -> dict:
+        # As stored on training_sessions documents
+        return {
+            "fluency_score": self.fluency_score,
+            "is_correct": self.is_correct,
+            "word_count": self.word_count,
+            "error_count": self.error_count,
+        }
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    # The training page's cleanup, except that hyphens separate words so
+    # "b-b-ball" keeps its repeated sounds
+    return _PUNCTUATION.sub("", (text or "").lower().replace("-", " ")).split()
+
+
+def repeated(tokens: List[str]) -> List[bool]:
+    """
+    Whether each spoken word is a repetition: the previous word again, or
+    the start of the next different word.
+    """
+    flags = []
+    for j, word in enumerate(tokens):
+        following = next((w for w in tokens[j + 1:] if w != word), "")
+        flags.append((j > 0 and tokens[j - 1] == word) or following.startswith(word))
+    return flags
+
+
+def _distances(sub_cost, ins_cost: np.ndarray, rows: np.ndarray, cols: np.ndarray,
+               deletion: int, trace: bool = False):
+    """
+    Weighted edit distances of a batch of padded sequence pairs.
+    sub_cost(i) is the (B, N) cost of replacing item i of each first
+    sequence by each item of its second; ins_cost (B, N) the cost of
+    inserting each item of the second. Returns the distances and, with
+    trace, the whole (B, M + 1, N + 1) table.
+    """
+    batch = np.arange(len(rows))
+    offset = np.zeros((ins_cost.shape[0], ins_cost.shape[1] + 1), dtype=np.int32)
+    np.cumsum(ins_cost, axis=1, out=offset[:, 1:])
+    row = offset
+    table = [row]
+    result = row[batch, cols].copy()
+    for i in range(1, int(rows.max(initial=0)) + 1):
+        through = np.empty_like(row)
+        through[:, 0] = row[:, 0] + deletion
+        np.minimum(row[:, 1:] + deletion, row[:, :-1] + sub_cost(i - 1), out=through[:, 1:])
+        # D[i, j] = min over k <= j of through[k] + inserting items k..j-1
+        row = np.minimum.accumulate(through - offset, axis=1) + offset
+        if trace:
+            table.append(row)
+        done = rows == i
+        result[done] = row[done, cols[done]]
+    return result, (np.stack(table, axis=1) if trace else None)
+
+
+def _near_pairs(vocabulary: List[str], expected: np.ndarray, spoken: np.ndarray) -> np.ndarray:
+    # Sorted keys (expected id * V + spoken id) of the distinct word pairs
+    # that occur in an attempt and count as near misses
+    size = len(vocabulary)
+    keys = expected[:, :, None].astype(np.int64) * size + spoken[:, None, :]
+    occurs = (expected[:, :, None] >= 0) & (spoken[:, None, :] >= 0) & (expected[:, :, None] != spoken[:, None, :])
+    keys = np.unique(keys[occurs])
+
+    lengths = np.array([len(word) for word in vocabulary], dtype=np.int32)
+    first, second = lengths[keys // size], lengths[keys % size]
+    # At least |len(a) - len(b)| edits: most pairs are ruled out here
+    keys = keys[2 * np.abs(first - second) < np.maximum(first, second)]
+    if not len(keys):
+        return keys
+
+    chars = np.zeros((size, int(lengths.max())), dtype=np.uint32)
+    for k, word in enumerate(vocabulary):
+        chars[k, :len(word)] = np.frombuffer(word.encode("utf-32-le"), dtype=np.uint32)
+    a, b = chars[keys // size], chars[keys % size]
+    la, lb = lengths[keys // size], lengths[keys % size]
+    edits, _ = _distances(
+        lambda i: (a[:, i, None] != b).astype(np.int32), np.ones(b.shape, dtype=np.int32), la, lb, 1,
+    )
+    return keys[2 * edits < np.maximum(la, lb)]
+
+
+def _score_chunk(expected_tokens: List[List[str]], spoken_tokens: List[List[str]], highlights: bool) -> List[AttemptScore]:
+    vocabulary: Dict[str, int] = {}
+    for tokens in expected_tokens + spoken_tokens:
+        for word in tokens:
+            vocabulary.setdefault(word, len(vocabulary))
+    size = max(len(vocabulary), 1)
+
+    count = len(expected_tokens)
+    rows = np.array([len(t) for t in expected_tokens], dtype=np.int64)
+    cols = np.array([len(t) for t in spoken_tokens], dtype=np.int64)
+    # Different padding on each side, so padding never matches
+    expected = np.full((count, max(int(rows.max(initial=0)), 1)), -1, dtype=np.int32)
+    spoken = np.full((count, max(int(cols.max(initial=0)), 1)), -2, dtype=np.int32)
+    repeats = np.zeros(spoken.shape, dtype=bool)
+    for k, (exp, spk) in enumerate(zip(expected_tokens, spoken_tokens)):
+        expected[k, :len(exp)] = [vocabulary[w] for w in exp]
+        spoken[k, :len(spk)] = [vocabulary[w] for w in spk]
+        repeats[k, :len(spk)] = repeated(spk)
+    ins_cost = np.where(repeats, REPEAT, INSERT).astype(np.int32)
+    near = _near_pairs(list(vocabulary), expected, spoken)
+
+    def cost(e: np.ndarray, s: np.ndarray) -> np.ndarray:
+        keys = e.astype(np.int64) * size + s
+        found = near[np.minimum(np.searchsorted(near, keys), len(near) - 1)] == keys if len(near) else False
+        return np.where(e == s, EXACT, np.where(found, NEAR, SUBSTITUTE)).astype(np.int32)
+
+    _, table = _distances(lambda i: cost(expected[:, i, None], spoken), ins_cost, rows, cols, DELETE, trace=True)
+
+    # Backtrace of every attempt at once, preferring substitutions, then insertions
+    batch = np.arange(count)
+    i, j = rows.copy(), cols.copy()
+    status = np.full(expected.shape, STATUSES.index("missing"), dtype=np.int8)
+    repetitions = np.zeros(count, dtype=np.int64)
+    extra = np.zeros(count, dtype=np.int64)
+    while True:
+        active = (i > 0) | (j > 0)
+        if not active.any():
+            break
+        up, left = np.maximum(i - 1, 0), np.maximum(j - 1, 0)
+        here = table[batch, i, j]
+        step = cost(expected[batch, up], spoken[batch, left])
+        diagonal = active & (i > 0) & (j > 0) & (here == table[batch, up, left] + step)
+        inserted = active & ~diagonal & (j > 0) & (here == table[batch, i, left] + ins_cost[batch, left])
+        matched = diagonal & (step != SUBSTITUTE)
+        status[batch[matched], up[matched]] = np.where(step[matched] == EXACT, 0, 1)
+        repetitions += inserted & repeats[batch, left]
+        extra += inserted & ~repeats[batch, left]
+        i -= (active & ~inserted).astype(i.dtype)
+        j -= (diagonal | inserted).astype(j.dtype)
+
+    results = []
+    for k in range(count):
+        words = status[k, :rows[k]]
+        matches = float((words == 0).sum()) + NEAR_CREDIT * float((words == 1).sum())
+        score = min(100, max(0, int(np.floor(100 * matches / rows[k] + 0.5)))) if rows[k] else 0
+        results.append(AttemptScore(
+            fluency_score=float(score),
+            is_correct=score >= PASS_SCORE,
+            word_count=int(cols[k]),
+            error_count=int(rows[k] - np.floor(matches)),
+            repetitions=int(repetitions[k]),
+            extra_words=int(extra[k]),
+            grade=next(grade for threshold, grade in GRADES if score >= threshold),
+            highlights=[
+                {"word": word, "status": STATUSES[s]} for word, s in zip(expected_tokens[k], words.tolist())
+            ] if highlights else None,
+        ))
+    return results
+
+
+def _bounded(tokens: List[str]) -> List[str]:
+    return [word[:MAX_WORD_LENGTH] for word in tokens[:MAX_WORDS]]
+
+
+def score_batch(attempts: Sequence[Tuple[Optional[str], Optional[str]]], highlights: bool = False,
+                batch_size: int = BATCH_SIZE) -> List[AttemptScore]:
+    """
+    Scores (expected_text, spoken_text) pairs. Attempts of similar length
+    are padded together, batch_size at a time. Only the first MAX_WORDS
+    words of each text, cut to MAX_WORD_LENGTH characters, are scored.
+    """
+    expected = [_bounded(tokenize(e)) for e, _ in attempts]
+    spoken = [_bounded(tokenize(s)) for _, s in attempts]
+    order = sorted(range(len(attempts)), key=lambda k: (len(expected[k]), len(spoken[k])))
+    results: List[Optional[AttemptScore]] = [None] * len(attempts)
+    for start in range(0, len(order), batch_size):
+        chunk = order[start:start + batch_size]
+        scores = _score_chunk([expected[k] for k in chunk], [spoken[k] for k in chunk], highlights)
+        for k, score in zip(chunk, scores):
+            results[k] = score
+    return results
+
+
+def score(expected_text: Optional[str], spoken_text: Optional[str], highlights: bool = True) -> AttemptScore:
+    return score_batch([(expected_text, spoken_text)], highlights)[0]
+
+
+async def rescore(user_id: Optional[str] = None, batch_size: int = BATCH_SIZE, dry_run: bool = False) -> Tuple[int, int]:
+    """
+    Re-scores stored attempts that have both texts, batch_size at a time,
+    and adjusts the rollups and data versions of the users whose scores
+    changed. Returns (attempts scored, attempts changed).
+    """
+    db = get_db()
+    query = {"spoken_text": {"$type": "string"}, "expected_text": {"$type": "string"}}
+    if user_id:
+        query["user_id"] = user_id
+    projection = ["user_id", "exercise_id", "created_at", "spoken_text", "expected_text",
+                  "fluency_score", "is_correct", "word_count", "error_count"]
+    cursor = db["training_sessions"].find(query, projection).sort("_id", 1).batch_size(batch_size)
+
+    scored = changed = 0
+    touched = set()
+    batch = []
+
+    async def flush():
+        nonlocal scored, changed
+        results = await asyncio.to_thread(
+            score_batch, [(doc["expected_text"], doc["spoken_text"]) for doc in batch], False, batch_size,
+        )
+        scored += len(batch)
+        updates = [
+            (doc, result.fields()) for doc, result in zip(batch, results)
+            if any(doc.get(field) != value for field, value in result.fields().items())
+        ]
+        batch.clear()
+        changed += len(updates)
+        if dry_run or not updates:
+            return
+        # created_at in the filter leaves alone attempts replaced since they were read
+        outcome = await db["training_sessions"].bulk_write([
+            UpdateOne({"_id": doc["_id"], "created_at": doc.get("created_at")}, {"$set": fields})
+            for doc, fields in updates
+        ], ordered=False)
+        by_user = defaultdict(list)
+        for doc, fields in updates:
+            by_user[doc["user_id"]].append((doc, {**doc, **fields}))
+        if outcome.matched_count == len(updates):
+            for uid, writes in by_user.items():
+                await rollups.record_trainings(uid, writes)
+                touched.add(uid)
+        else:
+            # Some attempts changed under us: derive these users' rollups afresh
+            for uid in by_user:
+                await rollups.rebuild(uid)
+
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+
+    for uid in touched:
+        await data_version.bump(uid)
+    return scored, changed
+
+
+async def _main(args):
+    from ..utils.db import connect_to_mongo, close_mongo_connection
+
+    await connect_to_mongo()
+    try:
+        scored, changed = await rescore(args.user, args.batch_size, args.dry_run)
+        print(f"Scored {scored} attempt(s); {'would change' if args.dry_run else 'changed'} {changed}")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score stored training attempts")
+    parser.add_argument("command", choices=["rescore"])
+    parser.add_argument("--user", help="Limit to one user id")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Count the changes without writing them")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,118 @@
+"""
+Stutter segments and severity from window predictions.
+
+Consecutive windows with the same label are merged into segments with a
+run-length encoding. Each window contributes its hop (the part of the
+recording it does not share with the next window) times the weight of its
+stutter type; the sum divided by the time all windows cover is the stutter
+intensity, between 0 and the largest weight. Thresholds map it to a
+severity level.
+
+All recordings of a batch are encoded in one pass over their concatenated
+labels, so scoring many recordings costs a handful of NumPy calls.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ..utils.config import settings
+from .inference import CLASS_NAMES, WindowPredictions
+
+LEVELS = ["Fluent", "Mild", "Moderate", "Severe"]
+
+
+@dataclass
+class SeverityConfig:
+    weights: np.ndarray      # float64 weight per class index, 0 for NoStutter
+    thresholds: np.ndarray   # ascending intensities at which Mild, Moderate, Severe start
+
+    @classmethod
+    def from_mapping(cls, weights: Dict[str, float], thresholds: Sequence[float]) -> "SeverityConfig":
+        unknown = set(weights) - set(CLASS_NAMES)
+        if unknown:
+            raise ValueError(f"Unknown stutter types in severity weights: {sorted(unknown)}")
+        if len(thresholds) != len(LEVELS) - 1 or list(thresholds) != sorted(thresholds):
+            raise ValueError(f"Expected {len(LEVELS) - 1} ascending severity thresholds")
+        vector = np.array([weights.get(name, 0.0) for name in CLASS_NAMES], dtype=np.float64)
+        return cls(weights=vector, thresholds=np.asarray(thresholds, dtype=np.float64))
+
+    @classmethod
+    def from_settings(cls) -> "SeverityConfig":
+        return cls.from_mapping(settings.SEVERITY_WEIGHTS, settings.SEVERITY_THRESHOLDS)
+
+
+@dataclass
+class SeverityReport:
+    # Segments of one recording, as parallel arrays
+    labels: np.ndarray
+    start: np.ndarray
+    end: np.ndarray
+    confidence: np.ndarray
+    intensity: float
+    level: str
+
+    def events(self) -> List[dict]:
+        # Stutter segments in the shape the analysis page renders
+        return [
+            {
+                "timestamp": round(float(self.start[i]), 2),
+                "end": round(float(self.end[i]), 2),
+                "duration": round(float(self.end[i] - self.start[i]), 2),
+                "type": CLASS_NAMES[self.labels[i]],
+                "confidence": round(float(self.confidence[i]), 3),
+            }
+            for i in (self.labels != 0).nonzero()[0]
+        ]
+
+
+def score_batch(recordings: Sequence[WindowPredictions],
+                config: Optional[SeverityConfig] = None) -> List[SeverityReport]:
+    config = config or SeverityConfig.from_settings()
+    counts = np.array([len(r.labels) for r in recordings], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    n = int(offsets[-1])
+    labels = np.concatenate([r.labels for r in recordings]) if n else np.empty(0, dtype=np.uint8)
+    confidence = np.concatenate([r.confidence for r in recordings]) if n else np.empty(0, dtype=np.float32)
+
+    # A run starts where the label changes and at the start of every recording
+    boundary = np.empty(n, dtype=bool)
+    if n:
+        boundary[0] = True
+        np.not_equal(labels[1:], labels[:-1], out=boundary[1:])
+        boundary[offsets[:-1][counts > 0]] = True
+    run_start = np.flatnonzero(boundary)
+    run_length = np.diff(np.append(run_start, n))
+    run_label = labels[run_start]
+    run_confidence = np.add.reduceat(confidence, run_start, dtype=np.float64) / run_length if n else np.empty(0)
+
+    owner = np.searchsorted(offsets, run_start, side="right") - 1
+    hop = np.array([r.hop_seconds for r in recordings], dtype=np.float64)
+    window = np.array([r.window_seconds for r in recordings], dtype=np.float64)
+    duration = np.array([r.duration for r in recordings], dtype=np.float64)
+
+    first = run_start - offsets[owner]
+    start = first * hop[owner]
+    end = np.minimum((first + run_length - 1) * hop[owner] + window[owner], duration[owner])
+
+    weighted = np.bincount(owner, config.weights[run_label] * run_length, minlength=len(recordings))
+    intensity = np.divide(weighted, counts, out=np.zeros(len(recordings)), where=counts > 0)
+    level = np.searchsorted(config.thresholds, intensity, side="right")
+
+    # Runs are ordered by recording, so each recording owns a contiguous slice
+    bounds = np.searchsorted(owner, np.arange(len(recordings) + 1))
+    return [
+        SeverityReport(
+            labels=run_label[a:b],
+            start=start[a:b],
+            end=end[a:b],
+            confidence=run_confidence[a:b],
+            intensity=round(float(intensity[i]), 4),
+            level=LEVELS[level[i]],
+        )
+        for i, (a, b) in enumerate(zip(bounds[:-1], bounds[1:]))
+    ]
+
+
+def score(predictions: WindowPredictions, config: Optional[SeverityConfig] = None) -> SeverityReport:
+    return score_batch([predictions], config)[0]
@@ -0,0 +1,70 @@
+"""
+Background startup of an API process.
+
+The lifespan only creates the MongoDB client, which connects lazily, so the
+process serves as soon as it is imported. prepare() then waits for the
+database, applies pending migrations (see migrations.py), recovers orphaned
+jobs and starts the analysis workers, retrying until it succeeds.
+/health/ready answers 503 until it has; /health/live only reports that the
+process is up.
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from ..utils.config import settings
+from ..utils.db import ping
+from . import job_queue, migrations
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    def __init__(self):
+        self.ready = False
+        self.stage = "starting"
+        self.error: Optional[str] = None
+        self.started_at = time.monotonic()
+        # Seconds from the start of prepare() until the process was ready
+        self.ready_after: Optional[float] = None
+
+    def report(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "starting",
+            "stage": self.stage,
+            "error": self.error,
+            "ready_after_seconds": self.ready_after,
+        }
+
+
+readiness = Readiness()
+
+
+async def prepare(handler: job_queue.JobHandler):
+    readiness.__init__()
+    delay = settings.STARTUP_RETRY_SECONDS
+    while True:
+        try:
+            readiness.stage = "database"
+            await ping()
+            readiness.stage = "migrations"
+            applied = await migrations.apply()
+            if applied:
+                logger.info("Applied %d migration(s) at startup", len(applied))
+            readiness.stage = "jobs"
+            # Jobs left running by a previous process go back in the queue
+            await job_queue.recover_orphaned_jobs()
+            break
+        except Exception as e:
+            readiness.error = f"{readiness.stage}: {e}"
+            logger.warning("Startup step %s failed, retrying in %.0fs: %s", readiness.stage, delay, e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    job_queue.workers.start(handler, settings.ANALYSIS_WORKERS)
+    readiness.ready = True
+    readiness.stage = "serving"
+    readiness.error = None
+    readiness.ready_after = round(time.monotonic() - readiness.started_at, 3)
+    logger.info("Ready after %.2fs", readiness.ready_after)
@@ -0,0 +1,10 @@
+from typing import List
+
+DATE_FORMAT = "%Y-%m-%d"
+TREND_DAYS = 7
+
+
+def average_of(values: List[float]) -> int:
+    # Mean of the per-collection averages, as the dashboard always showed it
+    values = [v for v in values if v is not None]
+    return round(sum(values) / len(values)) if values else 0
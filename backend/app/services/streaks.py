@@ -0,0 +1,120 @@
+"""
+Activity streaks kept on the user document.
+
+`streak_current` is the run of consecutive active UTC days ending at
+`last_active_day`, and `streak_longest` the best run so far. Each write
+path records its activity with one atomic pipeline update, and reading a
+streak is a single field lookup. A day stays counted once it was active,
+even if a later training attempt replaces that day's document.
+
+Migration 0009 computes the initial values from existing history; run it
+again by hand with:
+
+    python -m app.services.streaks migrate
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta, time as dt_time
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from ..utils.db import get_db, get_read_db
+from .stats_service import DATE_FORMAT
+
+STREAK_FIELDS = {"streak_current": 1, "streak_longest": 1, "last_active_day": 1}
+
+
+def _day(when: datetime) -> datetime:
+    return datetime.combine(when.date(), dt_time.min)
+
+
+async def record_activity(user_id: str, when: datetime):
+    db = get_db()
+    day = _day(when)
+    await db.users.update_one({"_id": ObjectId(user_id)}, [
+        {"$set": {
+            "streak_current": {"$switch": {
+                "branches": [
+                    # Same day, or a late write for an earlier day: unchanged
+                    {"case": {"$gte": ["$last_active_day", day]}, "then": "$streak_current"},
+                    {"case": {"$eq": ["$last_active_day", day - timedelta(days=1)]},
+                     "then": {"$add": [{"$ifNull": ["$streak_current", 0]}, 1]}},
+                ],
+                "default": 1,
+            }},
+        }},
+        {"$set": {
+            "streak_longest": {"$max": [{"$ifNull": ["$streak_longest", 0]}, "$streak_current"]},
+            "last_active_day": {"$max": ["$last_active_day", day]},
+        }},
+    ])
+
+
+def current_streak(user: Optional[dict], now: datetime) -> int:
+    # A streak survives until the end of the day after the last activity
+    if not user or not user.get("last_active_day"):
+        return 0
+    if user["last_active_day"] < _day(now) - timedelta(days=1):
+        return 0
+    return user.get("streak_current", 0)
+
+
+async def read_streak(user_id: str, now: datetime, session=None) -> int:
+    db = get_read_db()
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, STREAK_FIELDS, session=session)
+    return current_streak(user, now)
+
+
+def streaks_from_days(days: List[datetime]) -> dict:
+    # `days` are distinct active days in ascending order
+    current = longest = 0
+    previous = None
+    for day in days:
+        current = current + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+        longest = max(longest, current)
+        previous = day
+    return {"streak_current": current, "streak_longest": longest, "last_active_day": previous}
+
+
+async def migrate() -> int:
+    db = get_db()
+    active_days: Dict[str, set] = defaultdict(set)
+    for collection in ("training_sessions", "speech_analysis"):
+        cursor = db[collection].aggregate([
+            {"$match": {"created_at": {"$type": "date"}}},
+            {"$group": {"_id": {
+                "user_id": "$user_id",
+                "day": {"$dateToString": {"format": DATE_FORMAT, "date": "$created_at"}},
+            }}},
+        ])
+        async for row in cursor:
+            active_days[row["_id"]["user_id"]].add(datetime.strptime(row["_id"]["day"], DATE_FORMAT))
+
+    ops = [
+        UpdateOne({"_id": ObjectId(user_id)}, {"$set": streaks_from_days(sorted(days)), "$inc": {"data_version": 1}})
+        for user_id, days in active_days.items()
+        if ObjectId.is_valid(user_id)
+    ]
+    for start in range(0, len(ops), 1000):
+        await db.users.bulk_write(ops[start:start + 1000], ordered=False)
+    return len(ops)
+
+
+async def _main(args):
+    from ..utils.db import connect_to_mongo, close_mongo_connection
+
+    await connect_to_mongo()
+    try:
+        users = await migrate()
+        print(f"Initialised streaks for {users} user(s)")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the user streak fields")
+    parser.add_argument("command", choices=["migrate"])
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,303 @@
+"""
+Incremental stutter analysis of audio streamed while the user speaks.
+
+Samples go into a ring buffer that holds one classifier window plus the
+latency budget (STREAM_LATENCY_BUDGET_SECONDS). A window is classified
+as soon as its last sample has arrived, and samples are released once no
+window needs them. A full buffer means the classifier is a whole budget
+behind. The stream then stops reading from the client until space frees
+up, so a fast client or a slow model cannot make anything grow:
+- the backlog of audio is bounded by the buffer;
+- the label updates waiting for a slow client are bounded by a queue that
+  drops its oldest entries.
+
+When the stream ends, its tail is zero-padded into a last window, as for
+uploaded recordings. The window predictions are then merged and scored
+like any other analysis.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+import numpy as np
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from ..utils import metrics
+from ..utils.config import settings
+from .audio import count_windows, padded_length
+from .inference import CLASS_NAMES, WindowPredictions, engine
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"s16le": np.dtype("<i2"), "f32le": np.dtype("<f4")}
+
+# Streams open in this process
+active = 0
+
+
+class StreamError(Exception):
+    def __init__(self, code: int, reason: str):
+        super().__init__(reason)
+        self.code = code
+        self.reason = reason
+
+
+class RingBuffer:
+    """
+    Fixed-capacity float32 sample buffer addressed by absolute sample index
+    (samples since the start of the stream).
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=np.float32)
+        self.start = 0  # oldest retained sample
+        self.end = 0    # one past the newest sample
+
+    @property
+    def free(self) -> int:
+        return self.capacity - (self.end - self.start)
+
+    def write(self, samples: np.ndarray):
+        n = len(samples)
+        if n > self.free:
+            raise BufferError("Ring buffer full")
+        pos = self.end % self.capacity
+        first = min(n, self.capacity - pos)
+        self.data[pos:pos + first] = samples[:first]
+        self.data[:n - first] = samples[first:]
+        self.end += n
+
+    def read(self, begin: int, length: int) -> np.ndarray:
+        # A copy of samples [begin, begin + length)
+        if begin < self.start or begin + length > self.end:
+            raise IndexError("Samples not in the buffer")
+        pos = begin % self.capacity
+        first = min(length, self.capacity - pos)
+        if first == length:
+            return self.data[pos:pos + length].copy()
+        return np.concatenate((self.data[pos:], self.data[:length - first]))
+
+    def release(self, upto: int):
+        # Samples before `upto` are no longer needed
+        self.start = max(self.start, min(upto, self.end))
+
+
+class StreamAnalyzer:
+    """The windowing state of one stream, independent of the transport."""
+
+    def __init__(self, sample_rate: int, window_seconds: float, hop_seconds: float, budget_seconds: float):
+        self.sample_rate = sample_rate
+        self.window = int(window_seconds * sample_rate)
+        self.hop = int(hop_seconds * sample_rate)
+        self.buffer = RingBuffer(self.window + int(budget_seconds * sample_rate))
+        self.next_window = 0
+        self.labels: List[np.ndarray] = []
+        self.confidence: List[np.ndarray] = []
+        # (sample index after a received frame, arrival time) for the lag of each window
+        self._arrivals: Deque[Tuple[int, float]] = deque()
+
+    @property
+    def max_frame(self) -> int:
+        # Once every complete window is classified, at least this much is free
+        return self.buffer.capacity - self.window
+
+    @property
+    def received(self) -> int:
+        return self.buffer.end
+
+    def write(self, samples: np.ndarray):
+        self.buffer.write(samples)
+        self._arrivals.append((self.buffer.end, time.monotonic()))
+
+    def ready(self) -> int:
+        # Windows whose last sample has arrived and that are not classified yet
+        if self.received < self.window:
+            return 0
+        return (self.received - self.window) // self.hop + 1 - self.next_window
+
+    def take(self, limit: int) -> np.ndarray:
+        n = min(self.ready(), limit)
+        return np.stack([
+            self.buffer.read((self.next_window + i) * self.hop, self.window) for i in range(n)
+        ]) if n else np.empty((0, self.window), dtype=np.float32)
+
+    def record(self, labels: np.ndarray, confidence: np.ndarray) -> List[dict]:
+        """Stores the predictions of the taken windows and returns them as label updates."""
+        first = self.next_window
+        now = time.monotonic()
+        updates = []
+        for i, (label, conf) in enumerate(zip(labels.tolist(), confidence.tolist())):
+            last_sample = (first + i) * self.hop + self.window
+            while self._arrivals and self._arrivals[0][0] < last_sample:
+                self._arrivals.popleft()
+            arrived = self._arrivals[0][1] if self._arrivals else now
+            start = (first + i) * self.hop / self.sample_rate
+            updates.append({
+                "index": first + i,
+                "start": round(start, 2),
+                "end": round(start + self.window / self.sample_rate, 2),
+                "label": CLASS_NAMES[label],
+                "confidence": round(conf, 3),
+                "lag_ms": round((now - arrived) * 1000, 1),
+            })
+        self.labels.append(labels)
+        self.confidence.append(confidence)
+        self.next_window += len(labels)
+        self.buffer.release(self.next_window * self.hop)
+        return updates
+
+    def tail(self) -> np.ndarray:
+        """
+        The windows left once the stream has ended: those overlapping the
+        end of the audio, zero-padded as classify() pads a recording.
+        """
+        total = count_windows(self.received, self.window, self.hop) if self.received else 0
+        padded = np.zeros(padded_length(self.received, self.window, self.hop), dtype=np.float32)
+        begin = self.next_window * self.hop
+        padded[begin:self.received] = self.buffer.read(begin, self.received - begin)
+        return np.stack([
+            padded[k * self.hop:k * self.hop + self.window] for k in range(self.next_window, total)
+        ]) if total > self.next_window else np.empty((0, self.window), dtype=np.float32)
+
+    def predictions(self) -> WindowPredictions:
+        return WindowPredictions(
+            labels=np.concatenate(self.labels) if self.labels else np.empty(0, dtype=np.uint8),
+            confidence=np.concatenate(self.confidence) if self.confidence else np.empty(0, dtype=np.float32),
+            window_seconds=self.window / self.sample_rate,
+            hop_seconds=self.hop / self.sample_rate,
+            duration=self.received / self.sample_rate,
+        )
+
+
+def _control(text: str) -> Optional[str]:
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return None
+    return message.get("type") if isinstance(message, dict) else None
+
+
+def new_analyzer() -> StreamAnalyzer:
+    return StreamAnalyzer(
+        settings.ML_SAMPLE_RATE, settings.ML_WINDOW_SECONDS, settings.ML_HOP_SECONDS,
+        settings.STREAM_LATENCY_BUDGET_SECONDS,
+    )
+
+
+class StreamPipeline:
+    """
+    Three tasks around one analyzer: reading frames from the client,
+    classifying ready windows on the inference pool and sending label
+    updates back.
+    """
+
+    def __init__(self, websocket: WebSocket, analyzer: StreamAnalyzer, dtype: np.dtype):
+        self.websocket = websocket
+        self.analyzer = analyzer
+        self.dtype = dtype
+        self.max_samples = int(settings.STREAM_MAX_SECONDS * analyzer.sample_rate)
+        self.changed = asyncio.Condition()
+        self.ended = False
+        self.disconnected = False
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=settings.STREAM_MAX_PENDING_MESSAGES)
+        self.dropped = 0
+
+    def _samples(self, data: bytes) -> np.ndarray:
+        if len(data) % self.dtype.itemsize:
+            raise StreamError(1007, "Frames must hold whole samples")
+        samples = np.frombuffer(data, dtype=self.dtype)
+        if len(samples) > self.analyzer.max_frame:
+            raise StreamError(1009, f"Frames are limited to {self.analyzer.max_frame} samples")
+        if self.dtype.kind == "i":
+            return samples.astype(np.float32) / 32768.0
+        return samples.astype(np.float32)
+
+    async def _receive(self):
+        try:
+            while not self.ended:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    self.disconnected = True
+                    break
+                if message.get("bytes") is not None:
+                    samples = self._samples(message["bytes"])
+                    async with self.changed:
+                        # Backpressure: the client is not read while the classifier is a budget behind
+                        await self.changed.wait_for(lambda: self.analyzer.buffer.free >= len(samples))
+                        self.analyzer.write(samples)
+                        self.changed.notify_all()
+                    if self.analyzer.received >= self.max_samples:
+                        self._post({"type": "limit", "seconds": settings.STREAM_MAX_SECONDS})
+                        break
+                elif message.get("text") is not None and _control(message["text"]) == "end":
+                    break
+        except WebSocketDisconnect:
+            self.disconnected = True
+        finally:
+            async with self.changed:
+                self.ended = True
+                self.changed.notify_all()
+
+    async def _classify(self):
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: self.analyzer.ready() or self.ended)
+                windows = self.analyzer.take(settings.ML_BATCH_SIZE)
+            if not len(windows):
+                return
+            with metrics.stage("stream_inference"):
+                labels, confidence = await engine.classify_windows(windows)
+            async with self.changed:
+                updates = self.analyzer.record(labels, confidence)
+                self.changed.notify_all()
+            self._post({"type": "windows", "windows": updates})
+
+    def _post(self, message: dict):
+        # Never waits on the client: the oldest updates give way
+        if self.outbox.full():
+            self.outbox.get_nowait()
+            self.dropped += 1
+        if self.dropped and message.get("type") == "windows":
+            message["dropped"] = self.dropped
+        self.outbox.put_nowait(message)
+
+    async def _send(self):
+        while True:
+            message = await self.outbox.get()
+            if message is None:
+                return
+            if not self.disconnected:
+                await self.websocket.send_json(message)
+
+    async def run(self) -> Optional[WindowPredictions]:
+        """Runs until the stream ends; returns the predictions, or None without audio."""
+        sender = asyncio.create_task(self._send())
+        try:
+            receiver = asyncio.create_task(self._receive())
+            try:
+                await self._classify()
+            finally:
+                if not receiver.done():
+                    receiver.cancel()
+                await asyncio.gather(receiver, return_exceptions=True)
+            if receiver.exception() is not None:
+                raise receiver.exception()
+
+            if not self.analyzer.received:
+                return None
+            tail = self.analyzer.tail()
+            if len(tail):
+                with metrics.stage("stream_inference"):
+                    labels, confidence = await engine.classify_windows(tail)
+                self._post({"type": "windows", "windows": self.analyzer.record(labels, confidence)})
+            return self.analyzer.predictions()
+        finally:
+            # The sender flushes what is pending, then stops (unless the client is already gone)
+            stop = asyncio.ensure_future(self.outbox.put(None))
+            await asyncio.wait({stop, sender}, return_when=asyncio.FIRST_COMPLETED)
+            stop.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
@@ -0,0 +1,131 @@
+"""
+Compact storage for the per-analysis event timelines.
+
+With TIMELINE_ENCODING=columnar, `stutterEvents` and `headMovements` are
+stored as parallel typed arrays packed into BSON binary instead of arrays
+of small documents: timestamps and ends as float32, types as uint8 codes
+into a per-timeline list of names, confidences as float16. Every read path
+decodes them back to the event dicts the API has always returned, so old
+and new documents can coexist.
+
+Events are kept in timestamp order, so a time range is found with a binary
+search on the timestamp column and only that slice of the other columns is
+decoded. numpy is imported when a timeline is actually packed or unpacked.
+"""
+from typing import Any, Dict, List, Optional
+
+from bson import Binary
+
+from ..utils.config import settings
+
+TIMELINE_FIELDS = ["stutterEvents", "headMovements"]
+ENCODING = "columnar-1"
+COLUMNS = {"timestamp": "<f4", "end": "<f4", "confidence": "<f2"}
+# Decoded values are rounded back to the precision they were produced with
+PRECISION = {"timestamp": 2, "end": 2, "confidence": 3}
+
+
+def is_encoded(value: Any) -> bool:
+    return isinstance(value, dict) and value.get("encoding") == ENCODING
+
+
+def encode_events(events: List[dict]) -> Optional[dict]:
+    """
+    Packs a timeline into columns, or returns None when the events carry
+    fields the columnar layout has no room for (they are then stored as is).
+    """
+    if not events:
+        return None
+    keys = set().union(*events)
+    if "timestamp" not in keys or not keys <= set(COLUMNS) | {"type", "duration"}:
+        return None
+    if "duration" in keys and "end" not in keys:
+        return None
+    if any(len(event) != len(keys) for event in events):
+        return None
+    import numpy as np
+
+    events = sorted(events, key=lambda event: event["timestamp"])
+    types = sorted({event["type"] for event in events}) if "type" in keys else []
+    if len(types) > 256:
+        return None
+    codes = {name: code for code, name in enumerate(types)}
+
+    try:
+        columns = {
+            name: Binary(np.array([event[name] for event in events], dtype=dtype).tobytes())
+            for name, dtype in COLUMNS.items()
+            if name in keys
+        }
+    except (TypeError, ValueError):
+        return None
+    if types:
+        columns["type"] = Binary(np.array([codes[event["type"]] for event in events], dtype=np.uint8).tobytes())
+    # duration is always end - timestamp, so it is recomputed on decode
+    return {"encoding": ENCODING, "count": len(events), "types": types, "columns": columns}
+
+
+def _slice(encoded: dict, start: Optional[float], end: Optional[float]) -> slice:
+    count = encoded["count"]
+    if start is None and end is None or not count:
+        return slice(0, count)
+    import numpy as np
+
+    timestamps = np.frombuffer(encoded["columns"]["timestamp"], dtype=COLUMNS["timestamp"])
+    # Bounds are compared at the stored precision
+    first = int(np.searchsorted(timestamps, np.float32(start), side="left")) if start is not None else 0
+    last = int(np.searchsorted(timestamps, np.float32(end), side="left")) if end is not None else count
+    return slice(first, max(first, last))
+
+
+def decode_events(encoded: dict, start: Optional[float] = None, end: Optional[float] = None) -> List[dict]:
+    # Events whose timestamp falls in [start, end)
+    window = _slice(encoded, start, end)
+    n = window.stop - window.start
+    if not n:
+        return []
+    import numpy as np
+
+    arrays: Dict[str, np.ndarray] = {}
+    for name, binary in encoded["columns"].items():
+        dtype = np.dtype(np.uint8 if name == "type" else COLUMNS[name])
+        values = np.frombuffer(binary, dtype=dtype, count=n, offset=window.start * dtype.itemsize)
+        if name == "type":
+            arrays[name] = np.array(encoded["types"], dtype=object)[values]
+        else:
+            arrays[name] = np.round(values.astype(np.float64), PRECISION[name])
+    if "end" in arrays:
+        arrays["duration"] = np.round(arrays["end"] - arrays["timestamp"], 2)
+
+    columns = {name: values.tolist() for name, values in arrays.items()}
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+def filter_events(events: List[dict], start: Optional[float] = None, end: Optional[float] = None) -> List[dict]:
+    # Same range semantics for timelines stored as plain documents
+    return [
+        event for event in events
+        if (start is None or event["timestamp"] >= start) and (end is None or event["timestamp"] < end)
+    ]
+
+
+def encode_document(doc: dict) -> dict:
+    if settings.TIMELINE_ENCODING != "columnar":
+        return doc
+    for field in TIMELINE_FIELDS:
+        if isinstance(doc.get(field), list):
+            encoded = encode_events(doc[field])
+            if encoded is not None:
+                doc[field] = encoded
+    return doc
+
+
+def decode_document(doc: dict, start: Optional[float] = None, end: Optional[float] = None) -> dict:
+    for field in TIMELINE_FIELDS:
+        value = doc.get(field)
+        if is_encoded(value):
+            doc[field] = decode_events(value, start, end)
+        elif isinstance(value, list) and (start is not None or end is not None):
+            doc[field] = filter_events(value, start, end)
+    return doc
@@ -0,0 +1,132 @@
+import asyncio
+from datetime import datetime
+from typing import List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import PyMongoError
+
+from ..utils.config import settings
+from ..utils.db import get_db
+from ..utils.models import TrainingCompletion, TrainingBatchItemResult
+from . import data_version, rollups, streaks
+
+# What the rollups need of the attempt a write replaces
+PREVIOUS_FIELDS = {"_id": 0, "exercise_id": 1, "created_at": 1, "fluency_score": 1, "is_correct": 1}
+
+SESSION_FIELDS = [
+    "spoken_text", "expected_text", "fluency_score", "is_correct", "word_count",
+    "error_count", "type", "difficulty", "level",
+]
+
+
+def _training_document(user_id: str, completion: TrainingCompletion, now: datetime) -> dict:
+    training_data = {
+        "user_id": user_id,
+        "exercise_id": completion.exercise_id,
+        "completed": True,
+        "created_at": now
+    }
+    # A bare completion (no session data) leaves the stored attempt details alone
+    if completion.model_fields_set - {"exercise_id"}:
+        training_data.update({field: getattr(completion, field) for field in SESSION_FIELDS})
+    return training_data
+
+
+async def _server_scored(completions: List[TrainingCompletion]) -> List[TrainingCompletion]:
+    # Replaces the client's numbers of attempts that carry both texts
+    from . import scoring
+
+    texts = [i for i, c in enumerate(completions) if c.expected_text is not None and c.spoken_text is not None]
+    if not texts:
+        return completions
+    results = await asyncio.to_thread(
+        scoring.score_batch, [(completions[i].expected_text, completions[i].spoken_text) for i in texts]
+    )
+    scored = list(completions)
+    for i, result in zip(texts, results):
+        scored[i] = completions[i].model_copy(update=result.fields())
+    return scored
+
+
+async def _save(db, user_id: str, doc: dict, limit: asyncio.Semaphore):
+    # The replaced attempt comes back from the write itself, so concurrent
+    # completions of one exercise never take back the same previous score
+    try:
+        async with limit:
+            previous = await db["training_sessions"].find_one_and_update(
+                {"user_id": user_id, "exercise_id": doc["exercise_id"]},
+                {"$set": doc},
+                projection=PREVIOUS_FIELDS,
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
+            )
+    except PyMongoError as e:
+        return None, str(e) or "Write failed"
+    return previous, None
+
+
+async def record_completions(user_id: str, completions: List[TrainingCompletion]) -> List[TrainingBatchItemResult]:
+    """
+    Saves training attempts with one find_one_and_update per exercise, up
+    to TRAINING_WRITE_CONCURRENCY at a time, and one unordered bulk_write
+    for the progress. Each exercise keeps only its latest attempt, so
+    within a batch the last completion for an exercise wins and earlier
+    ones are reported as superseded.
+    """
+    db = get_db()
+    now = datetime.utcnow()
+
+    latest = {completion.exercise_id: i for i, completion in enumerate(completions)}
+    results = [
+        TrainingBatchItemResult(exercise_id=c.exercise_id, status="saved" if latest[c.exercise_id] == i else "superseded")
+        for i, c in enumerate(completions)
+    ]
+    winners = [completions[i] for i in sorted(latest.values())]
+    if settings.TRAINING_SCORING == "server":
+        winners = await _server_scored(winners)
+    documents = [_training_document(user_id, completion, now) for completion in winners]
+
+    # Overwrite the latest score for each exercise
+    limit = asyncio.Semaphore(settings.TRAINING_WRITE_CONCURRENCY)
+    writes = await asyncio.gather(*(_save(db, user_id, doc, limit) for doc in documents))
+    for doc, (_, error) in zip(documents, writes):
+        if error:
+            result = results[latest[doc["exercise_id"]]]
+            result.status, result.error = "error", error
+
+    saved = [
+        (completion, doc, previous)
+        for completion, doc, (previous, error) in zip(winners, documents, writes)
+        if not error
+    ]
+    if not saved:
+        return results
+
+    # Update user progress with the last correct attempt of each exercise type
+    progress = {}
+    for completion, _, _ in saved:
+        if completion.is_correct:
+            progress[completion.type] = completion
+    if progress:
+        await db["user_progress"].bulk_write([
+            UpdateOne(
+                {"user_id": user_id, "type": exercise_type},
+                {"$set": {
+                    "last_completed_level": completion.level,
+                    "last_completed_difficulty": completion.difficulty,
+                    "updated_at": now
+                }},
+                upsert=True,
+            )
+            for exercise_type, completion in progress.items()
+        ], ordered=False)
+
+    await rollups.record_trainings(user_id, [(previous, doc) for _, doc, previous in saved])
+    await streaks.record_activity(user_id, now)
+    await data_version.bump(user_id)
+    return results
+
+
+async def record_completion(user_id: str, completion: TrainingCompletion) -> Optional[str]:
+    results = await record_completions(user_id, [completion])
+    return results[0].error
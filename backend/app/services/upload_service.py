@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import json
+import os
+from typing import Iterable, NamedTuple
+
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+
+from ..utils.config import settings
+
+# Room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class SpooledFile(NamedTuple):
+    path: str
+    size: int
+    sha256: str  # hex digest of the content, computed while streaming
+
+
+class UploadSpool:
+    """
+    Dedicated directory for uploaded recordings.
+    Files are streamed in fixed-size chunks and every disk write runs in the
+    threadpool, so a large upload never holds the whole file in memory or
+    blocks the event loop. Each upload is capped at `max_upload_bytes` and the
+    directory as a whole at `quota_bytes`.
+    """
+
+    def __init__(self, directory: str, chunk_size: int, max_upload_bytes: int, quota_bytes: int):
+        self.directory = os.path.abspath(directory)
+        self.chunk_size = chunk_size
+        self.max_upload_bytes = max_upload_bytes
+        self.quota_bytes = quota_bytes
+        self._usage: int | None = None
+        self._lock = asyncio.Lock()
+
+    async def _ensure_ready(self):
+        if self._usage is not None:
+            return
+        async with self._lock:
+            if self._usage is None:
+                self._usage = await run_in_threadpool(self._scan_usage)
+
+    def _scan_usage(self) -> int:
+        os.makedirs(self.directory, exist_ok=True)
+        total = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    total += entry.stat().st_size
+        return total
+
+    def _charge(self, nbytes: int):
+        if self._usage + nbytes > self.quota_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_507_INSUFFICIENT_STORAGE,
+                detail="Upload storage is full, please try again later",
+            )
+        self._usage += nbytes
+
+    async def has_room_for(self, nbytes: int) -> bool:
+        await self._ensure_ready()
+        return self._usage + nbytes <= self.quota_bytes
+
+    async def save(self, upload: UploadFile, prefix: str) -> SpooledFile:
+        await self._ensure_ready()
+        filename = os.path.basename(upload.filename or "") or "recording"
+        path = os.path.join(self.directory, f"{prefix}_{filename}")
+
+        written = 0
+        digest = hashlib.sha256()
+        f = await run_in_threadpool(open, path, "wb")
+        try:
+            while True:
+                chunk = await upload.read(self.chunk_size)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > self.max_upload_bytes:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+                self._charge(len(chunk))
+                await run_in_threadpool(self._write, f, digest, chunk)
+        except BaseException:
+            await run_in_threadpool(f.close)
+            await self.discard(path)
+            raise
+        await run_in_threadpool(f.close)
+        return SpooledFile(path, written, digest.hexdigest())
+
+    @staticmethod
+    def _write(f, digest, chunk: bytes):
+        # Hashing releases the GIL too, so both stay off the event loop
+        digest.update(chunk)
+        f.write(chunk)
+
+    async def discard(self, path: str):
+        size = await run_in_threadpool(self._remove, path)
+        # Counted on the event loop, like _charge; only the unlink runs in the thread
+        if self._usage is not None:
+            self._usage = max(0, self._usage - size)
+
+    @staticmethod
+    def _remove(path: str) -> int:
+        # Bytes freed; 0 when the file was already gone
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        return size
+
+
+spool = UploadSpool(
+    settings.UPLOAD_DIR,
+    chunk_size=settings.UPLOAD_CHUNK_SIZE,
+    max_upload_bytes=settings.MAX_UPLOAD_BYTES,
+    quota_bytes=settings.UPLOAD_DIR_QUOTA_BYTES,
+)
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Rejects oversized uploads before their body is parsed.
+    A declared Content-Length above the per-upload cap (413) or beyond the
+    spool's remaining quota (507) is answered without reading the body;
+    chunked bodies are counted as they arrive and cut off at the cap.
+    """
+
+    def __init__(self, app, paths: Iterable[str], upload_spool: UploadSpool):
+        self.app = app
+        self.paths = frozenset(path.rstrip("/") for path in paths)
+        self.spool = upload_spool
+        self.max_body_bytes = upload_spool.max_upload_bytes + MULTIPART_OVERHEAD_BYTES
+
+    def _guards(self, scope) -> bool:
+        # The app's own path: servers differ on whether it carries the mount prefix
+        path, root_path = scope["path"], scope.get("root_path", "")
+        if root_path and path.startswith(root_path + "/"):
+            path = path[len(root_path):]
+        return path.rstrip("/") in self.paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") != "POST" or not self._guards(scope):
+            await self.app(scope, receive, send)
+            return
+
+        declared = None
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    declared = None
+                break
+        if declared is not None:
+            if declared > self.max_body_bytes:
+                await _send_error(send, 413, "File too large")
+                return
+            if not await self.spool.has_room_for(declared - MULTIPART_OVERHEAD_BYTES):
+                await _send_error(send, 507, "Upload storage is full, please try again later")
+                return
+
+        received = 0
+        too_large = False
+        replaced = False
+
+        async def limited_receive():
+            nonlocal received, too_large
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    too_large = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def limited_send(message):
+            nonlocal replaced
+            # The body parser turns our exception into a generic error
+            # response; swap it for a 413
+            if too_large:
+                if message["type"] == "http.response.start":
+                    replaced = True
+                    await _send_error(send, 413, "File too large")
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, limited_send)
+        except _BodyTooLarge:
+            if not replaced:
+                await _send_error(send, 413, "File too large")
+
+
+async def _send_error(send, status_code: int, detail: str):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
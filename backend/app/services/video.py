@@ -0,0 +1,263 @@
+"""
+Head movement detection on the video track of uploaded recordings.
+
+ffmpeg decodes the video at VIDEO_FPS frames per second, scaled to
+VIDEO_WIDTH pixels wide and converted to grayscale. The frames are read
+from its pipe VIDEO_BATCH_FRAMES at a time. The decoder still decodes
+every frame of the stream. But frames are dropped and scaled down before
+they leave ffmpeg, so with the defaults every later step handles about
+400 times fewer pixels than full 1080p30 would need.
+
+Each batch is scored with whole-array NumPy operations. Each frame is
+compared with the frame before it:
+- motion: the share of pixels whose brightness changed by more than
+  PIXEL_DELTA;
+- shift: the translation (dx, dy) of the changed region, from a
+  Lucas-Kanade least-squares fit over those pixels.
+
+Frames whose motion reaches VIDEO_MOTION_THRESHOLD are merged into
+movements of at least VIDEO_MIN_MOVEMENT_SECONDS. A movement is a "Nod"
+when its shift is mostly vertical, otherwise a "Shake".
+
+Decoding and scoring run in one task on the inference process pool, next
+to the audio windows of the same recording (see ml_service.py). The task
+reports how long it waited for frames and how long it spent scoring them.
+"""
+import asyncio
+import shutil
+import subprocess
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from ..utils import metrics
+from ..utils.config import settings
+
+# Brightness change (of 255) below which a pixel counts as sensor noise
+PIXEL_DELTA = 12
+# Frames of stillness that do not split a movement
+MAX_GAP_FRAMES = 1
+
+
+@dataclass
+class VideoMotion:
+    motion: np.ndarray   # float32 share of changed pixels per frame, 0 for the first
+    dx: np.ndarray       # float32 horizontal shift per frame, in analysed pixels
+    dy: np.ndarray       # float32 vertical shift per frame
+    fps: float
+    decode_seconds: float = 0.0
+    score_seconds: float = 0.0
+
+
+def probe(file_path: str) -> Optional[Tuple[int, int]]:
+    # (width, height) of the first video stream, None for audio-only files
+    if shutil.which("ffprobe") is None:
+        raise RuntimeError("ffprobe is required to analyse video")
+    proc = subprocess.run(
+        [
+            "ffprobe", "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "stream=width,height", "-of", "csv=p=0", file_path,
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    fields = proc.stdout.strip().split(",")
+    if len(fields) < 2 or not all(field.isdigit() for field in fields[:2]):
+        return None
+    return int(fields[0]), int(fields[1])
+
+
+def scaled_size(width: int, height: int, target_width: int) -> Tuple[int, int]:
+    # Aspect ratio kept, even dimensions as the scaler wants them, never upscaled
+    target_width = min(target_width, width) // 2 * 2
+    return target_width, max(2, round(height * target_width / width / 2) * 2)
+
+
+def decode_frames(file_path: str, fps: float, width: int, height: int, batch_frames: int) -> Iterator[np.ndarray]:
+    """Grayscale uint8 frames of shape (n <= batch_frames, height, width)."""
+    # Errors go to a file: a corrupt stream can log more than a pipe holds
+    errors = tempfile.TemporaryFile()
+    proc = subprocess.Popen(
+        [
+            "ffmpeg", "-nostdin", "-loglevel", "error", "-i", file_path, "-map", "0:v:0", "-an", "-sn",
+            "-vf", f"fps={fps},scale={width}:{height}:flags=area,format=gray",
+            "-f", "rawvideo", "-pix_fmt", "gray", "-",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=errors,
+    )
+    frame_bytes = width * height
+    buffer = bytearray(batch_frames * frame_bytes)
+    view = memoryview(buffer)
+    finished = False
+    try:
+        while not finished:
+            filled = 0
+            while filled < len(buffer):
+                n = proc.stdout.readinto(view[filled:])
+                if not n:
+                    finished = True
+                    break
+                filled += n
+            frames = filled // frame_bytes
+            if frames:
+                yield np.frombuffer(buffer, dtype=np.uint8, count=frames * frame_bytes).reshape(frames, height, width)
+    finally:
+        if not finished:
+            proc.kill()
+        proc.stdout.close()
+        returncode = proc.wait()
+        errors.seek(0)
+        stderr = errors.read()
+        errors.close()
+        if finished and returncode:
+            raise subprocess.CalledProcessError(returncode, "ffmpeg", stderr=stderr)
+
+
+def score_frames(frames: np.ndarray, previous: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Motion and shift of each frame of a uint8 (n, h, w) batch against the
+    frame before it: `previous` for the first one, or none at the very start.
+    """
+    stack = frames if previous is None else np.concatenate((previous[None], frames))
+    n, h, w = frames.shape
+    motion = np.zeros(n, dtype=np.float32)
+    dx = np.zeros(n, dtype=np.float32)
+    dy = np.zeros(n, dtype=np.float32)
+    if len(stack) < 2:
+        return motion, dx, dy
+
+    # Whole-batch passes stay in uint8; only changed pixels are looked at further
+    before, after = stack[:-1].ravel(), stack[1:].ravel()
+    changed = np.flatnonzero(np.maximum(before, after) - np.minimum(before, after) > PIXEL_DELTA)
+    k = changed // (h * w)
+    y = changed // w % h
+    x = changed % w
+
+    def pair_sum(index):
+        return np.take(before, index).astype(np.float32) + np.take(after, index)
+
+    # Central differences of the two frames' average, one-sided at the borders
+    left, right = changed - (x > 0), changed + (x < w - 1)
+    up, down = changed - w * (y > 0), changed + w * (y < h - 1)
+    gx = (pair_sum(right) - pair_sum(left)) / (2 * (right - left))
+    gy = (pair_sum(down) - pair_sum(up)) / (2 * (down - up) // w)
+    gt = np.take(after, changed).astype(np.float32) - np.take(before, changed)
+
+    # Least-squares translation of the changed pixels per frame: A [dx, dy] = -b
+    m = len(stack) - 1
+    sxx, syy, sxy, sxt, syt = (
+        np.bincount(k, weights, minlength=m) for weights in (gx * gx, gy * gy, gx * gy, gx * gt, gy * gt)
+    )
+    det = sxx * syy - sxy * sxy
+    solvable = det > 1e-6 * np.maximum(sxx * syy, 1.0)
+    safe = np.where(solvable, det, 1.0)
+
+    scored = slice(n - m, n)
+    motion[scored] = np.bincount(k, minlength=m) / (h * w)
+    dx[scored] = np.where(solvable, (sxy * syt - syy * sxt) / safe, 0.0)
+    dy[scored] = np.where(solvable, (sxy * sxt - sxx * syt) / safe, 0.0)
+    return motion, dx, dy
+
+
+def analyze_frames(batches: Iterable[np.ndarray], fps: float) -> VideoMotion:
+    motion, dx, dy = [], [], []
+    previous = None
+    decode_seconds = score_seconds = 0.0
+    batches = iter(batches)
+    while True:
+        start = time.perf_counter()
+        frames = next(batches, None)
+        decode_seconds += time.perf_counter() - start
+        if frames is None:
+            break
+        start = time.perf_counter()
+        scores = score_frames(frames, previous)
+        # The batch's buffer is reused for the next one
+        previous = frames[-1].copy()
+        for column, values in zip((motion, dx, dy), scores):
+            column.append(values)
+        score_seconds += time.perf_counter() - start
+
+    def join(parts):
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.float32)
+
+    return VideoMotion(join(motion), join(dx), join(dy), fps, decode_seconds, score_seconds)
+
+
+def movements(video: VideoMotion, threshold: float, min_seconds: float) -> List[dict]:
+    """Runs of moving frames, in the shape of the analysis page's head movement events."""
+    moving = video.motion >= threshold
+    if not moving.any():
+        return []
+    # Runs of moving frames; short pauses inside a movement are bridged
+    edges = np.diff(np.concatenate(([0], moving.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    keep = np.concatenate(([True], starts[1:] - ends[:-1] > MAX_GAP_FRAMES))
+    starts = starts[keep]
+    ends = ends[np.concatenate((keep[1:], [True]))]
+
+    # A frame's motion happened since the frame before it
+    start_times = (starts - 1).clip(0) / video.fps
+    end_times = (ends - 1) / video.fps
+    long_enough = end_times - start_times >= min_seconds
+
+    # Total shift per movement, from running sums
+    running = [np.concatenate(([0.0], np.cumsum(np.abs(shift), dtype=np.float64))) for shift in (video.dx, video.dy)]
+    horizontal, vertical = (total[ends] - total[starts] for total in running)
+    peak = np.maximum.reduceat(video.motion, starts)
+    return [
+        {
+            "timestamp": round(float(start_times[i]), 2),
+            "end": round(float(end_times[i]), 2),
+            "duration": round(float(end_times[i] - start_times[i]), 2),
+            "type": "Nod" if vertical[i] > horizontal[i] else "Shake",
+            # 0.5 at the threshold, towards 1 as the movement stands out
+            "confidence": round(float(peak[i] / (peak[i] + threshold)), 3),
+        }
+        for i in np.flatnonzero(long_enough)
+    ]
+
+
+def _analyze_file(file_path: str, fps: float, target_width: int, batch_frames: int) -> Optional[VideoMotion]:
+    # Runs in a worker process; ffmpeg decodes alongside it
+    size = probe(file_path)
+    if size is None:
+        return None
+    width, height = scaled_size(*size, target_width)
+    return analyze_frames(decode_frames(file_path, fps, width, height, batch_frames), fps)
+
+
+def enabled(file_path: str) -> bool:
+    # WAV uploads have no video track
+    return settings.VIDEO_FPS > 0 and not file_path.lower().endswith(".wav")
+
+
+async def analyze(file_path: str) -> Optional[VideoMotion]:
+    """The motion of a recording's video track, or None if it has none."""
+    if not enabled(file_path):
+        return None
+    from .inference import engine
+
+    loop = asyncio.get_running_loop()
+    with metrics.stage("video"):
+        video = await loop.run_in_executor(
+            engine.pool, _analyze_file, file_path, settings.VIDEO_FPS, settings.VIDEO_WIDTH,
+            settings.VIDEO_BATCH_FRAMES,
+        )
+    if video is not None:
+        # Timed in the worker process, recorded here where /metrics reads them
+        metrics.stage_latency.observe(video.decode_seconds, "video_decode")
+        metrics.stage_latency.observe(video.score_seconds, "video_score")
+    return video
+
+
+def head_movements(video: Optional[VideoMotion]) -> List[dict]:
+    if video is None:
+        return []
+    return movements(video, settings.VIDEO_MOTION_THRESHOLD, settings.VIDEO_MIN_MOVEMENT_SECONDS)
@@ -2,31 +2,63 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 import jwt
 from jwt import PyJWTError
+from datetime import datetime, timezone
 from .config import settings
 from .db import get_db
+from .cache import LRUCache
 from bson import ObjectId
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/login")
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
+# Verified users by subject. The token itself is still decoded (signature
+# and exp) on every request; an entry never outlives the token that loaded it.
+# Users are never changed or deleted through the API, and only their id is
+# read from an entry, so entries are not invalidated before they expire
+principal_cache = LRUCache(max_entries=settings.AUTH_CACHE_MAX_ENTRIES)
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
     except PyJWTError:
-        raise credentials_exception
-        
+        raise _credentials_exception()
+    if payload.get("sub") is None or not ObjectId.is_valid(payload["sub"]):
+        raise _credentials_exception()
+    return payload
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    payload = decode_token(token)
+    user_id: str = payload["sub"]
+
+    user = principal_cache.get(user_id)
+    if user is not None:
+        return user
+
     db = get_db()
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, {"hashed_password": 0})
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+
+    ttl = settings.AUTH_CACHE_TTL_SECONDS
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - datetime.now(timezone.utc).timestamp())
+    if ttl > 0:
+        principal_cache.set(user_id, user, ttl)
     return user
 
 async def get_current_user_id(user: dict = Depends(get_current_user)):
     return str(user["_id"])
+
+async def get_read_user_id(token: str = Depends(oauth2_scheme)):
+    # For read-only routes. With AUTH_TRUST_TOKEN_CLAIMS the signed claims
+    # are trusted as is, so a deleted user keeps read access until the
+    # token expires
+    if settings.AUTH_TRUST_TOKEN_CLAIMS:
+        return decode_token(token)["sub"]
+    return await get_current_user_id(await get_current_user(token))
@@ -0,0 +1,172 @@
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .config import settings
+
+
+class LRUCache:
+    """
+    In-process LRU with a per-entry expiry and two bounds: the number of
+    entries and the approximate size of the cached values. Not shared
+    between worker processes.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int = 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value, size = entry
+        if expires_at <= time.monotonic():
+            self._drop(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: float, size: int = 0):
+        if self.max_bytes and size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic() + ttl, value, size)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or (self.max_bytes and self.bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def delete(self, key) -> bool:
+        if key in self._entries:
+            self._drop(key)
+            self.invalidations += 1
+            return True
+        return False
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def _drop(self, key):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+class CacheBackend:
+    """
+    Storage for cached responses. The in-process backend below is the
+    default; a shared store (Redis, memcached) implements the same four
+    coroutines so every API process sees the same entries and evictions.
+    """
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: float):
+        raise NotImplementedError
+
+    async def delete(self, *keys: str):
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+class MemoryBackend(CacheBackend):
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.lru = LRUCache(max_entries, max_bytes)
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self.lru.get(key)
+
+    async def set(self, key: str, value: Any, ttl: float):
+        # Approximate footprint: the size of the JSON the client receives
+        size = len(json.dumps(value, default=str))
+        self.lru.set(key, value, ttl, size)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self.lru.delete(key)
+
+    def stats(self) -> Dict[str, int]:
+        return self.lru.stats()
+
+
+class NullBackend(CacheBackend):
+    async def get(self, key: str) -> Optional[Any]:
+        return None
+
+    async def set(self, key: str, value: Any, ttl: float):
+        pass
+
+    async def delete(self, *keys: str):
+        pass
+
+
+class ResponseCache:
+    """
+    Per-user cache for dashboard responses. Entries are keyed by user,
+    the user's data version and endpoint, so a write that bumps the version
+    (see services/data_version.py) makes every older entry unreachable.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(user_id: str, version: int, endpoint: str) -> str:
+        # /stats depends on the current day (trend, streak), so its entries
+        # are dated and simply stop being used at midnight
+        if endpoint == "stats":
+            endpoint = f"stats:{datetime.utcnow():%Y-%m-%d}"
+        return f"{user_id}:{version}:{endpoint}"
+
+    async def get_or_compute(self, user_id: str, version: int, endpoint: str, compute: Callable[[], Awaitable[Any]]):
+        key = self._key(user_id, version, endpoint)
+        value = await self.backend.get(key)
+        if value is None:
+            value = await compute()
+            await self.backend.set(key, value, self.ttl)
+        return value
+
+    async def invalidate(self, user_id: str, version: int, *endpoints: str):
+        await self.backend.delete(*(self._key(user_id, version, endpoint) for endpoint in endpoints))
+
+    def stats(self) -> Dict[str, int]:
+        return self.backend.stats()
+
+
+def _make_backend() -> CacheBackend:
+    if settings.RESPONSE_CACHE_BACKEND == "memory":
+        return MemoryBackend(settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_MAX_BYTES)
+    return NullBackend()
+
+
+response_cache = ResponseCache(_make_backend(), ttl=settings.RESPONSE_CACHE_TTL_SECONDS)
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
+from typing import Dict, List, Literal
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "VocaCare"
@@ -16,6 +17,125 @@ class Settings(BaseSettings):
     )
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Verified principals are cached for this long (0 disables the cache)
+    AUTH_CACHE_TTL_SECONDS: float = 60.0
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+    # Read-only routes trust the signed token claims without a user lookup
+    AUTH_TRUST_TOKEN_CLAIMS: bool = False
+    # bcrypt cost factor and the thread pool password hashing runs on
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32
+    # Disable for a local, non-TLS MongoDB (benchmarks, development)
+    MONGODB_TLS: bool = True
+    # Connection pool per server; 0 idle time / wait timeout = no limit
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 0
+    MONGODB_MAX_IDLE_TIME_MS: int = 0
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = 0
+    # Wire compression in order of preference, e.g. "zstd,snappy,zlib"; zstd
+    # needs the zstandard package and snappy python-snappy
+    MONGODB_COMPRESSORS: str = Field(default="", pattern=r"^((zstd|snappy|zlib)(,(zstd|snappy|zlib))*)?$")
+    # Where dashboard reads go ("primary", "primaryPreferred", "secondary",
+    # "secondaryPreferred" or "nearest"); writes always go to the primary.
+    # -1 = no staleness bound for secondaries, otherwise at least 90
+    MONGODB_DASHBOARD_READ_PREFERENCE: Literal[
+        "primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest"
+    ] = "primary"
+    MONGODB_READ_MAX_STALENESS_SECONDS: int = -1
+
+    # Uploaded recordings are streamed into this spool directory
+    UPLOAD_DIR: str = "uploads"
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    MAX_UPLOAD_BYTES: int = 512 * 1024 * 1024
+    UPLOAD_DIR_QUOTA_BYTES: int = 4 * 1024 * 1024 * 1024
+
+    # Stutter classifier: "numpy" is a deterministic stand-in, "torch" loads ML_MODEL_PATH
+    ML_BACKEND: Literal["numpy", "torch"] = "numpy"
+    ML_MODEL_PATH: str = ""
+    ML_WORKERS: int = 0  # 0 = one inference process per CPU core
+    ML_BATCH_SIZE: int = 32
+    ML_SAMPLE_RATE: int = 16000
+    ML_WINDOW_SECONDS: float = 3.0
+    ML_HOP_SECONDS: float = 1.5
+
+    # Head movements from the video track of uploads (see services/video.py):
+    # frames decoded per second (0 = no video analysis), their width in
+    # grayscale pixels, frames scored per batch, the share of changed
+    # pixels that makes a frame moving and the shortest movement reported
+    VIDEO_FPS: float = 10.0
+    VIDEO_WIDTH: int = 160
+    VIDEO_BATCH_FRAMES: int = 64
+    VIDEO_MOTION_THRESHOLD: float = 0.02
+    VIDEO_MIN_MOVEMENT_SECONDS: float = 0.3
+
+    # Live analysis over /dashboard/analyze/stream (see services/streaming.py):
+    # how far the labels may fall behind the audio before the stream stops
+    # being read, the longest stream, concurrent streams per process and
+    # label updates held for a slow client
+    STREAM_LATENCY_BUDGET_SECONDS: float = 2.0
+    STREAM_MAX_SECONDS: int = 900
+    STREAM_MAX_SESSIONS: int = 20
+    STREAM_MAX_PENDING_MESSAGES: int = 32
+
+    # Stutter intensity: weight per stutter type, and the intensities at which
+    # Mild, Moderate and Severe start (see services/severity.py)
+    SEVERITY_WEIGHTS: Dict[str, float] = {
+        "WordRep": 0.6, "SoundRep": 0.7, "Prolongation": 0.8, "Interjection": 0.3, "Block": 1.0,
+    }
+    SEVERITY_THRESHOLDS: List[float] = [0.05, 0.15, 0.3]
+
+    # Who scores saved training attempts: "client" keeps the numbers the
+    # training page sends, "server" re-scores them from the texts (see
+    # services/scoring.py)
+    TRAINING_SCORING: Literal["client", "server"] = "client"
+    # Attempts of one batch written at once, so that a batch never takes
+    # more than this many of the MongoDB pool's connections
+    TRAINING_WRITE_CONCURRENCY: int = 16
+
+    # Exercise catalog behind /dashboard/recommendations ("" = the bundled
+    # app/data/exercises.json), checked for changes this often (0 = never)
+    EXERCISE_CATALOG_PATH: str = ""
+    EXERCISE_CATALOG_REFRESH_SECONDS: float = 30.0
+
+    # How new analyses store their event timelines: "documents" or "columnar"
+    # (packed typed arrays, see services/timeline.py)
+    TIMELINE_ENCODING: Literal["documents", "columnar"] = "documents"
+
+    # Results of identical recordings are reused (see services/result_cache.py)
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_TTL_SECONDS: int = 30 * 24 * 3600
+    RESULT_CACHE_MAX_ENTRIES: int = 50000
+
+    # Startup runs in the background and retries until MongoDB is reachable;
+    # /health/ready pings MongoDB with this timeout
+    STARTUP_RETRY_SECONDS: float = 1.0
+    HEALTH_CHECK_TIMEOUT_SECONDS: float = 2.0
+
+    # History export: documents per MongoDB round-trip and bytes per
+    # response chunk (see services/export.py)
+    EXPORT_BATCH_SIZE: int = 1000
+    EXPORT_CHUNK_BYTES: int = 64 * 1024
+
+    # Analysis job queue
+    ANALYSIS_WORKERS: int = 2
+    ANALYSIS_QUEUE_MAX: int = 50
+    ANALYSIS_RETRY_AFTER_SECONDS: int = 30
+    ANALYSIS_JOB_LEASE_SECONDS: int = 60
+    ANALYSIS_MAX_ATTEMPTS: int = 3
+    ANALYSIS_POLL_SECONDS: float = 2.0
+    # Jobs run where their upload was spooled; this names the host (and its
+    # UPLOAD_DIR) across restarts. Empty: the machine's hostname
+    ANALYSIS_HOST: str = ""
+
+    # Request, MongoDB command and analysis stage metrics at /metrics
+    METRICS_ENABLED: bool = True
+
+    # Per-user dashboard response cache: "memory" (per process) or "none"
+    RESPONSE_CACHE_BACKEND: Literal["memory", "none"] = "memory"
+    RESPONSE_CACHE_TTL_SECONDS: float = 60.0
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
 
     class Config:
         env_file = ".env"
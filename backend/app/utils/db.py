@@ -1,33 +1,83 @@
+import asyncio
+from contextlib import asynccontextmanager
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
 from .config import settings
+from . import metrics
 import certifi
 import logging
 
 logger = logging.getLogger(__name__)
 
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
 class Database:
     client: AsyncIOMotorClient | None = None
     db: AsyncIOMotorDatabase | None = None
+    # The same database with the dashboard read preference
+    read_db: AsyncIOMotorDatabase | None = None
 
 db = Database()
 
+def read_preference(name: str, max_staleness: int = -1):
+    if name not in READ_PREFERENCES:
+        raise ValueError(f"Unknown read preference: {name}")
+    if name == "primary":
+        return Primary()
+    return READ_PREFERENCES[name](max_staleness=max_staleness)
+
+def client_options() -> dict:
+    options = {
+        "maxPoolSize": settings.MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGODB_MIN_POOL_SIZE,
+    }
+    if settings.MONGODB_MAX_IDLE_TIME_MS:
+        options["maxIdleTimeMS"] = settings.MONGODB_MAX_IDLE_TIME_MS
+    if settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS
+    if settings.MONGODB_COMPRESSORS:
+        # The driver skips compressors whose library is missing, with a warning
+        options["compressors"] = settings.MONGODB_COMPRESSORS
+    if settings.MONGODB_TLS:
+        options.update(tls=True, tlsCAFile=certifi.where())
+    if settings.METRICS_ENABLED:
+        options["event_listeners"] = [metrics.command_listener, metrics.pool_listener]
+    return options
+
 async def connect_to_mongo():
+    # The client connects lazily, in the background: nothing here waits on
+    # the server (see ping)
     try:
         db.client = AsyncIOMotorClient(
             settings.MONGODB_URL,
-            tlsCAFile=certifi.where(),
             serverSelectionTimeoutMS=10000,
             connectTimeoutMS=10000,
-            tls=True,
             retryWrites=True,
+            **client_options(),
         )
-        await db.client.admin.command('ping')
         db.db = db.client[settings.DATABASE_NAME]
-        logger.info("Successfully connected to MongoDB")
+        db.read_db = db.client.get_database(
+            settings.DATABASE_NAME,
+            read_preference=read_preference(
+                settings.MONGODB_DASHBOARD_READ_PREFERENCE, settings.MONGODB_READ_MAX_STALENESS_SECONDS
+            ),
+        )
     except Exception as e:
-        logger.exception("Failed to connect to MongoDB")
+        logger.exception("Failed to create the MongoDB client")
         raise
 
+async def ping():
+    # Round trip to the server; raises when it cannot be reached
+    if db.client is None:
+        raise RuntimeError("Database is not initialized. Call connect_to_mongo() first.")
+    await db.client.admin.command('ping')
+
 async def close_mongo_connection():
     if db.client:
         db.client.close()
@@ -37,3 +87,28 @@ def get_db() -> AsyncIOMotorDatabase:
     if db.db is None:
         raise RuntimeError("Database is not initialized. Call connect_to_mongo() first.")
     return db.db
+
+def get_read_db() -> AsyncIOMotorDatabase:
+    # For dashboard reads that tolerate replication lag
+    return db.read_db if db.read_db is not None else get_db()
+
+@asynccontextmanager
+async def read_session():
+    """
+    Reads from secondaries made inside one causally consistent session see
+    at least the data the first of them saw, whichever member serves them.
+    On the primary no session is needed and None is yielded. A session runs
+    one operation at a time.
+    """
+    if settings.MONGODB_DASHBOARD_READ_PREFERENCE == "primary":
+        yield None
+        return
+    async with await db.client.start_session(causal_consistency=True) as session:
+        yield session
+
+async def read_all(session, *reads) -> list:
+    # Runs the reads (coroutine factories) concurrently, or one after
+    # another inside a session
+    if session is None:
+        return await asyncio.gather(*(read() for read in reads))
+    return [await read() for read in reads]
@@ -0,0 +1,340 @@
+"""
+Process-local metrics in the Prometheus text format, served at /metrics.
+
+- MetricsMiddleware times every request by route template.
+- MongoCommandListener (registered on the client in connect_to_mongo)
+  counts and times commands per collection, tagged with the route or
+  background job they were issued from.
+- stage() times steps of the analysis pipeline.
+- PoolListener tracks each server's connection pool: connections open and
+  checked out, checkout wait times and failed checkouts.
+
+Each API process keeps its own numbers; Prometheus sums them per instance.
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 12, 20, 50)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            cumulative += values[len(self.buckets)]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {values[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+def gauge(name: str, help: str, label_name: str, values: Dict[str, float]) -> List[str]:
+    # Gauges are read when scraped, so they are rendered directly
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    for label, value in sorted(values.items()):
+        lines.append(f"{name}{_labels((label_name,), (label,))} {value}")
+    return lines
+
+
+http_latency = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route", "status"),
+)
+mongo_latency = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency by collection and originating route",
+    ("route", "collection", "command"),
+)
+mongo_failures = Counter(
+    "mongodb_command_failures_total", "Failed MongoDB commands", ("route", "collection", "command"),
+)
+mongo_per_request = Histogram(
+    "http_request_mongodb_commands", "MongoDB commands issued per request", ("route",), COUNT_BUCKETS,
+)
+stage_latency = Histogram(
+    "analysis_stage_duration_seconds", "Analysis pipeline stage duration", ("stage",), STAGE_BUCKETS,
+)
+pool_wait = Histogram(
+    "mongodb_pool_checkout_wait_seconds", "Time to check a connection out of the pool", ("address",),
+)
+pool_failures = Counter(
+    "mongodb_pool_checkout_failures_total", "Failed connection checkouts", ("address", "reason"),
+)
+
+
+class _Origin:
+    # What a MongoDB command is attributed to: a request (its route is
+    # resolved lazily, routing happens after the middleware) or a job
+    __slots__ = ("scope", "name", "commands")
+
+    def __init__(self, scope: Optional[dict] = None, name: str = ""):
+        self.scope = scope
+        self.name = name
+        self.commands = 0
+
+    @property
+    def route(self) -> str:
+        if self.scope is None:
+            return self.name
+        # Newer FastAPI versions keep included routers nested and record the
+        # full path template of the matched route separately
+        context = self.scope.get("fastapi", {}).get("effective_route_context")
+        path = getattr(context, "path", None) or getattr(self.scope.get("route"), "path", None)
+        return path or "unmatched"
+
+
+_origin: contextvars.ContextVar[Optional[_Origin]] = contextvars.ContextVar("metrics_origin", default=None)
+
+
+@contextmanager
+def background(name: str):
+    """Attributes the MongoDB commands issued inside to a background task."""
+    token = _origin.set(_Origin(name=name))
+    try:
+        yield
+    finally:
+        _origin.reset(token)
+
+
+def stage(name: str):
+    return stage_latency.time(name)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = _Origin(scope)
+        token = _origin.set(origin)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _origin.reset(token)
+            route = origin.route
+            http_latency.observe(time.perf_counter() - start, scope["method"], route, str(status))
+            mongo_per_request.observe(origin.commands, route)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Runs in the driver's threads; Motor copies the calling task's context
+    into them, so the originating request is still known here.
+    """
+
+    def __init__(self):
+        self._pending: Dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        origin = _origin.get()
+        command = event.command_name
+        collection = event.command.get(command)
+        if command == "getMore":
+            collection = event.command.get("collection")
+        if not isinstance(collection, str):
+            collection = ""
+        route = origin.route if origin is not None else "other"
+        with self._lock:
+            if origin is not None:
+                origin.commands += 1
+            self._pending[(event.connection_id, event.request_id)] = (route, collection, command)
+
+    def _finish(self, event, failed: bool):
+        with self._lock:
+            labels = self._pending.pop((event.connection_id, event.request_id), None)
+        if labels is None:
+            return
+        mongo_latency.observe(event.duration_micros / 1e6, *labels)
+        if failed:
+            mongo_failures.inc(*labels)
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+
+command_listener = MongoCommandListener()
+
+
+def _address(address) -> str:
+    host, port = address
+    return f"{host}:{port}"
+
+
+class PoolListener(monitoring.ConnectionPoolListener):
+    """Connection pool state per server, also for sizing MONGODB_MAX_POOL_SIZE."""
+
+    FIELDS = ("open", "checked_out", "checkouts", "failures", "wait_seconds", "max_wait_seconds")
+
+    def __init__(self):
+        self._pools: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, address) -> Dict[str, float]:
+        # Called with the lock held
+        return self._pools.setdefault(_address(address), dict.fromkeys(self.FIELDS, 0))
+
+    def connection_created(self, event):
+        with self._lock:
+            self._pool(event.address)["open"] += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._pool(event.address)["open"] -= 1
+
+    def connection_checked_out(self, event):
+        # Checkout events carry their duration since pymongo 4.7
+        wait = getattr(event, "duration", None) or 0.0
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["checked_out"] += 1
+            pool["checkouts"] += 1
+            pool["wait_seconds"] += wait
+            pool["max_wait_seconds"] = max(pool["max_wait_seconds"], wait)
+        pool_wait.observe(wait, _address(event.address))
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self._pool(event.address)["failures"] += 1
+        pool_failures.inc(_address(event.address), event.reason)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._pool(event.address)["checked_out"] -= 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop(_address(event.address), None)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            pools = {address: dict(pool) for address, pool in self._pools.items()}
+        for pool in pools.values():
+            pool["avg_wait_seconds"] = pool["wait_seconds"] / pool["checkouts"] if pool["checkouts"] else 0.0
+        return pools
+
+
+pool_listener = PoolListener()
+
+
+def pool_gauges() -> List[str]:
+    pools = pool_listener.stats()
+    lines = []
+    for field, help in (("open", "Open connections"), ("checked_out", "Connections checked out")):
+        lines.extend(gauge(f"mongodb_pool_{field}_connections", f"{help} per server", "address", {
+            address: pool[field] for address, pool in pools.items()
+        }))
+    return lines
+
+
+def render(extra: Iterable[str] = ()) -> str:
+    lines: List[str] = []
+    for metric in (http_latency, mongo_per_request, mongo_latency, mongo_failures, stage_latency,
+                   pool_wait, pool_failures):
+        lines.extend(metric.render())
+    lines.extend(pool_gauges())
+    lines.extend(extra)
+    return "\n".join(lines) + "\n"
@@ -3,6 +3,10 @@ from typing import Optional, List, Dict
 from datetime import datetime
 from bson import ObjectId
 
+# Longest expected or spoken text of a training attempt; scoring cost grows
+# with the product of the two word counts
+TRAINING_TEXT_MAX_LENGTH = 1000
+
 class PyObjectId(ObjectId):
     @classmethod
     def __get_validators__(cls):
@@ -51,6 +55,8 @@ class SpeechAnalysisBase(BaseModel):
     total_words: int
     stutterEvents: List[dict] = Field(default_factory=list)
     headMovements: List[dict] = Field(default_factory=list)
+    severity: Optional[str] = None  # Fluent, Mild, Moderate or Severe
+    stutter_intensity: Optional[float] = None
 
 class SpeechAnalysisInDB(SpeechAnalysisBase):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
@@ -91,3 +97,39 @@ class DashboardStatsResponse(BaseModel):
     currentStreak: int
     totalSessions: int
     fluencyTrend: List[TrendDay]
+
+class TrainingSessionData(BaseModel):
+    # Field names as sent by the training page
+    spoken_text: Optional[str] = Field(None, alias="spokenText", max_length=TRAINING_TEXT_MAX_LENGTH)
+    expected_text: Optional[str] = Field(None, alias="expectedText", max_length=TRAINING_TEXT_MAX_LENGTH)
+    fluency_score: Optional[float] = Field(None, alias="fluencyScore")
+    is_correct: Optional[bool] = Field(None, alias="isCorrect")
+    word_count: Optional[int] = Field(None, alias="wordCount")
+    error_count: Optional[int] = Field(None, alias="errorCount")
+    type: Optional[str] = None
+    difficulty: Optional[str] = None
+    level: Optional[int] = None
+
+    class Config:
+        populate_by_name = True
+
+class TrainingCompletion(TrainingSessionData):
+    exercise_id: int
+
+class TrainingBatchRequest(BaseModel):
+    completions: List[TrainingCompletion] = Field(..., min_length=1, max_length=500)
+
+class TrainingScoreItem(BaseModel):
+    expected_text: str = Field(..., alias="expectedText", max_length=TRAINING_TEXT_MAX_LENGTH)
+    spoken_text: str = Field("", alias="spokenText", max_length=TRAINING_TEXT_MAX_LENGTH)
+
+    class Config:
+        populate_by_name = True
+
+class TrainingScoreRequest(BaseModel):
+    attempts: List[TrainingScoreItem] = Field(..., min_length=1, max_length=500)
+
+class TrainingBatchItemResult(BaseModel):
+    exercise_id: int
+    status: str  # "saved", "superseded" (a later item in the batch won) or "error"
+    error: Optional[str] = None
@@ -0,0 +1,85 @@
+"""
+Authenticated request throughput with and without the principal cache
+(and with AUTH_TRUST_TOKEN_CLAIMS on read routes).
+
+Drives the app in-process at fixed concurrency against the MongoDB at
+MONGODB_URL (e.g. a local mongod with MONGODB_TLS=false). Needs the
+packages in benchmarks/requirements.txt. From backend/:
+
+    python -m benchmarks.bench_auth --requests 5000 --concurrency 32
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+import httpx
+
+from app.api.auth import create_access_token
+from app.main import app
+from app.utils import auth
+from app.utils.config import settings
+from app.utils.db import get_db
+
+from .common import API, percentile
+
+
+async def drive(client: httpx.AsyncClient, path: str, headers: dict, requests: int, concurrency: int):
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            start = time.perf_counter()
+            res = await client.get(path, headers=headers)
+            res.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - start), latencies
+
+
+async def run(args):
+    async with app.router.lifespan_context(app):
+        db = get_db()
+        name = f"bench_auth_{int(time.time())}"
+        user = await db.users.insert_one({
+            "name": name, "username": name, "email": f"{name}@example.com",
+            "hashed_password": "-", "created_at": datetime.utcnow(),
+        })
+        token = create_access_token({"sub": str(user.inserted_id), "username": name})
+        headers = {"Authorization": f"Bearer {token}"}
+        # The response itself comes from the response cache, so what is
+        # measured is mostly authentication
+        path = API + "/dashboard/training/progress"
+
+        modes = [
+            ("no principal cache", 0, False),
+            ("principal cache", 60, False),
+            ("trusted claims", 60, True),
+        ]
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                for label, ttl, trust in modes:
+                    settings.AUTH_CACHE_TTL_SECONDS = ttl
+                    settings.AUTH_TRUST_TOKEN_CLAIMS = trust
+                    auth.principal_cache.clear()
+                    await drive(client, path, headers, args.concurrency, args.concurrency)  # warm-up
+                    rps, latencies = await drive(client, path, headers, args.requests, args.concurrency)
+                    print(f"{label:<20} {rps:8.0f} req/s  p50={percentile(latencies, 50):6.2f}ms  "
+                          f"p99={percentile(latencies, 99):6.2f}ms")
+        finally:
+            await db.users.delete_one({"_id": user.inserted_id})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+API RSS while a user's whole history is exported.
+
+Seeds one user with --documents training sessions and speech analyses
+(half each) in a throwaway database, then reads GET /dashboard/export to
+the end while sampling the server's resident set. The export is streamed
+from the cursors, so RSS should stay flat however large the history is.
+
+Needs a MongoDB reachable through MONGODB_URL (e.g. a local mongod with
+MONGODB_TLS=false). Run from backend/:
+
+    python -m benchmarks.bench_export --documents 1000000 --format ndjson
+"""
+import argparse
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import requests
+from pymongo import MongoClient
+
+from app.utils.config import settings
+
+from .common import API, peak_rss_mb, rss_mb, start_server
+
+STUTTER_TYPES = ["Prolongation", "Block", "SoundRep", "WordRep", "Interjection"]
+
+
+def seed(db, user_id: str, count: int, batch: int = 10000):
+    rng = random.Random(23)
+    start = datetime(2024, 1, 1)
+    for offset in range(0, count, batch):
+        training, speech = [], []
+        for k in range(offset, min(offset + batch, count)):
+            created_at = start + timedelta(minutes=k)
+            if k % 2:
+                speech.append({
+                    "user_id": user_id, "created_at": created_at, "fluency_score": rng.uniform(40, 100),
+                    "severity": "Mild", "total_words": 40, "transcript": "the quick brown fox " * 10,
+                    "stutterEvents": [
+                        {"timestamp": t, "end": t + 0.5, "duration": 0.5, "type": rng.choice(STUTTER_TYPES),
+                         "confidence": 0.8}
+                        for t in range(rng.randint(0, 8))
+                    ],
+                })
+            else:
+                training.append({
+                    "user_id": user_id, "created_at": created_at, "exercise_id": k % 150, "type": "WordRep",
+                    "difficulty": "Easy", "level": 1, "expected_text": "the quick brown fox",
+                    "spoken_text": "the the quick brown fox", "fluency_score": 75.0, "is_correct": True,
+                    "word_count": 4, "error_count": 1,
+                })
+        db.training_sessions.insert_many(training, ordered=False)
+        db.speech_analysis.insert_many(speech, ordered=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    db_name = f"bench_export_{int(time.time())}"
+    client = MongoClient(settings.MONGODB_URL, **({"tls": True} if settings.MONGODB_TLS else {}))
+    server = start_server(args.port, {"DATABASE_NAME": db_name})
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        name = f"bench_{uuid.uuid4().hex[:10]}"
+        requests.post(base_url + API + "/auth/register", json={
+            "name": name, "username": name, "email": f"{name}@example.com", "password": "bench-password",
+        }).raise_for_status()
+        login = requests.post(base_url + API + "/auth/login", json={"username": name, "password": "bench-password"})
+        login.raise_for_status()
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        start = time.perf_counter()
+        seed(client[db_name], login.json()["user"]["id"], args.documents)
+        print(f"seeded {args.documents} documents in {time.perf_counter() - start:.0f}s")
+        idle_rss = rss_mb(server.pid)
+
+        samples = []
+        done = threading.Event()
+
+        def sample():
+            while not done.is_set():
+                samples.append(rss_mb(server.pid))
+                time.sleep(0.25)
+
+        sampler = threading.Thread(target=sample)
+        sampler.start()
+        received = lines = 0
+        start = time.perf_counter()
+        try:
+            with requests.get(base_url + API + "/dashboard/export", params={"format": args.format},
+                              headers=headers, stream=True) as res:
+                res.raise_for_status()
+                for chunk in res.iter_content(chunk_size=None):
+                    received += len(chunk)
+                    lines += chunk.count(b"\n")
+        finally:
+            done.set()
+            sampler.join()
+        elapsed = time.perf_counter() - start
+
+        print(f"{args.format}: {lines} lines, {received / 2**20:.0f} MB in {elapsed:.1f}s "
+              f"({args.documents / elapsed:.0f} documents/s)")
+        quarter = max(1, len(samples) // 4)
+        print(f"API RSS: idle {idle_rss:.0f} MB, first quarter max {max(samples[:quarter]):.0f} MB, "
+              f"last quarter max {max(samples[-quarter:]):.0f} MB, peak {peak_rss_mb(server.pid):.0f} MB")
+    finally:
+        server.terminate()
+        server.wait()
+        client.drop_database(db_name)
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Analysis throughput (audio-seconds per wall-second) against worker count.
+
+Runs the inference engine directly on synthetic audio, no database needed.
+From backend/:
+
+    python -m benchmarks.bench_inference --minutes 30 --workers 1 2 4 8
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from app.services.inference import InferenceEngine
+from app.utils.config import settings
+
+
+def synthetic_speech(seconds: float, sample_rate: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    n = int(seconds * sample_rate)
+    # Noise shaped by a slowly varying envelope: syllables, pauses, bursts
+    envelope = np.repeat(rng.random(int(seconds * 10) + 1) ** 2, sample_rate // 10)[:n]
+    return (rng.normal(size=n) * 0.2 * envelope).astype(np.float32)
+
+
+async def measure(audio: np.ndarray, workers: int, backend: str, repeats: int) -> float:
+    engine = InferenceEngine(
+        workers=workers,
+        backend=backend,
+        batch_size=settings.ML_BATCH_SIZE,
+        sample_rate=settings.ML_SAMPLE_RATE,
+        window_seconds=settings.ML_WINDOW_SECONDS,
+        hop_seconds=settings.ML_HOP_SECONDS,
+    )
+    try:
+        # Warm-up starts the worker processes and loads the model
+        await engine.classify(audio[:settings.ML_SAMPLE_RATE * 60])
+        start = time.perf_counter()
+        for _ in range(repeats):
+            await engine.classify(audio)
+        return (time.perf_counter() - start) / repeats
+    finally:
+        engine.shutdown()
+
+
+async def run(args):
+    audio = synthetic_speech(args.minutes * 60, settings.ML_SAMPLE_RATE)
+    seconds = len(audio) / settings.ML_SAMPLE_RATE
+    print(f"{seconds:.0f}s of audio, backend={args.backend}")
+    base = None
+    for workers in args.workers:
+        elapsed = await measure(audio, workers, args.backend, args.repeats)
+        rate = seconds / elapsed
+        base = base or rate
+        print(f"workers={workers:<3} {elapsed:7.2f}s  {rate:9.0f} audio-s/s  x{rate / base:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--minutes", type=float, default=30)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--backend", default=settings.ML_BACKEND)
+    parser.add_argument("--repeats", type=int, default=3)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Login storm: login throughput, overload rejections and the latency of an
+unrelated endpoint while the logins run.
+
+Drives the app in-process against the MongoDB at MONGODB_URL (e.g. a local
+mongod with MONGODB_TLS=false). Needs the packages in
+benchmarks/requirements.txt. From backend/:
+
+    python -m benchmarks.bench_login --logins 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app.main import app
+from app.utils.db import get_db
+
+from .common import API, percentile
+
+
+async def run(args):
+    async with app.router.lifespan_context(app):
+        name = f"bench_login_{int(time.time())}"
+        password = "bench-password"
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            res = await client.post(API + "/auth/register", json={
+                "name": name, "username": name, "email": f"{name}@example.com", "password": password,
+            })
+            res.raise_for_status()
+            try:
+                storm_done = asyncio.Event()
+                probe_latencies = []
+                outcomes = {"ok": 0, "rejected": 0}
+                remaining = iter(range(args.logins))
+
+                async def probe():
+                    while not storm_done.is_set():
+                        start = time.perf_counter()
+                        (await client.get("/")).raise_for_status()
+                        probe_latencies.append((time.perf_counter() - start) * 1000)
+                        await asyncio.sleep(0.005)
+
+                async def login():
+                    for _ in remaining:
+                        res = await client.post(API + "/auth/login", json={"username": name, "password": password})
+                        outcomes["ok" if res.status_code == 200 else "rejected"] += 1
+
+                probe_task = asyncio.create_task(probe())
+                start = time.perf_counter()
+                await asyncio.gather(*(login() for _ in range(args.concurrency)))
+                elapsed = time.perf_counter() - start
+                storm_done.set()
+                await probe_task
+
+                print(f"{args.logins} logins at concurrency {args.concurrency} in {elapsed:.2f}s: "
+                      f"{outcomes['ok'] / elapsed:.1f} logins/s, {outcomes['rejected']} rejected (503)")
+                print(f"GET / during the storm: n={len(probe_latencies)} "
+                      f"p50={percentile(probe_latencies, 50):.2f}ms p99={percentile(probe_latencies, 99):.2f}ms "
+                      f"max={max(probe_latencies, default=0):.2f}ms")
+            finally:
+                await get_db().users.delete_one({"username": name})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Overhead of the /metrics instrumentation: the same cheap request through
+the app with and without MetricsMiddleware, and the cost of the MongoDB
+command listener per command (started + succeeded), with no database.
+From backend/:
+
+    python -m benchmarks.bench_metrics --requests 5000
+"""
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+
+from app.utils import metrics
+from app.utils.config import settings
+
+from .common import percentile
+
+
+async def drive(apps: dict, requests: int) -> dict:
+    # Requests alternate between the apps so drift affects both equally
+    clients = {label: httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") for label, app in apps.items()}
+    latencies = {label: [] for label in apps}
+    try:
+        for i in range(requests + 200):
+            for label, client in clients.items():
+                start = time.perf_counter()
+                await client.get("/")
+                if i >= 200:  # warm-up
+                    latencies[label].append((time.perf_counter() - start) * 1e6)
+    finally:
+        for client in clients.values():
+            await client.aclose()
+    return latencies
+
+
+def listener_cost(commands: int) -> float:
+    listener = metrics.MongoCommandListener()
+    started = [
+        SimpleNamespace(command_name="find", command={"find": "speech_analysis"}, connection_id=("db", 27017), request_id=i)
+        for i in range(commands)
+    ]
+    finished = [SimpleNamespace(connection_id=("db", 27017), request_id=i, duration_micros=800) for i in range(commands)]
+    token = metrics._origin.set(metrics._Origin(name="bench"))
+    try:
+        start = time.perf_counter()
+        for s, f in zip(started, finished):
+            listener.started(s)
+            listener.succeeded(f)
+        return (time.perf_counter() - start) / commands * 1e6
+    finally:
+        metrics._origin.reset(token)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--commands", type=int, default=100000)
+    args = parser.parse_args()
+
+    # The app is built without instrumentation and wrapped for the comparison
+    settings.METRICS_ENABLED = False
+    from app.main import app
+
+    results = asyncio.run(drive({"plain": app, "instrumented": metrics.MetricsMiddleware(app)}, args.requests))
+    plain, instrumented = results["plain"], results["instrumented"]
+
+    print(f"{'GET /':<14} {'p50 us':>9} {'p99 us':>9} {'mean us':>9}")
+    for label, latencies in results.items():
+        mean = sum(latencies) / len(latencies)
+        print(f"{label:<14} {percentile(latencies, 50):>9.1f} {percentile(latencies, 99):>9.1f} {mean:>9.1f}")
+    overhead = sum(instrumented) / len(instrumented) - sum(plain) / len(plain)
+    print(f"middleware overhead: {overhead:+.1f} us per request")
+    print(f"command listener: {listener_cost(args.commands):.2f} us per command")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Dashboard read throughput by connection pool size and read preference,
+with the response cache off so every request reaches the database.
+
+Against a local replica set:
+
+    MONGODB_TLS=false python -m benchmarks.bench_pool \\
+        --mongo-url "mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0"
+
+or against the replica set stand-in (see standin.py: one primary and
+--secondaries members, each with its own pool and a fixed round-trip):
+
+    python -m benchmarks.bench_pool --standin --secondaries 2 --latency-ms 10
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+import httpx
+from pymongo import monitoring
+
+from app.utils.config import settings
+
+from .suite import CommandCounter, drive, request_factory, seed, time_to_ready
+
+
+def pool_totals(stats: dict) -> tuple:
+    checkouts = sum(pool["checkouts"] for pool in stats.values())
+    wait = sum(pool["wait_seconds"] for pool in stats.values())
+    longest = max((pool["max_wait_seconds"] for pool in stats.values()), default=0.0)
+    return (wait / checkouts * 1000 if checkouts else 0.0), longest * 1000
+
+
+async def run(args) -> int:
+    replica_sets = []
+    if args.standin:
+        from .standin import ReplicaSet, RoundTripCounter, install
+
+        def replica_set():
+            replica_sets.append(ReplicaSet(args.secondaries, settings.MONGODB_MAX_POOL_SIZE, args.latency_ms))
+            return replica_sets[-1]
+
+        counter = RoundTripCounter()
+        install(counter, replica_set)
+    else:
+        counter = CommandCounter()
+        monitoring.register(counter)
+        settings.MONGODB_URL = args.mongo_url
+        settings.DATABASE_NAME = f"bench_pool_{int(time.time())}"
+
+    settings.ANALYSIS_WORKERS = 0
+    from app.utils.cache import NullBackend, response_cache
+    response_cache.backend = NullBackend()
+
+    from app.api.auth import create_access_token
+    from app.main import app
+    from app.utils import metrics
+    from app.utils.db import get_db
+
+    accounts = tokens = None
+    transport = httpx.ASGITransport(app=app)
+    print(f"{'pool':>5} {'reads on':<20} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'wait avg ms':>12} {'wait max ms':>12}  calls per member")
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for pool_size, read_preference in itertools.product(args.pool_sizes, args.read_preferences):
+            settings.MONGODB_MAX_POOL_SIZE = pool_size
+            settings.MONGODB_DASHBOARD_READ_PREFERENCE = read_preference
+            start = time.perf_counter()
+            async with app.router.lifespan_context(app):
+                await time_to_ready(client, start)
+                if accounts is None:
+                    accounts = await seed(get_db(), args.users, args.sessions)
+                    tokens = [create_access_token({"sub": a["_id"], "username": a["username"]}) for a in accounts]
+
+                makers = itertools.cycle([request_factory(s, accounts, tokens) for s in args.scenarios])
+                make = lambda: next(makers)()
+                await drive(client, make, args.concurrency, args.concurrency, counter)  # warm-up
+                if replica_sets:
+                    replica_sets[-1].reset_stats()
+                result = await drive(client, make, args.requests, args.concurrency, counter)
+
+                if args.standin:
+                    members = replica_sets[-1].stats()
+                    wait_avg = sum(m["avg_wait_ms"] * m["calls"] for m in members.values()) / max(1, sum(m["calls"] for m in members.values()))
+                    wait_max = max(m["max_wait_ms"] for m in members.values())
+                    calls = " ".join(f"{name}={m['calls']}" for name, m in members.items())
+                else:
+                    wait_avg, wait_max = pool_totals(metrics.pool_listener.stats())
+                    calls = ""
+                print(f"{pool_size:>5} {read_preference:<20} {result.errors:>5} {result.rps:>8} {result.p50:>8} {result.p99:>8} "
+                      f"{wait_avg:>12.2f} {wait_max:>12.2f}  {calls}")
+
+        if not args.standin:
+            async with app.router.lifespan_context(app):
+                await get_db().client.drop_database(settings.DATABASE_NAME)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--mongo-url", help="Replica set to benchmark against (a throwaway database is used)")
+    target.add_argument("--standin", action="store_true", help="Use the in-memory replica set stand-in")
+    parser.add_argument("--secondaries", type=int, default=2, help="Stand-in secondaries")
+    parser.add_argument("--latency-ms", type=float, default=10.0, help="Stand-in round-trip per call")
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--read-preferences", nargs="+", default=["primary", "secondaryPreferred"])
+    parser.add_argument("--scenarios", nargs="+", choices=["stats", "sessions", "history"],
+                        default=["stats", "sessions", "history"])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=100, help="Activity documents per user")
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=64)
+    raise SystemExit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
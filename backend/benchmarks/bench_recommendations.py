@@ -0,0 +1,65 @@
+"""
+Exercise recommendations from memory: time to rank a user's exercises from
+the catalog index, for random stutter profiles and progress, and the cost
+of a full load and of an incremental refresh after one exercise changed.
+No database needed. From backend/:
+
+    python -m benchmarks.bench_recommendations --users 10000
+"""
+import argparse
+import copy
+import json
+import random
+import time
+
+from app.services import recommendations
+from app.services.inference import CLASS_NAMES
+
+from .common import percentile
+
+
+def random_state(index, rng: random.Random) -> tuple:
+    shares = [rng.random() ** 3 for _ in CLASS_NAMES]
+    total = sum(shares)
+    profile = {name: share / total for name, share in zip(CLASS_NAMES, shares)}
+    progress = {}
+    for name, sequence in index.sequence.items():
+        if rng.random() < 0.6:
+            done = rng.choice(sequence)
+            progress[name] = {"last_completed_difficulty": done["difficulty"], "last_completed_level": done["level"]}
+    return profile, progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(recommendations.catalog.path, encoding="utf-8") as f:
+        data = json.load(f)
+    start = time.perf_counter()
+    index = recommendations.build_index(data)
+    full = (time.perf_counter() - start) * 1e6
+
+    changed = copy.deepcopy(data)
+    changed["exercises"][0]["sentence"] += " Again."
+    start = time.perf_counter()
+    recommendations.build_index(changed, index)
+    incremental = (time.perf_counter() - start) * 1e6
+
+    rng = random.Random(22)
+    states = [random_state(index, rng) for _ in range(args.users)]
+    latencies = []
+    for profile, progress in states:
+        start = time.perf_counter()
+        recommendations.rank(index, profile, progress, args.limit)
+        latencies.append((time.perf_counter() - start) * 1e6)
+
+    print(f"catalog: {len(index.exercises)} exercises  load {full:.0f}us  refresh after one change {incremental:.0f}us")
+    print(f"rank top {args.limit} for {args.users} users: p50={percentile(latencies, 50):.1f}us "
+          f"p99={percentile(latencies, 99):.1f}us  max={max(latencies):.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Training attempt scoring throughput: batched alignment (services/scoring.py)
+at several batch sizes against scoring one attempt at a time, both checked
+against a plain Python DP with the same costs. With --rescore, also the
+offline re-scoring job over that many stored attempts on the in-memory
+MongoDB stand-in. Its updates scan the collection, so read that line for
+the round-trips per attempt rather than the time.
+
+Synthetic attempts: sentences of 4-16 words, spoken with repetitions,
+misspellings, skipped and extra words. From backend/:
+
+    python -m benchmarks.bench_scoring --attempts 5000 --batch-sizes 64 256 1024
+    python -m benchmarks.bench_scoring --attempts 5000 --rescore 20000
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from app.services import scoring
+
+WORDS = (
+    "the a ball bird big blue book boy can cat come dog down fish for fun get girl go good green "
+    "happy help here house jump like little look make me my not play please red run said see she "
+    "sun the they this to tree up want we went what with yellow you"
+).split()
+
+
+def synthetic_attempts(count: int, seed: int = 21) -> list:
+    rng = random.Random(seed)
+    attempts = []
+    for _ in range(count):
+        expected = rng.choices(WORDS, k=rng.randint(4, 16))
+        spoken = []
+        for word in expected:
+            roll = rng.random()
+            if roll < 0.08:
+                spoken += [word, word]
+            elif roll < 0.14:
+                spoken.append(f"{word[0]}-{word[0]}-{word}")
+            elif roll < 0.2:
+                spoken.append(word[:-1] or word)
+            elif roll < 0.25:
+                continue
+            elif roll < 0.3:
+                spoken += [word, rng.choice(WORDS)]
+            else:
+                spoken.append(word)
+        attempts.append((" ".join(expected), " ".join(spoken)))
+    return attempts
+
+
+def _levenshtein(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def reference_score(expected_text: str, spoken_text: str) -> tuple:
+    # Full-table DP and backtrace with the costs and tie-breaking of scoring.py
+    exp, spk = scoring.tokenize(expected_text), scoring.tokenize(spoken_text)
+    repeats = scoring.repeated(spk)
+
+    def cost(e, s):
+        if e == s:
+            return scoring.EXACT
+        return scoring.NEAR if 2 * _levenshtein(e, s) < max(len(e), len(s)) else scoring.SUBSTITUTE
+
+    def insert(j):
+        return scoring.REPEAT if repeats[j] else scoring.INSERT
+
+    table = [[0] * (len(spk) + 1) for _ in range(len(exp) + 1)]
+    for j in range(1, len(spk) + 1):
+        table[0][j] = table[0][j - 1] + insert(j - 1)
+    for i in range(1, len(exp) + 1):
+        table[i][0] = table[i - 1][0] + scoring.DELETE
+        for j in range(1, len(spk) + 1):
+            table[i][j] = min(table[i - 1][j] + scoring.DELETE, table[i][j - 1] + insert(j - 1),
+                              table[i - 1][j - 1] + cost(exp[i - 1], spk[j - 1]))
+
+    i, j, correct, near, repetitions = len(exp), len(spk), 0, 0, 0
+    while i or j:
+        if i and j and table[i][j] == table[i - 1][j - 1] + cost(exp[i - 1], spk[j - 1]):
+            step = cost(exp[i - 1], spk[j - 1])
+            correct += step == scoring.EXACT
+            near += step == scoring.NEAR
+            i, j = i - 1, j - 1
+        elif j and table[i][j] == table[i][j - 1] + insert(j - 1):
+            repetitions += repeats[j - 1]
+            j -= 1
+        else:
+            i -= 1
+    matches = correct + scoring.NEAR_CREDIT * near
+    score = min(100, max(0, int(100 * matches / len(exp) + 0.5))) if exp else 0
+    return float(score), repetitions
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+async def rescore_throughput(attempts: list, count: int):
+    from datetime import datetime
+
+    from bson import ObjectId
+
+    from app import main as app_main
+    from app.utils.db import get_db
+
+    from .standin import RoundTripCounter, install
+
+    counter = RoundTripCounter()
+    install(counter)
+    await app_main.connect_to_mongo()
+    db = get_db()
+    now = datetime.utcnow()
+    users = [str(ObjectId()) for _ in range(50)]
+    await db.training_sessions.insert_many([
+        {
+            "user_id": users[k % 50], "exercise_id": k // 50, "created_at": now,
+            "expected_text": attempts[k % len(attempts)][0], "spoken_text": attempts[k % len(attempts)][1],
+            "fluency_score": 100.0, "is_correct": True, "word_count": 0, "error_count": 0,
+        }
+        for k in range(count)
+    ])
+    calls = counter.count
+    start = time.perf_counter()
+    scored, changed = await scoring.rescore()
+    elapsed = time.perf_counter() - start
+    print(f"rescore: {scored} attempts ({changed} changed) in {elapsed:.2f}s  "
+          f"{scored / elapsed:8.0f} attempts/s  {counter.count - calls} round-trips")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--attempts", type=int, default=5000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 64, 256, 1024])
+    parser.add_argument("--check", type=int, default=1000, help="Attempts compared with the reference DP")
+    parser.add_argument("--rescore", type=int, default=0, help="Stored attempts for the re-scoring job (0 = skip)")
+    args = parser.parse_args()
+
+    attempts = synthetic_attempts(args.attempts)
+    sample = attempts[:args.check]
+    results = scoring.score_batch(sample)
+    for (expected, spoken), result in zip(sample, results):
+        assert (result.fluency_score, result.repetitions) == reference_score(expected, spoken), (expected, spoken)
+
+    reference = timed(lambda: [reference_score(e, s) for e, s in sample]) / len(sample)
+    single = timed(lambda: [scoring.score(e, s, highlights=False) for e, s in sample]) / len(sample)
+    print(f"{'python DP':>14}: {1 / reference:10.0f} attempts/s")
+    print(f"{'one at a time':>14}: {1 / single:10.0f} attempts/s")
+    for batch_size in args.batch_sizes:
+        elapsed = timed(lambda: scoring.score_batch(attempts, batch_size=batch_size))
+        rate = len(attempts) / elapsed
+        print(f"{'batch ' + str(batch_size):>14}: {rate:10.0f} attempts/s  x{rate * single:.1f} vs one at a time")
+
+    if args.rescore:
+        asyncio.run(rescore_throughput(attempts, args.rescore))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Segment merging and severity scoring on hour-long recordings: the batched
+run-length encoding against a per-window Python loop.
+
+Synthetic predictions, no model or database needed. From backend/:
+
+    python -m benchmarks.bench_severity --hours 1 --recordings 1 16 64
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.inference import WindowPredictions
+from app.services.severity import LEVELS, SeverityConfig, score_batch
+from app.utils.config import settings
+
+
+def synthetic_predictions(hours: float, seed: int) -> WindowPredictions:
+    rng = np.random.default_rng(seed)
+    hop, window = settings.ML_HOP_SECONDS, settings.ML_WINDOW_SECONDS
+    n = int(hours * 3600 / hop)
+    # Mostly fluent speech with stutter runs of a few windows
+    run_labels = np.where(rng.random(n) < 0.7, 0, rng.integers(1, 6, n)).astype(np.uint8)
+    labels = np.repeat(run_labels, rng.integers(1, 6, n))[:n]
+    confidence = rng.uniform(0.4, 1.0, n).astype(np.float32)
+    return WindowPredictions(labels, confidence, window, hop, n * hop)
+
+
+def loop_score(predictions: WindowPredictions, config: SeverityConfig):
+    # Straightforward per-window reference
+    segments, weighted = [], 0.0
+    run_start = 0
+    labels = predictions.labels.tolist()
+    confidence = predictions.confidence.tolist()
+    for i, label in enumerate(labels):
+        weighted += config.weights[label]
+        if i + 1 == len(labels) or labels[i + 1] != label:
+            segments.append((
+                label,
+                run_start * predictions.hop_seconds,
+                min(i * predictions.hop_seconds + predictions.window_seconds, predictions.duration),
+                sum(confidence[run_start:i + 1]) / (i + 1 - run_start),
+            ))
+            run_start = i + 1
+    intensity = weighted / len(labels) if labels else 0.0
+    return segments, LEVELS[int(np.searchsorted(config.thresholds, intensity, side="right"))]
+
+
+def timed(fn, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--recordings", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    config = SeverityConfig.from_settings()
+    for count in args.recordings:
+        batch = [synthetic_predictions(args.hours, seed) for seed in range(count)]
+        windows = sum(len(p.labels) for p in batch)
+
+        reports = score_batch(batch, config)
+        for predictions, report in zip(batch, reports):
+            segments, level = loop_score(predictions, config)
+            assert len(segments) == len(report.labels) and level == report.level
+
+        batched = timed(lambda: score_batch(batch, config), args.repeats)
+        looped = timed(lambda: [loop_score(p, config) for p in batch], args.repeats)
+        print(f"{count:3d} x {args.hours:g}h ({windows} windows)  "
+              f"batched={batched:8.2f}ms  loop={looped:8.2f}ms  x{looped / batched:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+/stats engine: round-trips and latency, previous implementation vs. the
+single $unionWith + $facet aggregation, on a seeded database.
+
+Needs MongoDB 4.4+ at MONGODB_URL (e.g. a local mongod with MONGODB_TLS=false);
+the data goes to a throwaway database. From backend/:
+
+    python -m benchmarks.bench_stats --speech 2000 --training 15 --repeats 50
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, time as dt_time
+from typing import Any, Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from app.services.stats_service import DATE_FORMAT, TREND_DAYS, average_of
+from app.utils import db as db_module
+from app.utils.config import settings
+
+from .common import percentile
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name in ("aggregate", "find", "getMore"):
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# The /stats implementation before the single-pipeline rewrite, kept as the
+# reference for both output and cost
+async def legacy_stats(user_id: str):
+    db = db_module.get_db()
+    unique_levels = await db["training_sessions"].aggregate([
+        {"$match": {"user_id": user_id, "is_correct": True}},
+        {"$group": {"_id": "$exercise_id"}}
+    ]).to_list(None)
+    pipeline_score = [
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": None, "avg_score": {"$avg": "$fluency_score"}}}
+    ]
+    score_data = await db["training_sessions"].aggregate(pipeline_score).to_list(None)
+    speech_score_data = await db["speech_analysis"].aggregate(pipeline_score).to_list(None)
+    scores = []
+    if score_data: scores.append(score_data[0]["avg_score"])
+    if speech_score_data: scores.append(speech_score_data[0]["avg_score"])
+    scores = [s for s in scores if s is not None]
+
+    return {
+        "total_sessions": len(unique_levels),
+        "avg_score": round(sum(scores) / len(scores)) if scores else 0,
+        "streak": await legacy_streak(user_id),
+        "fluency_trend": await legacy_trend(user_id)
+    }
+
+
+async def legacy_trend(user_id: str):
+    db = db_module.get_db()
+    trend = []
+    today = datetime.utcnow().date()
+    for i in range(6, -1, -1):
+        target_date = today - timedelta(days=i)
+        pipeline = [
+            {"$match": {
+                "user_id": user_id,
+                "created_at": {
+                    "$gte": datetime.combine(target_date, dt_time.min),
+                    "$lte": datetime.combine(target_date, dt_time.max),
+                }
+            }},
+            {"$group": {"_id": None, "avg": {"$avg": "$fluency_score"}}}
+        ]
+        training_res = await db["training_sessions"].aggregate(pipeline).to_list(None)
+        speech_res = await db["speech_analysis"].aggregate(pipeline).to_list(None)
+        scores = []
+        if training_res: scores.append(training_res[0]["avg"])
+        if speech_res: scores.append(speech_res[0]["avg"])
+        scores = [s for s in scores if s is not None]
+        trend.append({"day": target_date.strftime("%a"), "score": round(sum(scores) / len(scores)) if scores else 0})
+    return trend
+
+
+async def legacy_streak(user_id: str):
+    db = db_module.get_db()
+    pipeline = [
+        {"$match": {"user_id": user_id}},
+        {"$project": {"date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}}},
+        {"$group": {"_id": "$date"}},
+        {"$sort": {"_id": -1}}
+    ]
+    training_dates = await db["training_sessions"].aggregate(pipeline).to_list(None)
+    speech_dates = await db["speech_analysis"].aggregate(pipeline).to_list(None)
+    all_dates = sorted(set([d["_id"] for d in training_dates] + [d["_id"] for d in speech_dates]), reverse=True)
+    if not all_dates:
+        return 0
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    yesterday = (datetime.utcnow() - timedelta(days=1)).strftime("%Y-%m-%d")
+    if all_dates[0] not in [today, yesterday]:
+        return 0
+    streak = 0
+    current_date = datetime.strptime(all_dates[0], "%Y-%m-%d")
+    for date_str in all_dates:
+        if datetime.strptime(date_str, "%Y-%m-%d").date() == (current_date - timedelta(days=streak)).date():
+            streak += 1
+        else:
+            break
+    return streak
+
+
+# The single-aggregation /stats that preceded the rollups (see
+# services/rollups.py). The rollup tests check the dashboard figures against it
+def streak_from_dates(dates: List[str], today: datetime) -> int:
+    # `dates` are distinct "%Y-%m-%d" activity days, most recent first
+    if not dates:
+        return 0
+
+    # If the latest activity is not today or yesterday, streak is broken
+    yesterday = today - timedelta(days=1)
+    if dates[0] not in [today.strftime(DATE_FORMAT), yesterday.strftime(DATE_FORMAT)]:
+        return 0
+
+    streak = 0
+    current_date = datetime.strptime(dates[0], DATE_FORMAT)
+    for date_str in dates:
+        expected_date = current_date - timedelta(days=streak)
+        if datetime.strptime(date_str, DATE_FORMAT).date() == expected_date.date():
+            streak += 1
+        else:
+            break
+    return streak
+
+
+def stats_pipeline(user_id: str, trend_start: datetime) -> List[dict]:
+    """
+    Everything the dashboard shows, in one round-trip: both activity
+    collections are merged with $unionWith (each branch still matched on the
+    (user_id, created_at) index) and a $facet computes each figure.
+    """
+    day = {"$dateToString": {"format": DATE_FORMAT, "date": "$created_at"}}
+    return [
+        {"$match": {"user_id": user_id}},
+        {"$project": {
+            "_id": 0, "src": {"$literal": "training"}, "exercise_id": 1, "is_correct": 1,
+            "fluency_score": 1, "created_at": 1,
+        }},
+        {"$unionWith": {"coll": "speech_analysis", "pipeline": [
+            {"$match": {"user_id": user_id}},
+            {"$project": {"_id": 0, "src": {"$literal": "speech"}, "fluency_score": 1, "created_at": 1}},
+        ]}},
+        {"$facet": {
+            "mastered": [
+                {"$match": {"src": "training", "is_correct": True}},
+                {"$group": {"_id": "$exercise_id"}},
+                {"$count": "count"},
+            ],
+            "averages": [
+                {"$group": {"_id": "$src", "avg": {"$avg": "$fluency_score"}}},
+            ],
+            "trend": [
+                {"$match": {"created_at": {"$gte": trend_start}}},
+                {"$group": {"_id": {"src": "$src", "day": day}, "avg": {"$avg": "$fluency_score"}}},
+            ],
+            "dates": [
+                {"$match": {"created_at": {"$type": "date"}}},
+                {"$group": {"_id": day}},
+            ],
+        }},
+    ]
+
+
+async def pipeline_stats(user_id: str) -> Dict[str, Any]:
+    db = db_module.get_db()
+    now = datetime.utcnow()
+    today = now.date()
+    days = [today - timedelta(days=i) for i in range(TREND_DAYS - 1, -1, -1)]
+    trend_start = datetime.combine(days[0], dt_time.min)
+
+    # Only the training collection needs to exist for the $unionWith root
+    result = await db["training_sessions"].aggregate(stats_pipeline(user_id, trend_start)).to_list(1)
+    facets = result[0] if result else {}
+
+    mastered = facets.get("mastered") or [{"count": 0}]
+    averages = {row["_id"]: row["avg"] for row in facets.get("averages", [])}
+
+    day_scores: Dict[str, Dict[str, float]] = {}
+    for row in facets.get("trend", []):
+        day_scores.setdefault(row["_id"]["day"], {})[row["_id"]["src"]] = row["avg"]
+
+    trend = []
+    for target_date in days:
+        scores = day_scores.get(target_date.strftime(DATE_FORMAT), {})
+        trend.append({
+            "day": target_date.strftime("%a"),  # e.g. "Mon"
+            "score": average_of([scores.get("training"), scores.get("speech")])
+        })
+
+    dates = sorted((row["_id"] for row in facets.get("dates", [])), reverse=True)
+
+    return {
+        "total_sessions": mastered[0]["count"],
+        "avg_score": average_of([averages.get("training"), averages.get("speech")]),
+        "streak": streak_from_dates(dates, now),
+        "fluency_trend": trend
+    }
+
+
+async def seed(db, user_id: str, speech: int, training: int, days: int):
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    await db["speech_analysis"].insert_many([
+        {
+            "user_id": user_id,
+            "fluency_score": round(rng.uniform(40, 100), 1),
+            "created_at": now - timedelta(days=rng.randrange(days), minutes=rng.randrange(600)),
+        }
+        for _ in range(speech)
+    ])
+    await db["training_sessions"].insert_many([
+        {
+            "user_id": user_id,
+            "exercise_id": i,
+            "fluency_score": rng.randrange(30, 101),
+            "is_correct": rng.random() < 0.7,
+            "created_at": now - timedelta(days=rng.randrange(days)),
+        }
+        for i in range(training)
+    ])
+    for name in ("speech_analysis", "training_sessions"):
+        await db[name].create_index([("user_id", 1), ("created_at", -1)])
+
+
+async def measure(fn, user_id: str, counter: CommandCounter, repeats: int):
+    latencies = []
+    counter.count = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = await fn(user_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return result, latencies, counter.count / repeats
+
+
+async def run(args):
+    counter = CommandCounter()
+    tls_options = {"tls": True} if settings.MONGODB_TLS else {}
+    client = AsyncIOMotorClient(settings.MONGODB_URL, event_listeners=[counter], **tls_options)
+    db_name = f"bench_stats_{int(time.time())}"
+    db_module.db.client = client
+    db_module.db.db = client[db_name]
+    try:
+        user_id = "bench-user"
+        await seed(db_module.db.db, user_id, args.speech, args.training, args.days)
+
+        for name, fn in (("legacy", legacy_stats), ("pipeline", pipeline_stats)):
+            await fn(user_id)  # warm-up
+        legacy, legacy_ms, legacy_rt = await measure(legacy_stats, user_id, counter, args.repeats)
+        new, new_ms, new_rt = await measure(pipeline_stats, user_id, counter, args.repeats)
+
+        print(f"{args.speech} speech + {args.training} training documents over {args.days} days")
+        for name, ms, rt in (("legacy", legacy_ms, legacy_rt), ("pipeline", new_ms, new_rt)):
+            print(f"{name:<9} round-trips={rt:4.1f}  p50={percentile(ms, 50):6.1f}ms  p99={percentile(ms, 99):6.1f}ms")
+        print("outputs identical:", legacy == new)
+        if legacy != new:
+            print("legacy:  ", legacy)
+            print("pipeline:", new)
+    finally:
+        await client.drop_database(db_name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--speech", type=int, default=2000)
+    parser.add_argument("--training", type=int, default=15)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--repeats", type=int, default=50)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Timeline storage: BSON size, encode and decode time of the columnar
+encoding against arrays of event documents, plus a one-minute range read.
+
+Synthetic timelines, no database needed (sizes and times are those of the
+BSON the driver sends and receives). From backend/:
+
+    python -m benchmarks.bench_timeline --events 1000 10000 100000
+"""
+import argparse
+import time
+
+import bson
+import numpy as np
+
+from app.services import timeline
+from app.services.inference import CLASS_NAMES
+
+
+def synthetic_events(n: int):
+    rng = np.random.default_rng(n)
+    starts = np.round(np.cumsum(rng.uniform(0.5, 3.0, n)), 2)
+    types = rng.integers(1, len(CLASS_NAMES), n)
+    confidence = rng.uniform(0.4, 1.0, n)
+    return [
+        {
+            "timestamp": float(start),
+            "end": round(float(start) + 3.0, 2),
+            "duration": 3.0,
+            "type": CLASS_NAMES[label],
+            "confidence": round(float(c), 3),
+        }
+        for start, label, c in zip(starts, types, confidence)
+    ]
+
+
+def timed(fn, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'events':>8} {'encoding':<10} {'bson KiB':>9} {'encode ms':>10} {'decode ms':>10} {'1-min range ms':>15}")
+    for n in args.events:
+        events = synthetic_events(n)
+        middle = events[n // 2]["timestamp"]
+
+        plain = bson.encode({"stutterEvents": events})
+        columnar_doc = {"stutterEvents": timeline.encode_events(events)}
+        columnar = bson.encode(columnar_doc)
+
+        rows = {
+            "documents": (
+                len(plain),
+                timed(lambda: bson.encode({"stutterEvents": events}), args.repeats),
+                timed(lambda: bson.decode(plain)["stutterEvents"], args.repeats),
+                timed(lambda: timeline.filter_events(bson.decode(plain)["stutterEvents"], middle, middle + 60), args.repeats),
+            ),
+            "columnar": (
+                len(columnar),
+                timed(lambda: bson.encode({"stutterEvents": timeline.encode_events(events)}), args.repeats),
+                timed(lambda: timeline.decode_events(bson.decode(columnar)["stutterEvents"]), args.repeats),
+                timed(lambda: timeline.decode_events(bson.decode(columnar)["stutterEvents"], middle, middle + 60), args.repeats),
+            ),
+        }
+        for label, (size, encode_ms, decode_ms, range_ms) in rows.items():
+            print(f"{n:>8} {label:<10} {size / 1024:>9.1f} {encode_ms:>10.2f} {decode_ms:>10.2f} {range_ms:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
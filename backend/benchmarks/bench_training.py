@@ -0,0 +1,114 @@
+"""
+Saving N training attempts: N sequential POST /training/complete calls
+against one POST /training/complete/batch, with the number of MongoDB
+commands each approach sends.
+
+Drives the app in-process against the MongoDB at MONGODB_URL (e.g. a local
+mongod with MONGODB_TLS=false). Needs the packages in
+benchmarks/requirements.txt. From backend/:
+
+    python -m benchmarks.bench_training --attempts 50 --rounds 5
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+import httpx
+from pymongo import monitoring
+
+from app.api.auth import create_access_token
+from app.main import app
+from app.utils.db import get_db
+
+from .common import API, percentile
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def attempts(n: int, round_no: int):
+    return [
+        {
+            "exercise_id": i,
+            "fluencyScore": (i * 7 + round_no) % 100,
+            "isCorrect": i % 3 != 0,
+            "wordCount": 6,
+            "errorCount": i % 3,
+            "spokenText": "the quick brown fox",
+            "expectedText": "the quick brown fox",
+            "type": ["SoundRep", "WordRep", "Interjection", "Prolongation", "NoStutteredWords"][i % 5],
+            "difficulty": "Easy",
+            "level": i % 10 + 1,
+        }
+        for i in range(n)
+    ]
+
+
+async def run(args):
+    counter = CommandCounter()
+    monitoring.register(counter)
+    async with app.router.lifespan_context(app):
+        db = get_db()
+        name = f"bench_training_{int(time.time())}"
+        user = await db.users.insert_one({
+            "name": name, "username": name, "email": f"{name}@example.com",
+            "hashed_password": "-", "created_at": datetime.utcnow(),
+        })
+        user_id = str(user.inserted_id)
+        headers = {"Authorization": "Bearer " + create_access_token({"sub": user_id, "username": name})}
+        transport = httpx.ASGITransport(app=app)
+        timings = {"sequential": [], "batch": []}
+        commands = {"sequential": 0, "batch": 0}
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+                for round_no in range(args.rounds):
+                    items = attempts(args.attempts, round_no)
+
+                    before = counter.count
+                    start = time.perf_counter()
+                    for item in items:
+                        body = {key: value for key, value in item.items() if key != "exercise_id"}
+                        res = await client.post(API + f"/dashboard/training/complete?exercise_id={item['exercise_id']}", json=body)
+                        res.raise_for_status()
+                    timings["sequential"].append((time.perf_counter() - start) * 1000)
+                    commands["sequential"] += counter.count - before
+
+                    before = counter.count
+                    start = time.perf_counter()
+                    res = await client.post(API + "/dashboard/training/complete/batch", json={"completions": items})
+                    res.raise_for_status()
+                    timings["batch"].append((time.perf_counter() - start) * 1000)
+                    commands["batch"] += counter.count - before
+
+            print(f"{args.attempts} attempts, {args.rounds} rounds")
+            for label, samples in timings.items():
+                print(f"{label:<11} p50={percentile(samples, 50):8.1f}ms  p95={percentile(samples, 95):8.1f}ms  "
+                      f"commands/round={commands[label] / args.rounds:.0f}")
+        finally:
+            for collection in ("training_sessions", "user_progress", "user_daily_stats"):
+                await db[collection].delete_many({"user_id": user_id})
+            await db.user_totals.delete_one({"_id": user_id})
+            await db.users.delete_one({"_id": user.inserted_id})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--attempts", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Peak API RSS and /stats latency while several large recordings upload.
+
+Needs a MongoDB reachable through MONGODB_URL (e.g. a local mongod with
+MONGODB_TLS=false). Run from backend/:
+
+    python -m benchmarks.bench_uploads --uploads 4 --size-mb 256
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import requests
+
+from .common import API, create_user, peak_rss_mb, percentile, start_server
+
+
+class MultipartFile:
+    # File-like multipart body with a known length, so the upload is streamed
+    # from disk with a Content-Length instead of being built in memory
+    def __init__(self, path: str, boundary: str = "benchboundary"):
+        self.head = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; "
+            f"filename=\"recording.webm\"\r\nContent-Type: video/webm\r\n\r\n"
+        ).encode()
+        self.tail = f"\r\n--{boundary}--\r\n".encode()
+        self.size = os.path.getsize(path)
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self._parts = [self.head, open(path, "rb"), self.tail]
+
+    def __len__(self):
+        return len(self.head) + self.size + len(self.tail)
+
+    def read(self, n=-1):
+        while self._parts:
+            part = self._parts[0]
+            data = part.read(n) if hasattr(part, "read") else part
+            if data:
+                if not hasattr(part, "read"):
+                    self._parts.pop(0)
+                return data
+            self._parts.pop(0).close()
+        return b""
+
+
+def make_recording(size_mb: int) -> str:
+    fd, path = tempfile.mkstemp(suffix=".webm")
+    block = os.urandom(1024 * 1024)
+    with os.fdopen(fd, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--uploads", type=int, default=4)
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--stats-clients", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    recording = make_recording(args.size_mb)
+    server = start_server(args.port)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        token = create_user(base_url)
+        headers = {"Authorization": f"Bearer {token}"}
+        baseline_rss = peak_rss_mb(server.pid)
+
+        latencies = []
+        uploads_done = threading.Event()
+
+        def poll_stats():
+            session = requests.Session()
+            while not uploads_done.is_set():
+                start = time.perf_counter()
+                session.get(base_url + API + "/dashboard/stats", headers=headers).raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        def upload():
+            body = MultipartFile(recording)
+            res = requests.post(
+                base_url + API + "/dashboard/analyze",
+                data=body,
+                headers={**headers, "Content-Type": body.content_type},
+            )
+            print(f"upload -> {res.status_code}")
+
+        pollers = [threading.Thread(target=poll_stats) for _ in range(args.stats_clients)]
+        uploaders = [threading.Thread(target=upload) for _ in range(args.uploads)]
+        start = time.perf_counter()
+        for t in pollers + uploaders:
+            t.start()
+        for t in uploaders:
+            t.join()
+        elapsed = time.perf_counter() - start
+        uploads_done.set()
+        for t in pollers:
+            t.join()
+
+        print(f"{args.uploads} x {args.size_mb} MB uploads in {elapsed:.1f}s")
+        print(f"API peak RSS: {peak_rss_mb(server.pid):.0f} MB (idle {baseline_rss:.0f} MB)")
+        print(
+            f"/stats during uploads: n={len(latencies)} "
+            f"p50={percentile(latencies, 50):.1f}ms p99={percentile(latencies, 99):.1f}ms "
+            f"max={max(latencies, default=0):.1f}ms"
+        )
+    finally:
+        server.terminate()
+        server.wait()
+        os.remove(recording)
+
+
+if __name__ == "__main__":
+    main()
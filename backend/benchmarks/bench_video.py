@@ -0,0 +1,196 @@
+"""
+Head movement analysis cost on synthetic video (services/video.py).
+
+The synthetic scene is a textured background and a head that is still,
+then nods, then shakes, with a mouth that opens and closes throughout and
+some sensor noise. It is rendered directly at each resolution. No database
+is needed. The benchmark:
+- checks that exactly the nod and the shake are found;
+- compares motion scoring per frame at several resolutions, batched
+  against one frame at a time;
+- prices one minute of 1080p30 video at full rate and resolution against
+  the VIDEO_FPS / VIDEO_WIDTH settings.
+
+With --ffmpeg (ffmpeg and ffprobe on PATH), the scene is also encoded as a
+1080p30 MP4 with an audio track, then timed:
+- the worker's decode and scoring stages at the settings and at full rate;
+- the whole analysis with and without video, to show how much of the
+  video stage overlaps the audio classifier.
+
+From backend/:
+
+    python -m benchmarks.bench_video
+    python -m benchmarks.bench_video --ffmpeg --seconds 20
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from app.services import video
+from app.utils.config import settings
+
+RESOLUTIONS = [(160, 90), (320, 180), (640, 360), (1920, 1080)]
+# (type, start, end) of the scripted movements
+SCRIPT = [("Nod", 2.0, 3.5), ("Shake", 5.0, 6.5)]
+
+
+def head_position(times: np.ndarray):
+    # Centre of the head as a share of the frame size
+    x = np.full_like(times, 0.5)
+    y = np.full_like(times, 0.45)
+    for kind, start, end in SCRIPT:
+        active = (times >= start) & (times < end)
+        swing = np.sin((times - start) * 4 * np.pi)
+        if kind == "Nod":
+            y = y + np.where(active, 0.06 * swing, 0.0)
+        else:
+            x = x + np.where(active, 0.08 * swing, 0.0)
+    return x, y
+
+
+def render(times: np.ndarray, width: int, height: int, seed: int = 24) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    background = 90 + 30 * np.sin(x / width * 17) * np.cos(y / height * 11)
+    cx, cy = head_position(np.asarray(times, dtype=np.float64))
+    dx = (x - (cx * width)[:, None, None].astype(np.float32)) / (0.12 * width)
+    dy = (y - (cy * height)[:, None, None].astype(np.float32)) / (0.3 * height)
+    frames = np.where(dx ** 2 + dy ** 2 < 1, 170 + 40 * np.sin(dx * 6) * np.cos(dy * 5), background)
+    mouth = (np.abs(dx) < 0.3) & (np.abs(dy - 0.5) < 0.08)
+    speaking = (np.sin(np.asarray(times) * 8 * np.pi) > 0)[:, None, None]
+    frames = np.where(mouth & speaking, 40, frames)
+    frames += rng.normal(0, 3, frames.shape).astype(np.float32)
+    return frames.clip(0, 255).astype(np.uint8)
+
+
+def scene(seconds: float, fps: float, width: int, height: int, batch_frames: int):
+    times = np.arange(int(seconds * fps)) / fps
+    for start in range(0, len(times), batch_frames):
+        yield render(times[start:start + batch_frames], width, height)
+
+
+def check(width: int, height: int):
+    fps = settings.VIDEO_FPS or 10.0
+    motion = video.analyze_frames(scene(8.0, fps, width, height, settings.VIDEO_BATCH_FRAMES), fps)
+    found = video.movements(motion, settings.VIDEO_MOTION_THRESHOLD, settings.VIDEO_MIN_MOVEMENT_SECONDS)
+    assert [(m["type"], m["timestamp"], m["end"]) for m in found] == SCRIPT, found
+    print(f"check: {found}")
+
+
+def scoring_rate(width: int, height: int, batch_frames: int, frames: int) -> float:
+    # Frames of the nod, so that the changed pixels are scored too
+    sample = render(SCRIPT[0][1] + np.arange(batch_frames + 1) / 30.0, width, height)
+    previous, sample = sample[0], sample[1:]
+    start = time.perf_counter()
+    done = 0
+    while done < frames:
+        video.score_frames(sample, previous)
+        done += batch_frames
+    return done / (time.perf_counter() - start)
+
+
+def ffmpeg_video(seconds: float, path: str, width: int = 1920, height: int = 1080, fps: int = 30):
+    # Gray frames on stdin, pink noise as the audio track
+    proc = subprocess.Popen(
+        [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "gray", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+            "-f", "lavfi", "-i", f"anoisesrc=d={seconds}:c=pink:a=0.2",
+            "-c:v", "mpeg4", "-q:v", "5", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest", path,
+        ],
+        stdin=subprocess.PIPE,
+    )
+    for frames in scene(seconds, fps, width, height, 30):
+        proc.stdin.write(frames.tobytes())
+    proc.stdin.close()
+    if proc.wait():
+        raise RuntimeError("ffmpeg could not encode the synthetic video")
+
+
+async def end_to_end(path: str, repeats: int):
+    from app.services import ml_service
+    from app.services.inference import engine
+
+    async def timed():
+        start = time.perf_counter()
+        for _ in range(repeats):
+            result = await ml_service.run_stutter_analysis(path)
+        return (time.perf_counter() - start) / repeats, result
+
+    fps = settings.VIDEO_FPS
+    try:
+        await ml_service.run_stutter_analysis(path)  # warm-up starts the workers
+        settings.VIDEO_FPS = 0
+        audio_only, _ = await timed()
+        settings.VIDEO_FPS = fps
+        both, result = await timed()
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        await loop.run_in_executor(engine.pool, video._analyze_file, path, fps, settings.VIDEO_WIDTH,
+                                   settings.VIDEO_BATCH_FRAMES)
+        video_only = time.perf_counter() - start
+    finally:
+        settings.VIDEO_FPS = fps
+        engine.shutdown()
+    print(f"analysis: audio only {audio_only:.2f}s, video only {video_only:.2f}s, "
+          f"both in parallel {both:.2f}s (sequential would be {audio_only + video_only:.2f}s)")
+    print(f"head movements: {result['headMovements']}")
+
+
+def run_ffmpeg(seconds: float, repeats: int):
+    fd, path = tempfile.mkstemp(suffix=".mp4")
+    os.close(fd)
+    try:
+        start = time.perf_counter()
+        ffmpeg_video(seconds, path)
+        print(f"encoded {seconds:.0f}s of 1080p30 in {time.perf_counter() - start:.1f}s")
+        for label, fps, width in (("settings", settings.VIDEO_FPS, settings.VIDEO_WIDTH), ("full", 30, 1920)):
+            start = time.perf_counter()
+            motion = video._analyze_file(path, fps, width, settings.VIDEO_BATCH_FRAMES if label == "settings" else 8)
+            elapsed = time.perf_counter() - start
+            print(f"{label:>8} ({fps:g} fps, {width} px): {elapsed:6.2f}s for {len(motion.motion)} frames  "
+                  f"decode wait {motion.decode_seconds:.2f}s  scoring {motion.score_seconds:.2f}s  "
+                  f"x{seconds / elapsed:.1f} real time")
+        asyncio.run(end_to_end(path, repeats))
+    finally:
+        os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=512, help="Frames scored per resolution")
+    parser.add_argument("--batch-frames", type=int, default=settings.VIDEO_BATCH_FRAMES)
+    parser.add_argument("--ffmpeg", action="store_true", help="Also time decoding and the whole analysis")
+    parser.add_argument("--seconds", type=float, default=20.0, help="Length of the encoded video")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    width, height = video.scaled_size(1920, 1080, settings.VIDEO_WIDTH)
+    check(width, height)
+
+    rates = {}
+    for w, h in sorted(set(RESOLUTIONS) | {(width, height)}):
+        # Full-resolution batches are kept small enough for memory
+        batch = max(1, min(args.batch_frames, 2 ** 22 // (w * h)))
+        batched = scoring_rate(w, h, batch, max(batch, args.frames * 160 * 90 // (w * h)))
+        single = scoring_rate(w, h, 1, max(1, args.frames * 160 * 90 // (w * h) // 4))
+        rates[w, h] = batched
+        print(f"{w:>5}x{h:<5} batch {batch:>3}: {batched:9.0f} frames/s  one at a time: {single:9.0f} frames/s  "
+              f"x{batched / single:.1f}")
+
+    full = 60 * 30 / rates[1920, 1080]
+    reduced = 60 * settings.VIDEO_FPS / rates[width, height]
+    print(f"scoring one minute of 1080p30: {full:.2f}s at full rate, {reduced:.3f}s at "
+          f"{settings.VIDEO_FPS:g} fps / {width}x{height}  x{full / reduced:.0f}")
+
+    if args.ffmpeg:
+        run_ffmpeg(args.seconds, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API = "/api/v1"
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def start_server(port: int, env: dict | None = None) -> subprocess.Popen:
+    # The API runs in its own process so its RSS and latency can be observed
+    # from outside, exactly as in production
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, **(env or {})},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(base_url + "/", timeout=1)
+            return proc
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("API server did not start")
+
+
+def peak_rss_mb(pid: int) -> float:
+    # Linux only: VmHWM is the process' resident set high-water mark
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def rss_mb(pid: int) -> float:
+    # Current resident set, for sampling while a request runs
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def create_user(base_url: str) -> str:
+    name = f"bench_{uuid.uuid4().hex[:10]}"
+    password = "bench-password"
+    requests.post(base_url + API + "/auth/register", json={
+        "name": name, "username": name, "email": f"{name}@example.com", "password": password,
+    }).raise_for_status()
+    res = requests.post(base_url + API + "/auth/login", json={"username": name, "password": password})
+    res.raise_for_status()
+    return res.json()["access_token"]
@@ -0,0 +1,244 @@
+"""
+In-memory MongoDB stand-in for the benchmark suite, built on
+mongomock-motor. It runs the app's queries without a server, so numbers
+taken on it compare changes to the Python side and the number of
+round-trips, not MongoDB's own query performance: use a real mongod
+(--mongo-url) for that.
+
+mongomock lacks a few features the app relies on; they are filled in here
+with straightforward (unindexed) implementations.
+
+ReplicaSet models the network side of a replica set: every call waits for
+a connection from its member's bounded pool and for a fixed round-trip
+time. All members share one in-memory database, so there is no
+replication lag to observe.
+"""
+import asyncio
+import functools
+import inspect
+import random
+import time
+
+import mongomock.aggregate as mongomock_aggregate
+import mongomock.collection as mongomock_collection
+from mongomock_motor import AsyncMongoMockClient
+
+from app import main as app_main
+from app.utils import db as db_module
+from app.utils.config import settings
+
+
+def _union_with(in_collection, database, options):
+    if isinstance(options, str):
+        options = {"coll": options}
+    docs = list(database[options["coll"]].find())
+    merged = mongomock_aggregate.process_pipeline(docs, database, options.get("pipeline", []), None)
+    return list(in_collection) + list(merged)
+
+
+def _patch_mongomock():
+    if "$unionWith" in mongomock_aggregate._PIPELINE_HANDLERS:
+        return
+    mongomock_aggregate._PIPELINE_HANDLERS["$unionWith"] = _union_with
+
+    handle_set_operator = mongomock_aggregate._Parser._handle_set_operator
+
+    def set_operator(self, operator, values):
+        if operator == "$setDifference":
+            first, second = (self.parse(value) for value in values)
+            return [item for item in first if item not in second]
+        return handle_set_operator(self, operator, values)
+
+    mongomock_aggregate._Parser._handle_set_operator = set_operator
+
+    # Bulk operations reject the `sort` option newer pymongo versions pass
+    for name in ("add_update", "add_replace"):
+        original = getattr(mongomock_collection.BulkOperationBuilder, name)
+
+        def without_sort(self, *args, _original=original, **kwargs):
+            kwargs.pop("sort", None)
+            return _original(self, *args, **kwargs)
+
+        setattr(mongomock_collection.BulkOperationBuilder, name, without_sort)
+
+
+class RoundTripCounter:
+    """Counts database calls, the stand-in's equivalent of commands sent."""
+
+    def __init__(self):
+        self.count = 0
+
+
+class Member:
+    def __init__(self, name: str, pool_size: int, latency: float):
+        self.name = name
+        self.latency = latency
+        self.pool = asyncio.Semaphore(pool_size)
+        self.in_flight = 0
+        self.calls = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def call(self, fn, *args, **kwargs):
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            async with self.pool:
+                wait = time.perf_counter() - start
+                self.calls += 1
+                self.wait_seconds += wait
+                self.max_wait_seconds = max(self.max_wait_seconds, wait)
+                await asyncio.sleep(self.latency)
+                return await fn(*args, **kwargs)
+        finally:
+            self.in_flight -= 1
+
+
+class ReplicaSet:
+    def __init__(self, secondaries: int, pool_size: int, latency_ms: float):
+        latency = latency_ms / 1000
+        self.primary = Member("primary", pool_size, latency)
+        self.secondaries = [Member(f"secondary{i + 1}", pool_size, latency) for i in range(secondaries)]
+
+    def route(self, read_preference: str):
+        # A member chooser for the given read preference
+        if read_preference in ("primary", "primaryPreferred") or not self.secondaries:
+            return lambda: self.primary
+        candidates = self.secondaries + ([self.primary] if read_preference == "nearest" else [])
+        # The less loaded of two random candidates
+        return lambda: min(random.sample(candidates, min(2, len(candidates))), key=lambda m: m.in_flight)
+
+    def reset_stats(self):
+        for member in [self.primary] + self.secondaries:
+            member.calls = 0
+            member.wait_seconds = member.max_wait_seconds = 0.0
+
+    def stats(self) -> dict:
+        return {
+            member.name: {
+                "calls": member.calls,
+                "avg_wait_ms": round(member.wait_seconds / member.calls * 1000, 2) if member.calls else 0.0,
+                "max_wait_ms": round(member.max_wait_seconds * 1000, 2),
+            }
+            for member in [self.primary] + self.secondaries
+        }
+
+
+class _Cursor:
+    # Chaining passes through; fetching goes through a member
+    def __init__(self, cursor, call):
+        self._cursor = cursor
+        self._call = call
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if name == "to_list":
+            return functools.partial(self._call, attr)
+        if callable(attr):
+            def chained(*args, **kwargs):
+                result = attr(*args, **kwargs)
+                return _Cursor(result, self._call) if result is self._cursor else result
+            return chained
+        return attr
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in await self._call(self._cursor.to_list, None):
+            yield doc
+
+    async def close(self):
+        # A coroutine in Motor
+        self._cursor.close()
+
+
+class _CountingCollection:
+    def __init__(self, collection, counter: RoundTripCounter, route=None):
+        self._collection = collection
+        self._counter = counter
+        self._route = route
+
+    async def _call(self, fn, *args, **kwargs):
+        if self._route is None:
+            return await fn(*args, **kwargs)
+        return await self._route().call(fn, *args, **kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if inspect.iscoroutinefunction(attr):
+            @functools.wraps(attr)
+            async def counted(*args, **kwargs):
+                kwargs.pop("session", None)
+                self._counter.count += 1
+                return await self._call(attr, *args, **kwargs)
+            return counted
+        if name in ("find", "aggregate"):
+            # The cursor is fetched in one batch here
+            @functools.wraps(attr)
+            def counted_cursor(*args, **kwargs):
+                kwargs.pop("session", None)
+                self._counter.count += 1
+                cursor = attr(*args, **kwargs)
+                return _Cursor(cursor, self._call) if self._route is not None else cursor
+            return counted_cursor
+        return attr
+
+
+class _CountingDatabase:
+    def __init__(self, database, counter: RoundTripCounter, route=None):
+        self._database = database
+        self._counter = counter
+        self._route = route
+
+    def __getitem__(self, name):
+        return _CountingCollection(self._database[name], self._counter, self._route)
+
+    def __getattr__(self, name):
+        attr = getattr(self._database, name)
+        if inspect.iscoroutinefunction(attr):
+            async def counted(*args, **kwargs):
+                self._counter.count += 1
+                return await attr(*args, **kwargs)
+            return counted
+        if hasattr(attr, "find_one"):
+            return _CountingCollection(attr, self._counter, self._route)
+        return attr
+
+
+class _Session:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+class _Client(AsyncMongoMockClient):
+    async def start_session(self, **kwargs):
+        # Sessions are accepted and ignored: there is no lag to be causal about
+        return _Session()
+
+
+def install(counter: RoundTripCounter, replica_set=None):
+    """
+    Makes the app's startup connect to a fresh in-memory database, the same
+    one on every start. With a replica_set factory (called on each start,
+    so it sees the current settings), calls go through its members.
+    """
+    _patch_mongomock()
+    client = _Client()
+
+    async def connect():
+        database = client[settings.DATABASE_NAME]
+        db_module.db.client = client
+        if replica_set is None:
+            db_module.db.db = db_module.db.read_db = _CountingDatabase(database, counter)
+            return
+        members = replica_set()
+        db_module.db.db = _CountingDatabase(database, counter, members.route("primary"))
+        db_module.db.read_db = _CountingDatabase(
+            database, counter, members.route(settings.MONGODB_DASHBOARD_READ_PREFERENCE)
+        )
+
+    app_main.connect_to_mongo = connect
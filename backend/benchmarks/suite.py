@@ -0,0 +1,367 @@
+"""
+Endpoint benchmark suite: seeds a database, drives the app in-process at
+fixed concurrency and reports latency percentiles, throughput and MongoDB
+round-trips per request for each scenario, optionally against a stored
+baseline. The startup scenario times importing the app in a fresh
+interpreter and how long a process takes to report ready, on an empty
+database (migrations pending) and on a migrated one.
+
+Either against a real server (a local mongod; the data goes to a throwaway
+database that is dropped afterwards):
+
+    MONGODB_TLS=false python -m benchmarks.suite --mongo-url mongodb://localhost:27017
+
+or against the in-memory stand-in (see standin.py; needs mongomock-motor):
+
+    python -m benchmarks.suite --standin --users 20 --sessions 200
+
+Save a baseline with --save-baseline FILE and compare later runs with
+--baseline FILE; the run exits with status 1 when a scenario regressed by
+more than --tolerance.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import wave
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+
+import httpx
+import numpy as np
+from pymongo import monitoring
+
+from app.utils.config import settings
+
+from .common import API, BACKEND_DIR, percentile
+
+SCENARIOS = ["startup", "stats", "sessions", "history", "login", "analyze"]
+PASSWORD = "bench-password"
+STARTUP_NOISE_MS = 5.0
+
+
+@dataclass
+class Result:
+    requests: int
+    errors: int
+    rps: float
+    p50: float
+    p95: float
+    p99: float
+    round_trips: float
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def seed(db, users: int, sessions: int) -> list:
+    """
+    `users` users with `sessions` activity documents each, half speech
+    analyses and half training attempts over the last 60 days, plus the
+    rollups and streaks derived from them.
+    """
+    from app.services import rollups, streaks
+    from app.utils.passwords import hasher
+
+    rng = random.Random(16)
+    now = datetime.utcnow()
+    hashed = await hasher.hash(PASSWORD)
+    stamp = int(time.time())
+    accounts = [
+        {
+            "name": f"bench {i}", "username": f"bench_{stamp}_{i}", "email": f"bench_{stamp}_{i}@example.com",
+            "hashed_password": hashed, "created_at": now,
+        }
+        for i in range(users)
+    ]
+    inserted = await db.users.insert_many(accounts)
+    for account, _id in zip(accounts, inserted.inserted_ids):
+        account["_id"] = str(_id)
+
+    for account in accounts:
+        user_id = account["_id"]
+        speech = [
+            {
+                "user_id": user_id,
+                "session_id": f"seed-{user_id}-{i}",
+                "transcript": "",
+                "fluency_score": round(rng.uniform(40, 100), 1),
+                "total_words": 0,
+                "stutterEvents": [
+                    {"timestamp": float(t), "end": float(t) + 3.0, "duration": 3.0, "type": "WordRep", "confidence": 0.8}
+                    for t in range(0, 60, 6)
+                ],
+                "headMovements": [],
+                "created_at": now - timedelta(days=rng.randrange(60), minutes=rng.randrange(1440)),
+            }
+            for i in range(sessions // 2)
+        ]
+        training = [
+            {
+                "user_id": user_id,
+                "exercise_id": i,
+                "completed": True,
+                "fluency_score": rng.randrange(30, 101),
+                "is_correct": rng.random() < 0.7,
+                "created_at": now - timedelta(days=rng.randrange(60), minutes=rng.randrange(1440)),
+            }
+            for i in range(sessions - sessions // 2)
+        ]
+        if speech:
+            await db.speech_analysis.insert_many(speech)
+        if training:
+            await db.training_sessions.insert_many(training)
+
+    await rollups.rebuild()
+    await streaks.migrate()
+    return accounts
+
+
+def recording(seconds: float, seed: int) -> bytes:
+    # Distinct content per request, so the result cache does not answer it
+    rng = np.random.default_rng(seed)
+    samples = (rng.normal(size=int(seconds * settings.ML_SAMPLE_RATE)) * 3000).astype("<i2")
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(settings.ML_SAMPLE_RATE)
+        w.writeframes(samples.tobytes())
+    return buf.getvalue()
+
+
+def request_factory(scenario: str, accounts: list, tokens: list):
+    rng = random.Random(scenario)
+    counter = iter(range(sys.maxsize))
+
+    def make():
+        i = rng.randrange(len(accounts))
+        headers = {"Authorization": f"Bearer {tokens[i]}"}
+        if scenario == "stats":
+            return "GET", API + "/dashboard/stats", {"headers": headers}
+        if scenario == "sessions":
+            return "GET", API + "/dashboard/sessions", {"headers": headers}
+        if scenario == "history":
+            return "GET", API + "/dashboard/sessions/history?limit=20", {"headers": headers}
+        if scenario == "login":
+            body = {"username": accounts[i]["username"], "password": PASSWORD}
+            return "POST", API + "/auth/login", {"json": body}
+        if scenario == "analyze":
+            files = {"file": ("bench.wav", recording(2.0, next(counter)))}
+            return "POST", API + "/dashboard/analyze", {"headers": headers, "files": files}
+        raise ValueError(scenario)
+
+    return make
+
+
+async def drive(client: httpx.AsyncClient, make, requests: int, concurrency: int, counter) -> Result:
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            method, url, kwargs = make()
+            start = time.perf_counter()
+            res = await client.request(method, url, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if res.status_code >= 400:
+                errors += 1
+
+    before = counter.count
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return Result(
+        requests=requests,
+        errors=errors,
+        rps=round(requests / elapsed, 1),
+        p50=round(percentile(latencies, 50), 2),
+        p95=round(percentile(latencies, 95), 2),
+        p99=round(percentile(latencies, 99), 2),
+        round_trips=round((counter.count - before) / requests, 2),
+    )
+
+
+def import_time(repeats: int = 3) -> float:
+    # In a fresh interpreter, as when a replica starts
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    env = {**os.environ, "MONGODB_URL": settings.MONGODB_URL}
+    samples = [
+        float(subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                             capture_output=True, text=True, check=True).stdout)
+        for _ in range(repeats)
+    ]
+    return round(statistics.median(samples) * 1000, 1)
+
+
+async def time_to_ready(client: httpx.AsyncClient, started: float, timeout: float = 60) -> float:
+    while time.perf_counter() - started < timeout:
+        if (await client.get("/health/ready")).status_code == 200:
+            return round((time.perf_counter() - started) * 1000, 1)
+        await asyncio.sleep(0.005)
+    raise RuntimeError("The app did not become ready")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    if "startup" in results and "startup" in baseline:
+        print(f"\n{'startup':<14} {'ms':>16}")
+        for metric, value in results["startup"].items():
+            old = baseline["startup"].get(metric)
+            if not old:
+                continue
+            print(f"{metric:<14} {value:>8} ({(value - old) / old:+.0%})")
+            # A few milliseconds either way are noise at this scale
+            if value - old > max(tolerance * old, STARTUP_NOISE_MS):
+                regressions.append(f"startup: {metric} up {(value - old) / old:+.0%}")
+
+    print(f"\n{'scenario':<10} {'p50':>16} {'p99':>16} {'req/s':>16} {'round-trips':>14}")
+    for scenario, result in results.items():
+        base = baseline.get(scenario)
+        if not base or scenario == "startup":
+            continue
+
+        def change(metric):
+            old, new = base[metric], result[metric]
+            return (new - old) / old if old else 0.0
+
+        cells = [f"{result[m]:>8} ({change(m):+.0%})" for m in ("p50", "p99", "rps")]
+        print(f"{scenario:<10} {cells[0]:>16} {cells[1]:>16} {cells[2]:>16} "
+              f"{result['round_trips']:>6} ({result['round_trips'] - base['round_trips']:+.2f})")
+        if change("p50") > tolerance or change("p99") > tolerance:
+            regressions.append(f"{scenario}: latency up (p50 {change('p50'):+.0%}, p99 {change('p99'):+.0%})")
+        if change("rps") < -tolerance:
+            regressions.append(f"{scenario}: throughput down {change('rps'):+.0%}")
+        if result["round_trips"] > base["round_trips"] + 0.01:
+            regressions.append(f"{scenario}: {result['round_trips']} round-trips per request, was {base['round_trips']}")
+    return regressions
+
+
+async def measure(args, app, client: httpx.AsyncClient, counter) -> dict:
+    from app.api.auth import create_access_token
+    from app.utils.db import get_db
+
+    results = {}
+    if "startup" in args.scenarios:
+        startup = {"import": import_time()}
+        start = time.perf_counter()
+        async with app.router.lifespan_context(app):
+            startup["lifespan"] = round((time.perf_counter() - start) * 1000, 1)
+            startup["ready_cold"] = await time_to_ready(client, start)
+
+    start = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        db = get_db()
+        try:
+            if "startup" in args.scenarios:
+                # Second start on the same database: nothing left to migrate
+                startup["ready_warm"] = await time_to_ready(client, start)
+                results["startup"] = startup
+                print(f"Startup: import {startup['import']} ms, lifespan {startup['lifespan']} ms, ready after "
+                      f"{startup['ready_cold']} ms with migrations pending, {startup['ready_warm']} ms without")
+            else:
+                await time_to_ready(client, start)
+
+            start = time.perf_counter()
+            accounts = await seed(db, args.users, args.sessions)
+            print(f"Seeded {args.users} users x {args.sessions} sessions in {time.perf_counter() - start:.1f}s "
+                  f"({'in-memory stand-in' if args.standin else 'mongod'})")
+            tokens = [create_access_token({"sub": a["_id"], "username": a["username"]}) for a in accounts]
+
+            print(f"{'scenario':<10} {'req':>6} {'err':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rt/req':>7}")
+            for scenario in args.scenarios:
+                if scenario == "startup":
+                    continue
+                make = request_factory(scenario, accounts, tokens)
+                requests = args.login_requests if scenario == "login" else args.requests
+                await drive(client, make, min(requests, args.concurrency), args.concurrency, counter)  # warm-up
+                result = await drive(client, make, requests, args.concurrency, counter)
+                results[scenario] = asdict(result)
+                print(f"{scenario:<10} {result.requests:>6} {result.errors:>5} {result.rps:>9} {result.p50:>9} "
+                      f"{result.p95:>9} {result.p99:>9} {result.round_trips:>7}")
+        finally:
+            from app.services.upload_service import spool
+            async for job in db.analysis_jobs.find({"status": {"$in": ["queued", "running"]}}, {"file_path": 1}):
+                await spool.discard(job["file_path"])
+            await db.analysis_jobs.delete_many({})
+            if not args.standin:
+                await db.client.drop_database(settings.DATABASE_NAME)
+    return results
+
+
+async def run(args) -> int:
+    if args.standin:
+        from .standin import RoundTripCounter, install
+        counter = RoundTripCounter()
+        install(counter)
+    else:
+        counter = CommandCounter()
+        monitoring.register(counter)
+        settings.MONGODB_URL = args.mongo_url
+        settings.DATABASE_NAME = f"bench_suite_{int(time.time())}"
+
+    # The queue only accepts analyses during the run; the workers stay off
+    # so inference does not compete with the measured requests
+    settings.ANALYSIS_WORKERS = 0
+    settings.ANALYSIS_QUEUE_MAX = sys.maxsize
+    if args.no_response_cache:
+        from app.utils.cache import NullBackend, response_cache
+        response_cache.backend = NullBackend()
+
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        results = await measure(args, app, client, counter)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        return 1 if regressions else 0
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--mongo-url", help="MongoDB to benchmark against (a throwaway database is used)")
+    target.add_argument("--standin", action="store_true", help="Use the in-memory stand-in")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=200, help="Activity documents per user")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=50, help="Logins (bcrypt-bound, so fewer)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--no-response-cache", action="store_true", help="Measure the uncached read paths")
+    parser.add_argument("--baseline", help="Compare against this baseline file")
+    parser.add_argument("--save-baseline", help="Write this run's results to a baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown")
+    raise SystemExit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
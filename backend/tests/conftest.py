@@ -0,0 +1,59 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+
+# Settings refuse to load without these; no test talks to a real server
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("SECRET_KEY", "test-secret-key-test-secret-key-0123")
+os.environ.setdefault("MONGODB_TLS", "false")
+
+
+def _fresh_db(monkeypatch, replica_set=None):
+    from app import main as app_main
+    from app.utils import db as db_module
+    from app.utils.config import settings
+    from benchmarks.standin import RoundTripCounter, install
+
+    monkeypatch.setattr(settings, "DATABASE_NAME", f"test_{uuid.uuid4().hex}")
+    monkeypatch.setattr(app_main, "connect_to_mongo", app_main.connect_to_mongo)
+    monkeypatch.setattr(db_module.db, "db", None)
+    monkeypatch.setattr(db_module.db, "read_db", None)
+    install(RoundTripCounter(), replica_set)
+    asyncio.run(app_main.connect_to_mongo())
+    return db_module.db.db
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """A fresh database on the in-memory MongoDB stand-in of the benchmarks."""
+    return _fresh_db(monkeypatch)
+
+
+@pytest.fixture
+def slow_db(monkeypatch):
+    """The same with a round-trip latency, so that concurrent calls interleave."""
+    from benchmarks.standin import ReplicaSet
+
+    return _fresh_db(monkeypatch, lambda: ReplicaSet(secondaries=0, pool_size=8, latency_ms=5))
+
+
+@pytest.fixture
+def api(db):
+    """Clients of the real app on that database, and bearer headers for a user."""
+    import httpx
+
+    from app.api.auth import create_access_token
+    from app.main import app
+
+    class Api:
+        @staticmethod
+        def client() -> httpx.AsyncClient:
+            return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+        @staticmethod
+        def headers(user_id: str) -> dict:
+            return {"Authorization": f"Bearer {create_access_token({'sub': user_id, 'username': 'test'})}"}
+
+    return Api
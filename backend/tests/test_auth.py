@@ -0,0 +1,44 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.utils import auth
+from app.utils.cache import LRUCache
+from app.utils.config import settings
+
+from test_rollups import new_user
+
+
+def token(user_id: str, lifetime: timedelta) -> str:
+    claims = {"sub": user_id, "username": "test", "exp": datetime.utcnow() + lifetime}
+    return jwt.encode(claims, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+def test_cached_principal_never_outlives_its_token(db, monkeypatch):
+    monkeypatch.setattr(auth, "principal_cache", LRUCache(max_entries=10))
+    monkeypatch.setattr(settings, "AUTH_CACHE_TTL_SECONDS", 60.0)
+
+    def ttl(user_id: str) -> float:
+        return auth.principal_cache._entries[user_id][0] - time.monotonic()
+
+    async def main():
+        short_lived, long_lived = await new_user(db), await new_user(db)
+        assert str((await auth.get_current_user(token(short_lived, timedelta(seconds=5))))["_id"]) == short_lived
+        assert 3 < ttl(short_lived) <= 5
+        await auth.get_current_user(token(long_lived, timedelta(hours=1)))
+        assert 58 < ttl(long_lived) <= 60
+
+        # Served from the cache while the entry lasts, from the database after
+        await db.users.delete_one({"_id": ObjectId(short_lived)})
+        await auth.get_current_user(token(short_lived, timedelta(seconds=5)))
+        auth.principal_cache.set(short_lived, {"_id": short_lived}, 0)
+        with pytest.raises(HTTPException) as rejected:
+            await auth.get_current_user(token(short_lived, timedelta(seconds=5)))
+        assert rejected.value.status_code == 401
+
+    asyncio.run(main())
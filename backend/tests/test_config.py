@@ -0,0 +1,26 @@
+import pytest
+from pydantic import ValidationError
+
+from app.utils.config import Settings
+
+
+@pytest.mark.parametrize("name, value", [
+    ("RESPONSE_CACHE_BACKEND", "redis"),
+    ("TIMELINE_ENCODING", "Columnar"),
+    ("TRAINING_SCORING", "both"),
+    ("ML_BACKEND", "onnx"),
+    ("MONGODB_DASHBOARD_READ_PREFERENCE", "secondary_preferred"),
+    ("MONGODB_COMPRESSORS", "zstd,lz4"),
+])
+def test_unknown_setting_values_are_rejected_at_startup(monkeypatch, name, value):
+    monkeypatch.setenv(name, value)
+    with pytest.raises(ValidationError) as rejected:
+        Settings()
+    assert rejected.value.errors()[0]["loc"] == (name,)
+
+
+def test_known_setting_values_load(monkeypatch):
+    monkeypatch.setenv("MONGODB_DASHBOARD_READ_PREFERENCE", "secondaryPreferred")
+    monkeypatch.setenv("MONGODB_COMPRESSORS", "zstd,snappy")
+    loaded = Settings()
+    assert (loaded.MONGODB_DASHBOARD_READ_PREFERENCE, loaded.MONGODB_COMPRESSORS) == ("secondaryPreferred", "zstd,snappy")
@@ -0,0 +1,42 @@
+import asyncio
+
+from test_rollups import new_user
+
+
+def test_unchanged_data_is_not_modified_until_a_write_bumps_the_version(db, api):
+    async def main():
+        user_id = await new_user(db)
+        headers = api.headers(user_id)
+        async with api.client() as client:
+            first = await client.get("/api/v1/dashboard/training/progress", headers=headers)
+            assert first.status_code == 200
+            etag = first.headers["etag"]
+
+            again = await client.get("/api/v1/dashboard/training/progress", headers={**headers, "If-None-Match": etag})
+            assert (again.status_code, again.content) == (304, b"")
+            assert again.headers["etag"] == etag
+
+            completed = await client.post(
+                "/api/v1/dashboard/training/complete",
+                params={"exercise_id": 3},
+                json={"fluencyScore": 80, "isCorrect": True, "type": "WordRep"},
+                headers=headers,
+            )
+            assert completed.status_code == 200
+            after = await client.get("/api/v1/dashboard/training/progress", headers={**headers, "If-None-Match": etag})
+            assert after.status_code == 200
+            assert after.headers["etag"] != etag
+            assert after.json() != first.json()
+
+    asyncio.run(main())
+
+
+def test_process_stats_need_a_signed_in_user(db, api):
+    async def main():
+        user_id = await new_user(db)
+        async with api.client() as client:
+            for path in ("/cache/stats", "/db/pool/stats"):
+                assert (await client.get(path)).status_code == 401
+                assert (await client.get(path, headers=api.headers(user_id))).status_code == 200
+
+    asyncio.run(main())
@@ -0,0 +1,26 @@
+import asyncio
+
+from app.utils.db import read_all
+
+
+def test_reads_overlap_only_outside_a_session():
+    async def main():
+        running, peak = 0, 0
+
+        def read(value):
+            async def run():
+                nonlocal running, peak
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+                return value
+            return run
+
+        assert await read_all(None, read(1), read(2), read(3)) == [1, 2, 3]
+        assert peak == 3
+        peak = 0
+        assert await read_all(object(), read(1), read(2), read(3)) == [1, 2, 3]
+        assert peak == 1
+
+    asyncio.run(main())
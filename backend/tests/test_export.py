@@ -0,0 +1,75 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.services import export, timeline
+from app.utils.config import settings
+
+from test_rollups import new_user
+
+EVENTS = [
+    {"timestamp": 0.0, "end": 3.0, "duration": 3.0, "type": "WordRep", "confidence": 0.8},
+    {"timestamp": 4.5, "end": 6.0, "duration": 1.5, "type": "Prolongation", "confidence": 0.6},
+]
+
+
+def test_export_merges_both_histories_oldest_first(db, api, monkeypatch):
+    # Several round-trips per cursor and several chunks per response
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(settings, "EXPORT_CHUNK_BYTES", 200)
+    monkeypatch.setattr(settings, "TIMELINE_ENCODING", "columnar")
+
+    async def main():
+        user_id = await new_user(db)
+        start = datetime(2026, 2, 1)
+        # Timestamps shared across both collections; the speech ids are the
+        # older ones, so ties are not settled by collection order
+        times = [start + timedelta(hours=i // 3) for i in range(12)]
+        speech = [
+            timeline.encode_document({"_id": ObjectId(), "user_id": user_id, "created_at": t, "fluency_score": 70.0,
+                                      "transcript": "x", "stutterEvents": EVENTS, "headMovements": []})
+            for t in times[1::2]
+        ]
+        training = [
+            {"_id": ObjectId(), "user_id": user_id, "created_at": t, "exercise_id": i, "type": "WordRep",
+             "fluency_score": 50.0 + i, "is_correct": i % 2 == 0, "spoken_text": 'a "quoted", two-line\nanswer'}
+            for i, t in enumerate(times[::2])
+        ]
+        await db.training_sessions.insert_many(training + [
+            {"_id": ObjectId(), "user_id": user_id, "created_at": start + timedelta(days=2)},
+            {"_id": ObjectId(), "user_id": "other", "created_at": start},
+        ])
+        await db.speech_analysis.insert_many(speech + [
+            {"_id": ObjectId(), "user_id": user_id, "created_at": start - timedelta(seconds=1)},
+        ])
+        expected = [str(doc["_id"]) for doc in sorted(training + speech, key=lambda doc: (doc["created_at"], doc["_id"]))]
+
+        params = {"from": start.isoformat(), "to": (start + timedelta(days=1)).isoformat()}
+        async with api.client() as client:
+            response = await client.get(
+                "/api/v1/dashboard/export", params={**params, "format": "csv"}, headers=api.headers(user_id)
+            )
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/csv")
+            rows = list(csv.DictReader(io.StringIO(response.text)))
+
+            ndjson = await client.get(
+                "/api/v1/dashboard/export", params={**params, "format": "ndjson"}, headers=api.headers(user_id)
+            )
+            lines = [json.loads(line) for line in ndjson.text.splitlines()]
+
+        assert [row["id"] for row in rows] == expected
+        assert [line["_id"] for line in lines] == expected
+        assert list(rows[0]) == export.CSV_COLUMNS
+        first_training = next(row for row in rows if row["session_type"] == "training")
+        assert first_training["spoken_text"] == 'a "quoted", two-line\nanswer'
+        assert (first_training["stutter_events"], first_training["is_correct"]) == ("", "True")
+        first_speech = next(row for row in rows if row["session_type"] == "speech_analysis")
+        assert (first_speech["stutter_events"], first_speech["stutter_seconds"]) == ("2", "4.5")
+        assert next(line for line in lines if line["session_type"] == "speech_analysis")["stutterEvents"] == EVENTS
+
+    asyncio.run(main())
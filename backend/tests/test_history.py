@@ -0,0 +1,39 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.services.history import InvalidCursor, fetch_history
+
+
+def test_pages_cover_tied_timestamps_without_duplicates_or_gaps(db):
+    async def main():
+        now = datetime(2026, 1, 1, 12, 0, 0)
+        # Three timestamps shared by several documents of both collections
+        times = [now - timedelta(minutes=i % 3) for i in range(17)]
+        training = [{"_id": ObjectId(), "user_id": "u", "created_at": t, "fluency_score": 50.0} for t in times[:9]]
+        speech = [{"_id": ObjectId(), "user_id": "u", "created_at": t, "fluency_score": 60.0} for t in times[9:]]
+        await db.training_sessions.insert_many(training)
+        await db.speech_analysis.insert_many(speech)
+        await db.speech_analysis.insert_one({"_id": ObjectId(), "user_id": "other", "created_at": now})
+
+        expected = [
+            str(doc["_id"])
+            for doc in sorted(training + speech, key=lambda doc: (doc["created_at"], doc["_id"]), reverse=True)
+        ]
+        seen, cursor = [], None
+        for _ in range(10):
+            page = await fetch_history("u", limit=4, cursor=cursor)
+            seen += [item["_id"] for item in page["items"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == expected
+
+    asyncio.run(main())
+
+
+def test_invalid_cursor_is_rejected(db):
+    with pytest.raises(InvalidCursor):
+        asyncio.run(fetch_history("u", limit=4, cursor="not-a-cursor"))
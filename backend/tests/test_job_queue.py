@@ -0,0 +1,252 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services import job_queue
+from app.services.upload_service import UploadSpool
+from app.utils.config import settings
+
+
+@pytest.fixture
+def upload(tmp_path, monkeypatch):
+    upload_spool = UploadSpool(str(tmp_path), chunk_size=1024, max_upload_bytes=1024, quota_bytes=4096)
+    monkeypatch.setattr(job_queue, "spool", upload_spool)
+    monkeypatch.setattr(settings, "ANALYSIS_POLL_SECONDS", 0.01)
+    path = tmp_path / "session_recording.wav"
+    path.write_bytes(b"RIFF")
+    return str(path)
+
+
+async def wait_for_status(session_id: str, status: str) -> dict:
+    for _ in range(500):
+        job = await job_queue.get_job(session_id, "user")
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {session_id} never reached {status}: {job}")
+
+
+async def wait_until_removed(path: str):
+    # The worker discards the upload right after it marks the job
+    for _ in range(500):
+        if not os.path.exists(path):
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"{path} was kept")
+
+
+def test_cancelled_job_keeps_its_upload_for_the_retry(db, upload, monkeypatch):
+    from app.api import dashboard
+
+    async def main():
+        started = asyncio.Event()
+
+        async def stuck(file_path):
+            started.set()
+            await asyncio.Event().wait()
+
+        async def finish(user_id, file_path, session_id, content_hash):
+            assert os.path.exists(file_path)
+            return "result"
+
+        pool = job_queue.JobWorkerPool()
+        await job_queue.enqueue("user", "session", upload)
+        monkeypatch.setattr(dashboard, "run_stutter_analysis", stuck)
+        pool.start(dashboard.process_and_store, 1)
+        await started.wait()
+        # Shutdown while the job runs
+        await pool.stop()
+        assert os.path.exists(upload)
+        assert (await job_queue.get_job("session", "user"))["status"] == "running"
+
+        # Its lease runs out; another start picks it up again
+        await db.analysis_jobs.update_one(
+            {"_id": "session"}, {"$set": {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)}}
+        )
+        assert await job_queue.recover_orphaned_jobs() == 1
+        pool = job_queue.JobWorkerPool()
+        pool.start(finish, 1)
+        try:
+            job = await wait_for_status("session", "done")
+            await wait_until_removed(upload)
+        finally:
+            await pool.stop()
+        assert (job["result_id"], job["attempts"]) == ("result", 2)
+
+    asyncio.run(main())
+
+
+def test_failed_job_discards_its_upload(db, upload):
+    async def main():
+        async def broken(user_id, file_path, session_id, content_hash):
+            raise ValueError("unreadable recording")
+
+        pool = job_queue.JobWorkerPool()
+        await job_queue.enqueue("user", "session", upload)
+        pool.start(broken, 1)
+        try:
+            job = await wait_for_status("session", "failed")
+            await wait_until_removed(upload)
+        finally:
+            await pool.stop()
+        assert job["error"] == "unreadable recording"
+
+    asyncio.run(main())
+
+
+def test_recovery_gives_up_on_a_job_out_of_attempts(db, upload):
+    async def main():
+        await job_queue.enqueue("user", "session", upload)
+        await db.analysis_jobs.update_one({"_id": "session"}, {"$set": {
+            "status": "running",
+            "attempts": settings.ANALYSIS_MAX_ATTEMPTS,
+            "lease_expires_at": datetime.utcnow() - timedelta(seconds=1),
+        }})
+        assert await job_queue.recover_orphaned_jobs() == 0
+        job = await job_queue.get_job("session", "user")
+        assert (job["status"], job["error"]) == ("failed", "Worker lost")
+        assert not os.path.exists(upload)
+
+    asyncio.run(main())
+
+
+def test_jobs_run_and_recover_only_on_the_host_of_their_upload(db, upload, monkeypatch):
+    async def main():
+        async def finish(user_id, file_path, session_id, content_hash):
+            return "result"
+
+        expired = datetime.utcnow() - timedelta(seconds=1)
+        monkeypatch.setattr(settings, "ANALYSIS_HOST", "other")
+        await job_queue.enqueue("user", "elsewhere", upload)
+        await job_queue.enqueue("user", "elsewhere-running", upload)
+        await db.analysis_jobs.update_one({"_id": "elsewhere-running"}, {"$set": {
+            "status": "running", "lease_expires_at": expired,
+        }})
+        monkeypatch.setattr(settings, "ANALYSIS_HOST", "here")
+        await job_queue.enqueue("user", "here", upload)
+        # Queued before hosts were recorded
+        await job_queue.enqueue("user", "legacy", upload)
+        await db.analysis_jobs.update_one({"_id": "legacy"}, {"$unset": {"host": ""}})
+
+        assert await job_queue.recover_orphaned_jobs() == 0
+        pool = job_queue.JobWorkerPool()
+        pool.start(finish, 1)
+        try:
+            await wait_for_status("here", "done")
+            await wait_for_status("legacy", "done")
+        finally:
+            await pool.stop()
+        assert (await job_queue.get_job("elsewhere", "user"))["status"] == "queued"
+        assert (await job_queue.get_job("elsewhere-running", "user"))["status"] == "running"
+
+        # The other host never came back
+        long_ago = datetime.utcnow() - job_queue.ABANDONED_AFTER - timedelta(seconds=1)
+        await db.analysis_jobs.update_many({"host": "other"}, {"$set": {
+            "updated_at": long_ago, "lease_expires_at": long_ago,
+        }})
+        await db.analysis_jobs.update_one({"_id": "elsewhere"}, {"$set": {"lease_expires_at": None}})
+        await job_queue.recover_orphaned_jobs()
+        for session_id in ("elsewhere", "elsewhere-running"):
+            job = await job_queue.get_job(session_id, "user")
+            assert (job["status"], job["error"]) == ("failed", "Worker lost")
+
+    asyncio.run(main())
+
+
+def test_worker_survives_a_failure_to_finish_a_job(db, upload, monkeypatch, tmp_path):
+    async def main():
+        async def finish(user_id, file_path, session_id, content_hash):
+            return "result"
+
+        discard = job_queue.spool.discard
+        calls = []
+
+        async def flaky_discard(path):
+            calls.append(path)
+            if len(calls) == 1:
+                raise OSError("spool unavailable")
+            await discard(path)
+
+        monkeypatch.setattr(job_queue.spool, "discard", flaky_discard)
+        second = tmp_path / "second_recording.wav"
+        second.write_bytes(b"RIFF")
+        await job_queue.enqueue("user", "a", upload)
+        await job_queue.enqueue("user", "b", str(second))
+        pool = job_queue.JobWorkerPool()
+        pool.start(finish, 1)
+        try:
+            await wait_for_status("b", "done")
+            await wait_until_removed(str(second))
+        finally:
+            await pool.stop()
+
+    asyncio.run(main())
+
+
+def test_heartbeat_keeps_extending_the_lease_after_an_error(db, monkeypatch):
+    from pymongo.errors import AutoReconnect
+
+    class FlakyJobs:
+        def __init__(self, jobs):
+            self.jobs = jobs
+            self.calls = 0
+
+        async def update_one(self, *args, **kwargs):
+            self.calls += 1
+            if self.calls == 1:
+                raise AutoReconnect("primary stepped down")
+            return await self.jobs.update_one(*args, **kwargs)
+
+    async def main():
+        pool = job_queue.JobWorkerPool()
+        start = datetime.utcnow()
+        await db.analysis_jobs.insert_one({
+            "_id": "session", "status": "running", "claim": "token", "lease_expires_at": start,
+        })
+        flaky = FlakyJobs(db.analysis_jobs)
+        monkeypatch.setattr(job_queue, "get_db", lambda: {job_queue.JOBS: flaky})
+        monkeypatch.setattr(settings, "ANALYSIS_JOB_LEASE_SECONDS", 0.3)
+        heartbeat = asyncio.create_task(pool._heartbeat("session", "token"))
+        await asyncio.sleep(0.5)
+        heartbeat.cancel()
+        assert flaky.calls >= 2
+        assert (await db.analysis_jobs.find_one({"_id": "session"}))["lease_expires_at"] > start
+
+    asyncio.run(main())
+
+
+def test_a_reclaimed_job_is_finished_by_its_latest_run_only(db, upload):
+    async def main():
+        runs = []
+        release = asyncio.Event()
+
+        async def handler(user_id, file_path, session_id, content_hash):
+            runs.append(file_path)
+            if len(runs) == 1:
+                # Outlives its lease
+                await release.wait()
+                return "first"
+            return "second"
+
+        await job_queue.enqueue("user", "session", upload)
+        pool = job_queue.JobWorkerPool()
+        pool.start(handler, 2)
+        try:
+            while not runs:
+                await asyncio.sleep(0.01)
+            await db.analysis_jobs.update_one(
+                {"_id": "session"}, {"$set": {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)}}
+            )
+            assert await job_queue.recover_orphaned_jobs() == 1
+            pool.notify()
+            await wait_for_status("session", "done")
+            release.set()
+            await asyncio.sleep(0.05)
+        finally:
+            await pool.stop()
+        job = await job_queue.get_job("session", "user")
+        assert (job["status"], job["result_id"], job["attempts"]) == ("done", "second", 2)
+
+    asyncio.run(main())
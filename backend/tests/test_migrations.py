@@ -0,0 +1,46 @@
+import asyncio
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+from app.services import migrations, rollups
+
+from test_rollups import figures, new_user
+
+
+def test_migrations_backfill_rollups_and_streaks_of_existing_history(db):
+    async def main():
+        user_id = await new_user(db)
+        today = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+        await db.training_sessions.insert_many([
+            {"user_id": user_id, "exercise_id": 1, "fluency_score": 90.0, "is_correct": True,
+             "created_at": today - timedelta(days=1)},
+            {"user_id": user_id, "exercise_id": 2, "fluency_score": 50.0, "is_correct": False, "created_at": today},
+        ])
+        await db.speech_analysis.insert_one({"user_id": user_id, "fluency_score": 70.0, "created_at": today})
+
+        applied = await migrations.apply()
+        assert {"0008-rollup-backfill", "0009-streak-backfill"} <= set(applied)
+        assert await figures(user_id) == (1, 70.0)
+        assert await rollups.check() == []
+        user = await db.users.find_one({"username": "test"})
+        assert (user["streak_current"], user["streak_longest"]) == (2, 2)
+
+        assert await migrations.apply() == []
+
+    asyncio.run(main())
+
+
+def test_analysis_version_leaves_the_ml_stack_unloaded():
+    # A fresh interpreter: the other tests have imported numpy already
+    code = (
+        "import sys\n"
+        "from app.services import migrations\n"
+        "from app.services.ml_service import analysis_version\n"
+        "analysis_version()\n"
+        "print(sorted(m for m in ('numpy', 'app.services.inference') if m in sys.modules))\n"
+    )
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run([sys.executable, "-c", code], cwd=backend, capture_output=True, text=True, check=True)
+    assert proc.stdout.strip() == "[]"
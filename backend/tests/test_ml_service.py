@@ -0,0 +1,29 @@
+import asyncio
+import wave
+
+import numpy as np
+
+from app.services import ml_service, video
+from app.utils.config import settings
+
+
+def test_video_failure_keeps_the_stutter_result(tmp_path, monkeypatch):
+    from app.services.inference import engine
+
+    async def unreadable(file_path):
+        raise RuntimeError("ffprobe is required to analyse video")
+
+    path = tmp_path / "recording.wav"
+    rng = np.random.default_rng(24)
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(settings.ML_SAMPLE_RATE)
+        wav.writeframes((rng.normal(0, 0.1, 4 * settings.ML_SAMPLE_RATE) * 32767).astype("<i2").tobytes())
+    monkeypatch.setattr(video, "analyze", unreadable)
+    try:
+        result = asyncio.run(ml_service.run_stutter_analysis(str(path)))
+    finally:
+        engine.shutdown()
+    assert result["headMovements"] == []
+    assert 0 <= result["fluencyScore"] <= 100
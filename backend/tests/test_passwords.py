@@ -0,0 +1,42 @@
+import asyncio
+import threading
+
+import bcrypt
+import pytest
+
+from app.utils import passwords
+from app.utils.passwords import PasswordHasher, PasswordWorkRejected
+
+
+def test_hasher_rejects_work_beyond_max_pending(monkeypatch):
+    release = threading.Event()
+    hashpw = bcrypt.hashpw
+
+    def stuck_hashpw(password, salt):
+        release.wait(5)
+        return hashpw(password, salt)
+
+    monkeypatch.setattr(passwords.bcrypt, "hashpw", stuck_hashpw)
+
+    async def main():
+        hasher = PasswordHasher(workers=1, max_pending=2, rounds=4)
+        try:
+            # One running and one waiting for the single worker
+            running = [asyncio.create_task(hasher.hash(f"password{i}")) for i in range(2)]
+            await asyncio.sleep(0.05)
+            assert hasher.pending == 2
+            with pytest.raises(PasswordWorkRejected):
+                await hasher.hash("one too many")
+            with pytest.raises(PasswordWorkRejected):
+                await hasher.verify("one too many", "$2b$04$" + "x" * 53)
+            assert (hasher.pending, hasher.rejected) == (2, 2)
+
+            release.set()
+            hashes = await asyncio.gather(*running)
+            assert hasher.pending == 0
+            assert await hasher.verify("password1", hashes[1])
+        finally:
+            release.set()
+            hasher.shutdown()
+
+    asyncio.run(main())
@@ -0,0 +1,30 @@
+import copy
+import json
+
+from app.services.recommendations import DEFAULT_CATALOG, build_index
+
+
+def load_catalog() -> dict:
+    with open(DEFAULT_CATALOG, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_rebuilt_index_reuses_only_the_unchanged_sequences():
+    data = load_catalog()
+    previous = build_index(data)
+
+    edited = copy.deepcopy(data)
+    sound = next(e for e in edited["exercises"] if e["type"] == "SoundRep")
+    sound["sentence"] = "A new sentence."
+    moved = next(e for e in edited["exercises"] if e["type"] == "WordRep" and e["difficulty"] == "Medium")
+    moved.update(type="Interjection", difficulty="Hard", level=99)
+    edited["exercises"].remove(next(e for e in edited["exercises"] if e["type"] == "Prolongation"))
+
+    index = build_index(edited, previous)
+    assert index == build_index(edited)
+    for name in ("SoundRep", "WordRep", "Interjection", "Prolongation"):
+        assert index.sequence[name] is not previous.sequence[name], name
+    assert index.sequence["NoStutteredWords"] is previous.sequence["NoStutteredWords"]
+    assert index.sequence["SoundRep"][0]["sentence"] == "A new sentence."
+    assert index.sequence["Interjection"][-1]["id"] == moved["id"]
+    assert moved["id"] not in [e["id"] for e in index.sequence["WordRep"]]
@@ -0,0 +1,55 @@
+import asyncio
+import hashlib
+
+from app.services import job_queue, result_cache
+from app.services.upload_service import UploadSpool
+from app.utils.config import settings
+
+from test_rollups import new_user
+
+RECORDING = b"RIFF recording"
+RESULT = {
+    "transcript": "", "fluencyScore": 72.5, "totalWords": 0, "severity": "Mild", "stutterIntensity": 0.2,
+    "stutterEvents": [{"timestamp": 1.5, "end": 4.5, "duration": 3.0, "type": "WordRep", "confidence": 0.81}],
+    "headMovements": [],
+}
+
+
+def test_a_repeated_recording_reuses_the_result_of_its_analysis_version(db, api, tmp_path, monkeypatch):
+    from app.api import dashboard
+
+    async def not_analysed(file_path):
+        raise AssertionError("inference ran for a cached recording")
+
+    monkeypatch.setattr(dashboard, "spool", UploadSpool(str(tmp_path), 1024, 1024, 4096))
+    monkeypatch.setattr(dashboard, "run_stutter_analysis", not_analysed)
+
+    async def main():
+        user_id = await new_user(db)
+        await result_cache.store(hashlib.sha256(RECORDING).hexdigest(), RESULT)
+
+        async def upload() -> dict:
+            async with api.client() as client:
+                response = await client.post(
+                    "/api/v1/dashboard/analyze", files={"file": ("a.wav", RECORDING)}, headers=api.headers(user_id)
+                )
+            assert response.status_code == 202
+            return response.json()
+
+        hit = await upload()
+        assert hit["message"] == "Analysis complete"
+        job = await job_queue.get_job(hit["session_id"], user_id)
+        assert (job["status"], job["content_hash"]) == ("done", hashlib.sha256(RECORDING).hexdigest())
+        stored = await db.speech_analysis.find_one({"_id": job["result_id"]})
+        assert (stored["session_id"], stored["fluency_score"]) == (hit["session_id"], 72.5)
+        assert list(tmp_path.iterdir()) == []
+
+        # Another analysis version never sees that result
+        monkeypatch.setattr(settings, "ML_HOP_SECONDS", settings.ML_HOP_SECONDS / 2)
+        miss = await upload()
+        assert miss["message"] == "Analysis started"
+        job = await job_queue.get_job(miss["session_id"], user_id)
+        assert (job["status"], job["result_id"]) == ("queued", None)
+        assert await db.speech_analysis.count_documents({}) == 1
+
+    asyncio.run(main())
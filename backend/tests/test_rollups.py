@@ -0,0 +1,93 @@
+import asyncio
+
+from bson import ObjectId
+
+from app.services import rollups
+from app.services.training_service import record_completion
+from app.utils.models import TrainingCompletion
+from benchmarks.bench_stats import pipeline_stats
+
+
+def completion(exercise_id: int, **fields) -> TrainingCompletion:
+    return TrainingCompletion(exercise_id=exercise_id, **fields)
+
+
+async def new_user(db) -> str:
+    user_id = ObjectId()
+    await db.users.insert_one({"_id": user_id, "username": "test"})
+    return str(user_id)
+
+
+async def figures(user_id: str):
+    stats = await rollups.read_dashboard_stats(user_id)
+    raw = await pipeline_stats(user_id)
+    assert await rollups.check(user_id) == []
+    assert (stats["total_sessions"], stats["avg_score"]) == (raw["total_sessions"], raw["avg_score"])
+    return stats["total_sessions"], stats["avg_score"]
+
+
+def test_recompletion_replaces_the_previous_score(db):
+    async def main():
+        user_id = await new_user(db)
+        await record_completion(user_id, completion(1, fluency_score=80.0, is_correct=True))
+        assert await figures(user_id) == (1, 80.0)
+        await record_completion(user_id, completion(1, fluency_score=40.0, is_correct=False))
+        assert await figures(user_id) == (0, 40.0)
+
+    asyncio.run(main())
+
+
+def test_bare_completion_keeps_the_stored_score(db):
+    async def main():
+        user_id = await new_user(db)
+        await record_completion(user_id, completion(1, fluency_score=80.0, is_correct=True))
+        await record_completion(user_id, completion(1))
+        stored = await db.training_sessions.find_one({"user_id": user_id, "exercise_id": 1})
+        assert (stored["fluency_score"], stored["is_correct"]) == (80.0, True)
+        assert await figures(user_id) == (1, 80.0)
+
+    asyncio.run(main())
+
+
+def test_bare_first_completion_counts_without_a_score(db):
+    async def main():
+        user_id = await new_user(db)
+        await record_completion(user_id, completion(2))
+        await record_completion(user_id, completion(1, fluency_score=60.0, is_correct=False))
+        assert await figures(user_id) == (0, 60.0)
+
+    asyncio.run(main())
+
+
+def test_concurrent_correct_and_incorrect_completions_agree_on_mastery(slow_db):
+    async def main():
+        user_id = await new_user(slow_db)
+        for _ in range(3):
+            await asyncio.gather(
+                record_completion(user_id, completion(1, fluency_score=90.0, is_correct=True)),
+                record_completion(user_id, completion(1, fluency_score=30.0, is_correct=False)),
+            )
+            stored = await slow_db.training_sessions.find_one({"user_id": user_id, "exercise_id": 1})
+            assert await figures(user_id) == (int(stored["is_correct"]), stored["fluency_score"])
+
+    asyncio.run(main())
+
+
+def test_rebuild_while_completions_land_keeps_every_write(slow_db):
+    async def main():
+        users = [await new_user(slow_db) for _ in range(4)]
+        for user_id in users:
+            await record_completion(user_id, completion(1, fluency_score=50.0, is_correct=True))
+        # Drifted rollups, as the rebuild finds them
+        await slow_db.user_totals.update_many({}, {"$inc": {"training_sum": 1000.0}})
+
+        async def complete(user_id):
+            for exercise_id in range(2, 6):
+                await record_completion(user_id, completion(exercise_id, fluency_score=70.0, is_correct=True))
+
+        await asyncio.gather(rollups.rebuild(), *(complete(user_id) for user_id in users))
+        assert await rollups.check() == []
+        for user_id in users:
+            assert await figures(user_id) == (5, 66.0)
+
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+import time
+
+import pytest
+from pydantic import ValidationError
+
+from app.services import scoring
+from app.utils.models import (
+    TRAINING_TEXT_MAX_LENGTH, TrainingBatchRequest, TrainingScoreRequest, TrainingSessionData,
+)
+
+
+def test_scores_repetitions_and_near_misses():
+    result = scoring.score("the big ball", "the the big bal")
+    assert result.repetitions == 1
+    assert result.fluency_score == 97.0
+    assert [h["status"] for h in result.highlights] == ["correct", "correct", "wrong"]
+
+
+def test_oversized_attempt_is_cut_before_scoring():
+    text = " ".join(["word"] * 4000)
+    start = time.perf_counter()
+    result = scoring.score_batch([(text, text), ("a" * 5000, "a" * 5000)])
+    assert time.perf_counter() - start < 2
+    assert result[0].word_count == scoring.MAX_WORDS
+    assert result[0].fluency_score == 100.0
+    assert result[1].fluency_score == 100.0
+
+
+def test_batches_are_bounded_by_text_length():
+    long = " ".join(["a"] * (TRAINING_TEXT_MAX_LENGTH // 2))
+    attempts = [(long, long)] * scoring.BATCH_SIZE
+    start = time.perf_counter()
+    scoring.score_batch(attempts)
+    assert time.perf_counter() - start < 10
+
+
+@pytest.mark.parametrize("model, payload", [
+    (TrainingSessionData, {"spokenText": "a" * (TRAINING_TEXT_MAX_LENGTH + 1)}),
+    (TrainingSessionData, {"expectedText": "a" * (TRAINING_TEXT_MAX_LENGTH + 1)}),
+    (TrainingScoreRequest, {"attempts": [{"expectedText": "a" * (TRAINING_TEXT_MAX_LENGTH + 1)}]}),
+    (TrainingBatchRequest, {"completions": [{"exercise_id": 1, "spokenText": "a" * (TRAINING_TEXT_MAX_LENGTH + 1)}]}),
+])
+def test_models_reject_long_texts(model, payload):
+    with pytest.raises(ValidationError):
+        model(**payload)
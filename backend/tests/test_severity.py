@@ -0,0 +1,37 @@
+import numpy as np
+
+from app.services.inference import WindowPredictions
+from app.services.severity import SeverityConfig, score, score_batch
+from benchmarks.bench_severity import loop_score, synthetic_predictions
+
+
+def recording(labels, hop=1.5, window=3.0) -> WindowPredictions:
+    labels = np.array(labels, dtype=np.uint8)
+    confidence = np.linspace(0.5, 1.0, len(labels), dtype=np.float32)
+    return WindowPredictions(labels, confidence, window, hop, len(labels) * hop + 0.7)
+
+
+def test_batch_scores_match_each_recording_scored_alone():
+    config = SeverityConfig.from_settings()
+    batch = [
+        recording([0, 2, 2, 0, 3]),
+        # Starts with the label the previous recording ended with
+        recording([3, 3, 1]),
+        recording([]),
+        recording([4]),
+        recording([0, 0, 5, 5, 5, 0], hop=0.5, window=1.0),
+        synthetic_predictions(0.1, seed=1),
+        synthetic_predictions(0.1, seed=2),
+    ]
+    for predictions, report in zip(batch, score_batch(batch, config), strict=True):
+        alone = score(predictions, config)
+        for field in ("labels", "start", "end", "confidence"):
+            assert np.array_equal(getattr(report, field), getattr(alone, field)), field
+        assert (report.intensity, report.level, report.events()) == (alone.intensity, alone.level, alone.events())
+
+        segments, level = loop_score(predictions, config)
+        assert report.level == level
+        assert [tuple(segment) for segment in zip(report.labels.tolist(), report.start, report.end)] == [
+            (label, start, end) for label, start, end, _ in segments
+        ]
+        assert np.allclose(report.confidence, [conf for *_, conf in segments])
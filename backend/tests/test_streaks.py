@@ -0,0 +1,34 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.services import streaks
+
+from test_rollups import new_user
+
+
+def test_streak_counts_consecutive_days_across_the_rollover(db):
+    async def main():
+        user_id = await new_user(db)
+        day = datetime(2026, 3, 1, 23, 59)
+
+        async def record(when: datetime) -> tuple:
+            await streaks.record_activity(user_id, when)
+            user = await db.users.find_one({"username": "test"})
+            return user["streak_current"], user["streak_longest"], user["last_active_day"]
+
+        assert await record(day) == (1, 1, datetime(2026, 3, 1))
+        # Same day again
+        assert await record(day - timedelta(hours=10)) == (1, 1, datetime(2026, 3, 1))
+        # Two minutes later is the next day
+        assert await record(day + timedelta(minutes=2)) == (2, 2, datetime(2026, 3, 2))
+        assert await record(day + timedelta(days=1, hours=12)) == (3, 3, datetime(2026, 3, 3))
+        # A late write for a day already counted
+        assert await record(day) == (3, 3, datetime(2026, 3, 3))
+        # A day without activity resets the run but keeps the best one
+        assert await record(day + timedelta(days=4)) == (1, 3, datetime(2026, 3, 5))
+        assert await record(day + timedelta(days=5)) == (2, 3, datetime(2026, 3, 6))
+
+        assert await streaks.read_streak(user_id, datetime(2026, 3, 7, 23, 59)) == 2
+        assert await streaks.read_streak(user_id, datetime(2026, 3, 8)) == 0
+
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services import streaming
+from app.services.audio import count_windows, frame_windows, padded_length
+
+# 10-sample windows every 5 samples, and room for one more window of backlog
+RATE, WINDOW, HOP = 10, 10, 5
+
+
+def new_analyzer() -> streaming.StreamAnalyzer:
+    return streaming.StreamAnalyzer(RATE, WINDOW / RATE, HOP / RATE, budget_seconds=1.0)
+
+
+def expected_windows(audio: np.ndarray) -> np.ndarray:
+    # What classify() runs on for the same audio uploaded as a recording
+    padded = np.zeros(padded_length(len(audio), WINDOW, HOP), dtype=np.float32)
+    padded[:len(audio)] = audio
+    return frame_windows(padded, WINDOW, HOP)
+
+
+def test_ring_buffer_wraps_around():
+    buffer = streaming.RingBuffer(8)
+    buffer.write(np.arange(6, dtype=np.float32))
+    with pytest.raises(BufferError):
+        buffer.write(np.zeros(3, dtype=np.float32))
+    buffer.release(4)
+    buffer.write(np.arange(6, 11, dtype=np.float32))
+    assert (buffer.start, buffer.end, buffer.free) == (4, 11, 1)
+    assert buffer.read(4, 7).tolist() == [4, 5, 6, 7, 8, 9, 10]
+    assert buffer.read(9, 2).tolist() == [9, 10]
+    with pytest.raises(IndexError):
+        buffer.read(3, 2)
+    with pytest.raises(IndexError):
+        buffer.read(10, 2)
+
+
+@pytest.mark.parametrize("length", [3, 10, 20, 23, 47])
+def test_classified_and_tail_windows_match_the_recording(length):
+    audio = np.arange(1, length + 1, dtype=np.float32)
+    analyzer = new_analyzer()
+    taken = []
+    for begin in range(0, length, 7):
+        analyzer.write(audio[begin:begin + 7])
+        windows = analyzer.take(32)
+        taken.extend(windows)
+        analyzer.record(np.zeros(len(windows), dtype=np.uint8), np.ones(len(windows), dtype=np.float32))
+    taken.extend(analyzer.tail())
+    assert np.array_equal(np.array(taken), expected_windows(audio))
+    assert len(taken) == count_windows(length, WINDOW, HOP)
+
+
+class FakeWebSocket:
+    def __init__(self, frames):
+        self.messages = [{"type": "websocket.receive", "bytes": frame.tobytes()} for frame in frames]
+        self.messages.append({"type": "websocket.receive", "text": '{"type": "end"}'})
+        self.reads = 0
+        self.sent = []
+
+    async def receive(self):
+        self.reads += 1
+        return self.messages.pop(0)
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+
+def test_a_full_buffer_stops_reading_the_client(monkeypatch):
+    async def main():
+        audio = np.arange(1, 51, dtype=np.float32)
+        websocket = FakeWebSocket([audio[i:i + HOP] for i in range(0, len(audio), HOP)])
+        gate = asyncio.Event()
+        classified = []
+
+        async def slow_model(windows):
+            await gate.wait()
+            classified.extend(windows)
+            return np.zeros(len(windows), dtype=np.uint8), np.ones(len(windows), dtype=np.float32)
+
+        monkeypatch.setattr(streaming.engine, "classify_windows", slow_model)
+        analyzer = new_analyzer()
+        pipeline = streaming.StreamPipeline(websocket, analyzer, streaming.FORMATS["f32le"])
+        run = asyncio.create_task(pipeline.run())
+        await asyncio.sleep(0.05)
+        # Nothing is released while the model is stuck: the buffer fills and the fifth frame waits
+        assert (analyzer.received, analyzer.buffer.free, websocket.reads) == (20, 0, 5)
+
+        gate.set()
+        predictions = await run
+        assert np.array_equal(np.array(classified), expected_windows(audio))
+        assert len(predictions.labels) == count_windows(len(audio), WINDOW, HOP)
+        indexes = [w["index"] for m in websocket.sent if m["type"] == "windows" for w in m["windows"]]
+        assert indexes == list(range(len(predictions.labels)))
+
+    asyncio.run(main())
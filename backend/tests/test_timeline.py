@@ -0,0 +1,34 @@
+from app.services import timeline
+from app.utils.config import settings
+
+EVENTS = [
+    {"timestamp": 3.0, "end": 9.0, "duration": 6.0, "type": "Interjection", "confidence": 0.591},
+    {"timestamp": 0.0, "end": 3.0, "duration": 3.0, "type": "Prolongation", "confidence": 0.254},
+    {"timestamp": 7.0, "end": 11.0, "duration": 4.0, "type": "WordRep", "confidence": 0.276},
+    {"timestamp": 3.5, "end": 4.25, "duration": 0.75, "type": "Prolongation", "confidence": 0.9},
+]
+
+
+def test_columnar_timeline_round_trips_in_timestamp_order():
+    encoded = timeline.encode_events(EVENTS)
+    assert timeline.is_encoded(encoded)
+    assert encoded["types"] == ["Interjection", "Prolongation", "WordRep"]
+    assert timeline.decode_events(encoded) == sorted(EVENTS, key=lambda event: event["timestamp"])
+
+
+def test_slices_match_the_plain_filter_at_their_bounds():
+    encoded = timeline.encode_events(EVENTS)
+    for start, end in [(3.0, 7.0), (3.0, 3.5), (0.0, None), (None, 3.0), (3.25, 3.75), (7.0, 7.0), (20.0, None)]:
+        expected = sorted(timeline.filter_events(EVENTS, start, end), key=lambda event: event["timestamp"])
+        assert timeline.decode_events(encoded, start, end) == expected, (start, end)
+
+
+def test_empty_and_unsupported_timelines_are_stored_as_is(monkeypatch):
+    monkeypatch.setattr(settings, "TIMELINE_ENCODING", "columnar")
+    assert timeline.encode_events([]) is None
+    assert timeline.encode_events([{"timestamp": 1.0, "note": "extra field"}]) is None
+    doc = timeline.encode_document({"stutterEvents": [], "headMovements": EVENTS})
+    assert doc["stutterEvents"] == []
+    assert timeline.is_encoded(doc["headMovements"])
+    assert timeline.decode_document(doc, 0.0, 3.5)["headMovements"] == EVENTS[1:2] + EVENTS[0:1]
+    assert timeline.decode_document({"stutterEvents": []}, 0.0, 1.0) == {"stutterEvents": []}
@@ -0,0 +1,90 @@
+import asyncio
+
+from app.services import migrations
+from app.services.training_service import record_completion, record_completions
+from app.utils.models import TrainingCompletion
+
+from test_rollups import figures, new_user
+
+
+def test_concurrent_completions_take_back_one_previous_score_each(slow_db):
+    async def main():
+        user_id = await new_user(slow_db)
+        await record_completion(user_id, TrainingCompletion(exercise_id=1, fluency_score=90.0, is_correct=True))
+        await asyncio.gather(*(
+            record_completion(user_id, TrainingCompletion(exercise_id=1, fluency_score=score, is_correct=False))
+            for score in (10.0, 20.0, 30.0)
+        ))
+        stored = await slow_db.training_sessions.find_one({"user_id": user_id, "exercise_id": 1})
+        assert await figures(user_id) == (0, stored["fluency_score"])
+
+    asyncio.run(main())
+
+
+def test_batch_with_a_bare_completion_keeps_the_stored_score(db):
+    async def main():
+        user_id = await new_user(db)
+        await record_completions(user_id, [
+            TrainingCompletion(exercise_id=1, fluency_score=80.0, is_correct=True),
+            TrainingCompletion(exercise_id=2, fluency_score=50.0, is_correct=False),
+        ])
+        results = await record_completions(user_id, [
+            TrainingCompletion(exercise_id=1),
+            TrainingCompletion(exercise_id=2, fluency_score=70.0, is_correct=True),
+        ])
+        assert [r.status for r in results] == ["saved", "saved"]
+        assert await figures(user_id) == (2, 75.0)
+
+    asyncio.run(main())
+
+
+def test_index_migration_keeps_the_newest_attempt(db):
+    async def main():
+        from datetime import datetime, timedelta
+
+        now = datetime.utcnow()
+        await db.training_sessions.insert_many([
+            {"user_id": "u", "exercise_id": 1, "fluency_score": 10.0, "created_at": now - timedelta(days=1)},
+            {"user_id": "u", "exercise_id": 1, "fluency_score": 20.0, "created_at": now},
+            {"user_id": "u", "exercise_id": 2, "fluency_score": 30.0, "created_at": now},
+        ])
+        await migrations.training_exercise_index()
+        kept = [doc["fluency_score"] async for doc in db.training_sessions.find({}).sort("exercise_id", 1)]
+        assert kept == [20.0, 30.0]
+
+    asyncio.run(main())
+
+
+def test_batch_writes_are_bounded_by_the_write_concurrency(db, monkeypatch):
+    from app.services import training_service
+    from app.utils.config import settings
+
+    class Tracking:
+        def __init__(self):
+            self.active = self.peak = 0
+
+        def __getitem__(self, name):
+            return self if name == "training_sessions" else db[name]
+
+        async def find_one_and_update(self, *args, **kwargs):
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            try:
+                await asyncio.sleep(0.001)
+                return await db["training_sessions"].find_one_and_update(*args, **kwargs)
+            finally:
+                self.active -= 1
+
+    async def main():
+        user_id = await new_user(db)
+        tracking = Tracking()
+        monkeypatch.setattr(training_service, "get_db", lambda: tracking)
+        monkeypatch.setattr(settings, "TRAINING_WRITE_CONCURRENCY", 4)
+        results = await record_completions(user_id, [
+            TrainingCompletion(exercise_id=i, fluency_score=50.0) for i in range(40)
+        ])
+        assert [r.status for r in results] == ["saved"] * 40
+        assert tracking.peak == 4
+        assert await figures(user_id) == (0, 50.0)
+
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+import asyncio
+import io
+
+from fastapi import UploadFile
+
+from app.services.upload_service import UploadSpool
+
+
+def test_concurrent_saves_and_discards_keep_the_usage_exact(tmp_path):
+    async def main():
+        upload_spool = UploadSpool(str(tmp_path), chunk_size=256, max_upload_bytes=4096, quota_bytes=64 * 1024)
+
+        async def round_trip(i: int):
+            saved = await upload_spool.save(UploadFile(io.BytesIO(b"x" * (1000 + i)), filename="a.wav"), f"s{i}")
+            await upload_spool.discard(saved.path)
+            # Already gone: frees nothing
+            await upload_spool.discard(saved.path)
+
+        await asyncio.gather(*(round_trip(i) for i in range(40)))
+        assert upload_spool._usage == 0
+        assert list(tmp_path.iterdir()) == []
+
+    asyncio.run(main())
+
+
+def test_size_limit_applies_to_the_exact_upload_path(tmp_path):
+    from app.services.upload_service import UploadSizeLimitMiddleware
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    upload_spool = UploadSpool(str(tmp_path), chunk_size=256, max_upload_bytes=1024, quota_bytes=4096)
+    middleware = UploadSizeLimitMiddleware(app, ["/dashboard/analyze"], upload_spool)
+
+    async def status(path: str, root_path: str = "") -> int:
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http", "method": "POST", "path": path, "root_path": root_path,
+            "headers": [(b"content-length", b"10000000")],
+        }
+        await middleware(scope, None, send)
+        return sent[0]["status"]
+
+    async def main():
+        assert await status("/dashboard/analyze") == 413
+        assert await status("/dashboard/analyze/") == 413
+        assert await status("/api/dashboard/analyze", root_path="/api") == 413
+        assert await status("/dashboard/analyze", root_path="/api") == 413
+        assert await status("/files/dashboard/analyze") == 200
+        assert await status("/dashboard/analyze/history") == 200
+
+    asyncio.run(main())
+
+
+def test_size_limit_applies_to_the_mounted_analyze_route():
+    import httpx
+
+    from app.main import app
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            assert app.url_path_for("analyze_speech") == "/api/v1/dashboard/analyze"
+            response = await client.post(
+                app.url_path_for("analyze_speech"),
+                headers={"content-length": str(10 ** 12), "content-type": "multipart/form-data; boundary=x"},
+                content=b"",
+            )
+        assert response.status_code == 413
+        assert response.json() == {"detail": "File too large"}
+
+    asyncio.run(main())